@@ -1,4 +1,4 @@
-from network_wrapper import network_wrapper
+from model_registry import get_model_registry
 import os
 import warnings
 warnings.filterwarnings("ignore")
@@ -7,7 +7,7 @@ class ClearVoice:
     """ The main class inferface to the end users for performing speech processing
         this class provides the desired model to perform the given task
     """
-    def __init__(self, task, model_names):
+    def __init__(self, task, model_names, precision='float32', backend='torch', layer_schedule=None):
         """ Load the desired models for the specified task. Perform all the given models and return all results.
    
         Parameters:
@@ -24,21 +24,77 @@ class ClearVoice:
             'MossFormerGAN_SE_16K'
             'MossFormer2_SS_16K'
             'AV_MossFormer2_TSE_16K'
+        precision: str
+            'float32' (default), 'float16', 'bfloat16' or 'int8'. In float16 and bfloat16
+            mode the models run with autocast, keeping numerically sensitive parts in float32.
+            In int8 mode the Linear and recurrent layers are quantized to int8 for faster
+            inference on the CPU (see SpeechModel.set_precision).
+        backend: str
+            'torch' (default) or 'onnxruntime'. The onnxruntime backend runs the ONNX exports
+            of the models (see export_onnx.py) with ONNX Runtime, e.g. on CPU workers
+            (see SpeechModel.set_backend).
+        layer_schedule: list of int or str
+            for MossFormer2_SS_16K, the MossFormer2 layers to evaluate, or the path of a
+            schedule file written by layer_schedule.py. All layers by default
+            (see SpeechModel.set_layer_schedule).
 
         Returns:
         --------
         A ModelsList object, that can be run to get the desired results
+
+        Models are fetched from the process-wide model registry, so constructing several
+        ClearVoice objects for the same model only loads its checkpoint once.
         """        
-        self.network_wrapper = network_wrapper()
         self.models = []
         for model_name in model_names:
-            model = self.network_wrapper(task, model_name)
+            model = get_model_registry().get(task, model_name, dtype=precision, backend=backend)
+            if model is not None and layer_schedule is not None:
+                model.set_layer_schedule(layer_schedule)  # On the copy, the cached model keeps all layers
             self.models += [model]  
             
-    def __call__(self, input_path, online_write=False, output_path=None):
+    @staticmethod
+    def pipeline(stages):
+        """ Build a multi-stage pipeline that runs several models on the same audio in memory,
+            without writing intermediate files between the stages.
+
+        Parameters:
+        ----------
+        stages: list of dict or list of tuple
+            the stages in order, e.g. [{'task': 'speech_enhancement', 'model_name': 'MossFormer2_SE_48K'},
+                                       {'task': 'speech_super_resolution', 'model_name': 'MossFormer2_SR_48K'}]
+
+        Returns:
+        --------
+        A ClearVoicePipeline object, that can be called with an input path (and an optional output path)
+        """
+        from pipeline import ClearVoicePipeline
+        return ClearVoicePipeline(stages)
+
+    def __call__(self, input_path, online_write=False, output_path=None, batch_size=1):
+        """ Process the input audio with all the loaded models.
+
+        Parameters:
+        ----------
+        input_path: str
+            path to an audio file, a directory of audio files or a .scp list file
+        online_write: bool
+            if True, write the outputs to output_path instead of returning them
+        output_path: str
+            path for writing the outputs if online_write is True
+        batch_size: int
+            if larger than 1, short inputs from different files are bucketed by length
+            and decoded together, up to batch_size channels per forward pass
+
+        Returns:
+        --------
+        The processed audio, or a dictionary of results if there are several inputs or models
+
+        If the result cache is enabled (see result_cache.get_result_cache), every model
+        looks up each input before decoding it and skips the inputs it has processed before.
+        """
         results = {}
         for model in self.models:
-            result = model.process(input_path, online_write, output_path)
+            result = model.process(input_path, online_write, output_path, batch_size=batch_size)
             if not online_write:
                 results[model.name] = result
 
@@ -0,0 +1,39 @@
+"""
+Converts model checkpoints to fast-loading safetensors copies, stored next to the
+checkpoints. Models load the copies by memory-mapping them straight into their weights,
+without unpickling the checkpoints or remapping their keys, e.g. at the cold start of a
+serverless worker.
+
+Usage:
+    python convert_checkpoints.py                                    # all models
+    python convert_checkpoints.py speech_separation:MossFormer2_SS_16K speech_super_resolution:MossFormer2_SR_48K
+"""
+import argparse
+from network_wrapper import network_wrapper
+
+# The models that load checkpoints through SpeechModel.load_model
+MODELS = [
+    ('speech_enhancement', 'FRCRN_SE_16K'),
+    ('speech_enhancement', 'MossFormer2_SE_48K'),
+    ('speech_enhancement', 'MossFormerGAN_SE_16K'),
+    ('speech_separation', 'MossFormer2_SS_16K'),
+    ('speech_super_resolution', 'MossFormer2_SR_48K'),
+    ('target_speaker_extraction', 'AV_MossFormer2_TSE_16K'),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert model checkpoints to fast-loading safetensors copies')
+    parser.add_argument('models', nargs='*', help='models to convert as task:model_name (default: all models)')
+    args = parser.parse_args()
+
+    models = [tuple(model.split(':', 1)) for model in args.models] if args.models else MODELS
+    for task, model_name in models:
+        model = network_wrapper()(task, model_name)
+        if model is None:
+            print(f'Unable to load {model_name} for {task}')
+            continue
+        for path in model.convert_checkpoints():
+            print(f'{model_name}: wrote {path}')
+
+if __name__ == '__main__':
+    main()
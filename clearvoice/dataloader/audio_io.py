@@ -0,0 +1,319 @@
+#!/usr/bin/env python -u
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import json
+import os
+import subprocess
+import tempfile
+import numpy as np
+import soundfile as sf
+
+# Formats decoded in-process by libsndfile, all others are decoded by ffmpeg
+SOUNDFILE_FORMATS = ('wav', 'flac', 'aiff', 'aif')
+# Bytes per sample reported for libsndfile subtypes; other subtypes (32-bit, float) are handled as 32-bit
+SOUNDFILE_SAMPLE_WIDTHS = {'PCM_S8': 1, 'PCM_U8': 1, 'PCM_16': 2, 'PCM_24': 3}
+# libsndfile subtypes written for each output sample width
+SOUNDFILE_SUBTYPES = {2: 'PCM_16', 3: 'PCM_24', 4: 'PCM_32'}
+# Widest sample width of the containers that store less than 32 bits per sample
+SOUNDFILE_MAX_SAMPLE_WIDTHS = {'flac': 3}
+# Bytes per sample reported for ffmpeg sample formats (planar formats end with 'p')
+FFMPEG_SAMPLE_WIDTHS = {'u8': 1, 's16': 2}
+# Full scale of 16-bit and 32-bit PCM
+PCM_16_MAX = 32768.0
+PCM_32_MAX = 2147483648.0
+# Bytes read from the ffmpeg pipe at once
+FFMPEG_READ_SIZE = 1 << 20
+
+def read_soundfile(path):
+    """
+    Decodes a file with libsndfile directly into a float32 buffer.
+
+    Parameters:
+    path (str): The file path of the audio file.
+
+    Returns:
+    tuple: (audio, audio_info), where audio is a float32 array of shape [T, C] in the range
+           [-1, 1] and audio_info holds 'sample_rate', 'channels' and 'sample_width'.
+    """
+    with sf.SoundFile(path) as f:
+        audio = f.read(dtype='float32', always_2d=True)
+        audio_info = {
+            'sample_rate': f.samplerate,
+            'channels': f.channels,
+            'sample_width': SOUNDFILE_SAMPLE_WIDTHS.get(f.subtype, 4),
+        }
+    return audio, audio_info
+
+def probe_ffmpeg(path):
+    """
+    Reads the sample rate, channel count and sample width of the first audio stream with ffprobe.
+    """
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'a:0',
+           '-show_entries', 'stream=sample_rate,channels,sample_fmt,bits_per_raw_sample',
+           '-of', 'json', path]
+    streams = json.loads(subprocess.run(cmd, capture_output=True, check=True).stdout).get('streams')
+    if not streams:
+        raise ValueError(f'No audio stream found in {path}')
+    stream = streams[0]
+    bits = int(stream.get('bits_per_raw_sample') or 0)
+    if bits > 0:
+        sample_width = 1 if bits <= 8 else 2 if bits <= 16 else 3 if bits <= 24 else 4
+    else:
+        sample_width = FFMPEG_SAMPLE_WIDTHS.get(stream.get('sample_fmt', '').rstrip('p'), 4)
+    return {
+        'sample_rate': int(stream['sample_rate']),
+        'channels': int(stream['channels']),
+        'sample_width': sample_width,
+    }
+
+def decode_ffmpeg(path, write):
+    """
+    Decodes a file with one ffmpeg process that streams raw float32 PCM (interleaved) through
+    a pipe, passing the bytes to write() in chunks as they arrive.
+    """
+    cmd = ['ffmpeg', '-nostdin', '-v', 'error', '-i', path, '-map', '0:a:0',
+           '-f', 'f32le', '-acodec', 'pcm_f32le', '-']
+    # The log goes to a file rather than a pipe, which ffmpeg could fill and block on while we read stdout
+    with tempfile.TemporaryFile() as stderr:
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr) as proc:
+            while True:
+                chunk = proc.stdout.read(FFMPEG_READ_SIZE)
+                if not chunk:
+                    break
+                write(chunk)
+            if proc.wait() != 0:
+                raise RuntimeError(f'ffmpeg failed to decode {path}: {read_log(stderr)}')
+
+def read_log(log_file):
+    """
+    Returns the text written by a finished process to a temporary log file.
+    """
+    log_file.seek(0)
+    return log_file.read().decode(errors='ignore').strip()
+
+def read_ffmpeg(path):
+    """
+    Decodes a file with one ffmpeg process that streams raw float32 PCM through a pipe
+    into a NumPy buffer, without an intermediate WAV file.
+
+    Parameters:
+    path (str): The file path of the audio file.
+
+    Returns:
+    tuple: (audio, audio_info) as in read_soundfile.
+    """
+    audio_info = probe_ffmpeg(path)
+    buffer = bytearray()
+    decode_ffmpeg(path, buffer.extend)
+
+    # The interleaved samples are viewed as [T, C] without copying
+    channels = audio_info['channels']
+    audio = np.frombuffer(buffer, dtype=np.float32)
+    audio = audio[:len(audio) // channels * channels].reshape(-1, channels)
+    return audio, audio_info
+
+def load_audio(path, ext=None):
+    """
+    Decodes an audio file in a single pass. WAV, FLAC and AIFF are read by libsndfile,
+    other formats (and files libsndfile cannot read) by an ffmpeg pipe.
+
+    Parameters:
+    path (str): The file path of the audio file.
+    ext (str, optional): The file extension without the dot, used to pick the decoder.
+
+    Returns:
+    tuple: (audio, audio_info), where audio is a float32 array of shape [T, C] in the range
+           [-1, 1] and audio_info holds 'sample_rate', 'channels' and 'sample_width'.
+    """
+    if uses_soundfile(path, ext):
+        try:
+            return read_soundfile(path)
+        except RuntimeError:
+            # e.g., WAV files holding compressed data, let ffmpeg try them
+            pass
+    return read_ffmpeg(path)
+
+def uses_soundfile(path, ext=None):
+    """Returns True if the file is decoded by libsndfile (see load_audio)."""
+    if ext is None:
+        ext = path.rsplit('.', 1)[-1]
+    return ext.lower() in SOUNDFILE_FORMATS
+
+def audio_duration(path, ext=None):
+    """
+    Returns the duration of an audio file in seconds without decoding it.
+    """
+    if uses_soundfile(path, ext):
+        try:
+            return sf.info(path).duration
+        except RuntimeError:
+            pass
+    cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', path]
+    return float(json.loads(subprocess.run(cmd, capture_output=True, check=True).stdout)['format']['duration'])
+
+class AudioFileReader(object):
+    """
+    Random access to the samples of an audio file without holding the decoded file in memory.
+    Files readable by libsndfile are read block by block from the file itself. Other formats
+    are decoded once by ffmpeg into a temporary float32 file, which is then memory-mapped.
+
+    Parameters:
+    path (str): The file path of the audio file.
+    ext (str, optional): The file extension without the dot, used to pick the decoder.
+
+    Attributes:
+    audio_info (dict): Holds 'sample_rate', 'channels' and 'sample_width'.
+    frames (int): Number of samples per channel.
+    """
+
+    def __init__(self, path, ext=None):
+        self.file = None
+        self.samples = None
+        self.temp_path = None
+        if uses_soundfile(path, ext):
+            try:
+                self.file = sf.SoundFile(path)
+            except RuntimeError:
+                self.file = None
+        if self.file is not None:
+            self.audio_info = {
+                'sample_rate': self.file.samplerate,
+                'channels': self.file.channels,
+                'sample_width': SOUNDFILE_SAMPLE_WIDTHS.get(self.file.subtype, 4),
+            }
+            self.frames = self.file.frames
+            return
+
+        self.audio_info = probe_ffmpeg(path)
+        channels = self.audio_info['channels']
+        fd, self.temp_path = tempfile.mkstemp(suffix='.f32')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                decode_ffmpeg(path, f.write)
+            self.frames = os.path.getsize(self.temp_path) // (4 * channels)
+            if self.frames > 0:
+                self.samples = np.memmap(self.temp_path, dtype=np.float32, mode='r', shape=(self.frames, channels))
+        except BaseException:
+            self.close()
+            raise
+
+    def read(self, start, stop):
+        """
+        Reads the samples [start, stop) of all channels.
+
+        Returns:
+        numpy.ndarray: float32 array of shape [stop - start, C] in the range [-1, 1].
+        """
+        stop = min(stop, self.frames)
+        if self.file is not None:
+            self.file.seek(start)
+            return self.file.read(stop - start, dtype='float32', always_2d=True)
+        if self.samples is None or stop <= start:
+            return np.zeros((0, self.audio_info['channels']), dtype=np.float32)
+        return np.array(self.samples[start:stop])
+
+    def blocks(self, block_size):
+        """Yields the file in consecutive blocks of block_size samples, see read()."""
+        for start in range(0, self.frames, block_size):
+            yield self.read(start, start + block_size)
+
+    def close(self):
+        """Closes the file and removes the temporary decoded file, if any."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.samples = None
+        if self.temp_path is not None:
+            os.remove(self.temp_path)
+            self.temp_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def to_pcm(audio, sample_width):
+    """
+    Quantizes audio in the range [-1, 1] to 32-bit PCM if sample_width is 3 or 4, otherwise to
+    16-bit PCM, with the scaling of audiowrite. Samples outside the range are clipped. 24-bit
+    outputs are passed as 32-bit PCM, of which libsndfile keeps the upper 24 bits.
+    """
+    # float32 holds every 16-bit value exactly, 32-bit PCM needs float64
+    if sample_width >= 3:
+        max_wav_value, np_type, work_type = PCM_32_MAX, np.int32, np.float64
+    else:
+        max_wav_value, np_type, work_type = PCM_16_MAX, np.int16, np.float32
+    # The scaled copy is C-ordered, so a transposed [T, C] view of [C, T] audio is interleaved here
+    audio = np.multiply(audio, max_wav_value, dtype=work_type, order='C')
+    return np.clip(audio, -max_wav_value, max_wav_value - 1, out=audio).astype(np_type)
+
+class AudioFileWriter(object):
+    """
+    Encodes audio incrementally, so that a long output never has to be held in memory.
+    WAV, FLAC and AIFF are written by libsndfile, other formats are encoded by an ffmpeg
+    process that reads raw PCM from a pipe.
+
+    Parameters:
+    path (str): The file path where the audio will be saved.
+    audio_info (dict): Contains 'sample_rate', 'sample_width', 'channels' and 'ext' (the output format).
+    """
+
+    def __init__(self, path, audio_info):
+        self.channels = audio_info['channels']
+        # The sample width of the input for 24-bit and 32-bit inputs, 16-bit otherwise
+        self.sample_width = audio_info['sample_width'] if audio_info['sample_width'] in (3, 4) else 2
+        self.file = None
+        self.proc = None
+        ext = audio_info['ext']
+        if uses_soundfile(path, ext):
+            # Containers without 32-bit PCM (FLAC) store the widest sample width they support
+            self.sample_width = min(self.sample_width, SOUNDFILE_MAX_SAMPLE_WIDTHS.get(ext.lower(), 4))
+            subtype = SOUNDFILE_SUBTYPES[self.sample_width]
+            self.file = sf.SoundFile(path, 'w', samplerate=audio_info['sample_rate'], channels=self.channels,
+                                     subtype=subtype, format={'aif': 'AIFF'}.get(ext.lower(), ext.upper()))
+        else:
+            audio_format = 'ipod' if ext in ['m4a', 'aac'] else ext
+            pcm_format = 's32le' if self.sample_width >= 3 else 's16le'
+            cmd = ['ffmpeg', '-nostdin', '-y', '-v', 'error', '-f', pcm_format, '-ar', str(audio_info['sample_rate']),
+                   '-ac', str(self.channels), '-i', '-', '-f', audio_format, path]
+            # The log goes to a file rather than a pipe, which ffmpeg could fill and block on while we write stdin
+            self.log = tempfile.TemporaryFile()
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=self.log)
+
+    def write(self, audio):
+        """
+        Appends audio in the range [-1, 1] of shape [T] for mono or [T, C] for multi-channel audio.
+        [T, C] may be a transposed view of [C, T] audio. The samples are quantized to 16-bit or
+        32-bit PCM (also for 24-bit files) and interleaved in one copy, and passed on without
+        further copies.
+        """
+        audio = np.asarray(audio)
+        if audio.ndim == 1:
+            audio = audio[:, None]
+        pcm = to_pcm(audio, self.sample_width)
+        if self.file is not None:
+            self.file.write(pcm)
+        else:
+            self.proc.stdin.write(pcm.tobytes())
+
+    def close(self):
+        """Finishes the file."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.proc is not None:
+            proc, self.proc = self.proc, None
+            proc.stdin.close()
+            with self.log:
+                if proc.wait() != 0:
+                    raise RuntimeError(f'ffmpeg failed to encode audio: {read_log(self.log)}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,5 +1,6 @@
 import numpy as np
 import math, os, csv
+import tempfile
 import torchaudio
 import torch
 import torch.nn as nn
@@ -11,130 +12,75 @@ import torch.utils.data as data
 import os 
 import sys
 sys.path.append(os.path.dirname(__file__))
-from pydub import AudioSegment
 from dataloader.misc import read_and_config_file, get_file_extension
-import librosa
+from dataloader.audio_io import load_audio, AudioFileReader, AudioFileWriter
+from utils.resample import StreamResampler, resample
+from utils.frontend import fbank_config, fbank_with_deltas
 import random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 EPS = 1e-6
 MAX_WAV_VALUE_16B = 32768.0
 MAX_WAV_VALUE_32B = 2147483648.0
    
-def audioread_archieved(path, sampling_rate):
-    """
-    Reads an audio file from the specified path, normalizes the audio, 
-    resamples it to the desired sampling rate (if necessary), and ensures it is single-channel.
-
-    Parameters:
-    path (str): The file path of the audio file to be read.
-    sampling_rate (int): The target sampling rate for the audio.
-
-    Returns:
-    numpy.ndarray: The processed audio data, normalized, resampled (if necessary),
-                   and converted to mono (if the input audio has multiple channels).
-    """
-    
-    # Read audio data and its sample rate from the file.
-    data, fs = sf.read(path)
-
-    # convert to mono channel
-    if len(data.shape) >1:
-        if data.shape[0] > data.shape[1]:
-            data = data[:, 0] 
-        else:
-            data = data[0, :] 
-    
-    # Normalize the audio data.
-    data, scalar = audio_norm(data)
-    
-    # Resample the audio if the sample rate is different from the target sampling rate.
-    if fs != sampling_rate:
-        data = librosa.resample(data, orig_sr=fs, target_sr=sampling_rate)
-    
-    # Convert to mono by selecting the first channel if the audio has multiple channels.
-    if len(data.shape) > 1:
-        data = data[:, 0]
-    
-    # Return the processed audio data.
-    return data, scalar
-    
-def read_audio(file_path):
-    """
-    Use AudioSegment to load audio from all supported audio input format
-    """
-    
-    try:
-        audio = AudioSegment.from_file(file_path)
-        return audio
-    except Exception as e:
-        print(f"Error loading file: {e}")
-        return None
-        
 def audioread(path, sampling_rate, use_norm):
     """
-    Reads an audio file from the specified path, normalizes the audio,
-    resamples it to the desired sampling rate (if necessary), and ensures it is single-channel.
+    Reads an audio file from the specified path, normalizes the audio and
+    resamples it to the desired sampling rate (if necessary). Stereo audio keeps both
+    channels, other multi-channel audio is reduced to its first channel.
 
     Parameters:
     path (str): The file path of the audio file to be read.
-    sampling_rate (int): The target sampling rate for the audio.
+    sampling_rate (int): The target sampling rate for the audio. If None, the audio is kept at its native sampling rate.
     use_norm (bool): The flag for specifying whether using input audio normalization
 
     Returns:
-    numpy.ndarray: The processed audio data, normalized, resampled (if necessary),
-                   and converted to mono (if the input audio has multiple channels).
+    tuple: (audios, scalars, audio_info), where audios is a contiguous float32 array of shape
+           [C, T] holding the processed channels, scalars holds the normalization scalar of
+           each channel, and audio_info describes the input file.
     """
     
-    # Read audio data and its sample rate from the file.
-    audio_info = {}
+    # Decode the file once, directly into a float32 array of shape [T, C].
     ext = get_file_extension(path).replace('.', '')
-    audio_info['ext']=ext
-    
     try:
-        data = AudioSegment.from_file(path)
+        audio_np, audio_info = load_audio(path, ext)
     except Exception as e:
         print(f"Error loading file: {e}")
         return None
-        
-    data = read_audio(path)
-   
-    audio_info['sample_rate'] = data.frame_rate
-    audio_info['channels'] = data.channels
-    audio_info['sample_width'] = data.sample_width
-
-    data_array = np.array(data.get_array_of_samples())
-    if max(data_array) > MAX_WAV_VALUE_16B:
-        audio_np = data_array / MAX_WAV_VALUE_32B
-    else:
-        audio_np = data_array / MAX_WAV_VALUE_16B
-
-    audios = []
-    # Check if the audio is stereo
-    if audio_info['channels'] == 2:
-        audios.append(audio_np[::2])  # Even indices (left channel)
-        audios.append(audio_np[1::2])  # Odd indices (right channel)
-    else:
-        audios.append(audio_np)
-    
-    # Normalize the audio data.
-    audios_normed = []
-    scalars = []
-    for audio in audios:
-        if use_norm:
-            audio_normed, scalar = audio_norm(audio)
-            audios_normed.append(audio_normed)
-            scalars.append(scalar)
-        else:
-            audios_normed.append(audio)
-            scalars.append(1)
+    audio_info['ext'] = ext
+
+    # Keep the left and right channels of stereo audio, the first channel of mono and multi-channel audio
+    if audio_info['channels'] != 2:
+        audio_info['channels'] = 1
+    # De-interleave the kept channels into one [C, T] array, the only copy of the samples
+    audios = np.ascontiguousarray(audio_np[:, :audio_info['channels']].T, dtype=np.float32)
+    
+    # Normalize the audio data, each channel in place.
+    scalars = [1] * len(audios)
+    if use_norm:
+        for i in range(len(audios)):
+            audios[i], scalars[i] = audio_norm(audios[i])
     # Resample the audio if the sample rate is different from the target sampling rate.
-    if audio_info['sample_rate'] != sampling_rate:
-        index = 0
-        for audio_normed in audios_normed:
-            audios_normed[index] = librosa.resample(audio_normed, orig_sr=audio_info['sample_rate'], target_sr=sampling_rate)
-            index = index + 1
+    # All channels are resampled at once with the cached polyphase filter.
+    if sampling_rate is not None and audio_info['sample_rate'] != sampling_rate:
+        audios = resample(audios, audio_info['sample_rate'], sampling_rate)
     
     # Return the processed audio data.
-    return audios_normed, scalars, audio_info
+    return audios, scalars, audio_info
+
+def audiowrite(path, audio, audio_info):
+    """
+    Writes an audio signal to a file with the sample rate, sample width, number of channels
+    and format described by audio_info. WAV, FLAC and AIFF are written by libsndfile, other
+    formats are encoded by ffmpeg from a PCM pipe, without temporary files.
+
+    Parameters:
+    path (str): The file path where the audio will be saved.
+    audio (numpy.ndarray): Audio data in the range [-1, 1], with shape [T] for mono or [T, C] for multi-channel audio.
+    audio_info (dict): Contains 'sample_rate', 'sample_width', 'channels' and 'ext' (the output format).
+    """
+    with AudioFileWriter(path, audio_info) as writer:
+        writer.write(audio)
 
 def audio_norm(x):
     """
@@ -176,6 +122,42 @@ def audio_norm(x):
     # Return the doubly normalized audio signal.
     return x, 1/(scalar * scalarx + EPS)
 
+def audio_norm_stats(read_blocks):
+    """
+    Computes the scaling of audio_norm in two streaming passes over a signal, so that the
+    signal never has to be held in memory. Channels are normalized independently.
+
+    Parameters:
+    read_blocks (callable): Returns a new iterator over consecutive blocks of the signal,
+                            numpy.ndarray of shape [n, C].
+
+    Returns:
+    tuple: (gains, scalars, mean_pows), arrays of shape [C], where x * gains equals the
+           normalized signal of audio_norm, scalars equals its returned scalar, and
+           mean_pows is the mean power of the input signal.
+    """
+    # First pass: the RMS of the input signal.
+    sum_pow, count = 0., 0
+    for block in read_blocks():
+        sum_pow = sum_pow + np.square(block, dtype=np.float64).sum(axis=0)
+        count += block.shape[0]
+    mean_pow = sum_pow / max(count, 1)
+    scalar = 10 ** (-25 / 20) / (mean_pow ** 0.5 + EPS)
+
+    # Second pass: the RMS of the scaled samples with higher-than-average power.
+    avg_pow_x = mean_pow * scalar ** 2
+    sum_high, count_high = 0., 0
+    for block in read_blocks():
+        pow_x = np.square(block * scalar, dtype=np.float64)
+        high = pow_x > avg_pow_x
+        sum_high = sum_high + np.where(high, pow_x, 0.).sum(axis=0)
+        count_high = count_high + high.sum(axis=0)
+    rmsx = (sum_high / np.maximum(count_high, 1)) ** 0.5
+    scalarx = 10 ** (-25 / 20) / (rmsx + EPS)
+
+    gains = scalar * scalarx
+    return gains, 1 / (gains + EPS), mean_pow
+
 class DataReader(object):
     """
     A class for reading audio data from a list of files, normalizing it, 
@@ -234,7 +216,7 @@ class DataReader(object):
         path (str): The file path of the audio file.
 
         Returns:
-        inputs (numpy.ndarray): Reshaped audio data for further processing.
+        inputs (numpy.ndarray): Audio data of shape [C, T] for further processing.
         utt_id (str): The unique identifier of the audio file, usually the filename.
         length (int): The length of the original audio data.
         """
@@ -252,13 +234,194 @@ class DataReader(object):
         if self.args.network in ['MossFormer2_SR_48K']:
             audio_info['sample_rate'] = self.sampling_rate
             
-        for i in range(len(audios_norm)):
-            audios_norm[i] = audios_norm[i].astype(np.float32)
-            # Reshape the data to ensure it's in the format [1, data_length].
-            audios_norm[i] = np.reshape(audios_norm[i], [1, audios_norm[i].shape[0]])
-        
-        # Return the reshaped audio data, utterance ID, and the length of the original data.
-        return audios_norm, utt_id, audios_norm[0].shape[1], scalars, audio_info
+        # Return the [C, T] audio data, utterance ID, and the length of the original data.
+        return audios_norm, utt_id, audios_norm.shape[-1], scalars, audio_info
+
+class PrefetchReader(object):
+    """
+    Iterates over a DataReader while reading the next files in background threads, so that
+    decoding and resampling of files N+1..N+k overlap with the model running on file N.
+    Items are yielded in the original order. At most `prefetch_size` files are held in
+    memory ahead of the consumer.
+
+    Parameters:
+    data_reader (DataReader): The reader that loads a single item by index.
+    prefetch_size (int): Number of items read ahead. If 0, items are read synchronously.
+    num_workers (int): Number of reader threads.
+    """
+
+    def __init__(self, data_reader, prefetch_size=4, num_workers=2):
+        self.data_reader = data_reader
+        self.prefetch_size = max(0, int(prefetch_size))
+        self.num_workers = max(1, int(num_workers))
+
+    def __len__(self):
+        return len(self.data_reader)
+
+    def __iter__(self):
+        num_samples = len(self.data_reader)
+        if self.prefetch_size == 0:
+            for index in range(num_samples):
+                yield self.data_reader[index]
+            return
+
+        # Audio decoding runs in ffmpeg subprocesses and resampling in native code,
+        # so threads are sufficient to keep the reads off the model's critical path
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            pending = deque()
+            next_index = 0
+            try:
+                while next_index < num_samples and len(pending) < self.prefetch_size:
+                    pending.append(executor.submit(self.data_reader.__getitem__, next_index))
+                    next_index += 1
+                while pending:
+                    item = pending.popleft().result()
+                    if next_index < num_samples:
+                        pending.append(executor.submit(self.data_reader.__getitem__, next_index))
+                        next_index += 1
+                    yield item
+            finally:
+                # Drop the reads that have not started if the consumer stops early
+                for future in pending:
+                    future.cancel()
+
+class LongFormReader(object):
+    """
+    Reads a long recording block by block for long-form processing, without decoding the
+    whole file into memory. The channels are selected, normalized and resampled as in
+    audioread, with the normalization statistics computed in a streaming pass over the file.
+
+    Parameters:
+    path (str): The file path of the audio file.
+    sampling_rate (int): The target sampling rate of the blocks.
+    use_norm (bool): Whether to normalize the audio as audio_norm does.
+    block_seconds (float): Length of the blocks read from the file, in seconds.
+
+    Attributes:
+    audio_info (dict): Contains 'sample_rate', 'channels', 'sample_width' and 'ext' of the file.
+    scalars (list): The normalization scalar of each channel, as returned by audioread.
+    mean_squares (numpy.ndarray): The mean power of each normalized channel.
+    length (int): Number of samples per channel at the target sampling rate.
+    """
+
+    def __init__(self, path, sampling_rate, use_norm, block_seconds):
+        ext = get_file_extension(path).replace('.', '')
+        self.reader = AudioFileReader(path, ext)
+        try:
+            self.audio_info = dict(self.reader.audio_info)
+            self.audio_info['ext'] = ext
+            # Stereo audio is processed per channel, other audio keeps its first channel
+            self.num_channels = 2 if self.audio_info['channels'] == 2 else 1
+            self.audio_info['channels'] = self.num_channels
+            self.sampling_rate = sampling_rate or self.audio_info['sample_rate']
+            self.block_size = max(1, int(block_seconds * self.audio_info['sample_rate']))
+
+            read_blocks = lambda: (block[:, :self.num_channels] for block in self.reader.blocks(self.block_size))
+            gains, scalars, mean_pows = audio_norm_stats(read_blocks)
+            if use_norm:
+                self.gains = gains
+                self.scalars = list(scalars)
+            else:
+                self.gains = np.ones(self.num_channels)
+                self.scalars = [1] * self.num_channels
+            self.mean_squares = mean_pows * self.gains ** 2
+            self.length = math.ceil(self.reader.frames * self.sampling_rate / self.audio_info['sample_rate'])
+        except BaseException:
+            self.reader.close()
+            raise
+
+    def blocks(self):
+        """
+        Yields the normalized audio at the target sampling rate in consecutive blocks,
+        float32 arrays of shape [C, n].
+        """
+        resampler = StreamResampler(self.audio_info['sample_rate'], self.sampling_rate)
+        num_blocks = math.ceil(self.reader.frames / self.block_size)
+        for idx, block in enumerate(self.reader.blocks(self.block_size)):
+            block = (block[:, :self.num_channels] * self.gains).T
+            yield resampler.process(block, final=idx == num_blocks - 1).astype(np.float32)
+
+    def close(self):
+        """Closes the file."""
+        self.reader.close()
+
+class LongFormWriter(object):
+    """
+    Writes the output of long-form processing incrementally. Blocks at the model's sampling
+    rate are scaled per channel, resampled back to the rate of the input file and encoded.
+
+    Parameters:
+    path (str): The file path where the audio will be saved.
+    audio_info (dict): Contains 'sample_rate', 'sample_width', 'channels' and 'ext' of the output.
+    sampling_rate (int): The sampling rate of the blocks.
+    gains (list): The scaling of each channel.
+    """
+
+    def __init__(self, path, audio_info, sampling_rate, gains):
+        self.gains = np.asarray(gains, dtype=np.float32).reshape(-1, 1)
+        self.resampler = StreamResampler(sampling_rate, audio_info['sample_rate'])
+        self.writer = AudioFileWriter(path, audio_info)
+
+    def write(self, block, final=False):
+        """
+        Appends a block of shape [C, n]. The file is finished after the final block.
+        """
+        block = self.resampler.process(block * self.gains, final)
+        self.writer.write(block.T)
+        if final:
+            self.close()
+
+    def close(self):
+        """Finishes the file."""
+        self.writer.close()
+
+class LongFormSpooler(object):
+    """
+    Keeps the output of long-form processing in a temporary file, for outputs that are
+    rescaled with statistics of the whole output before they are written.
+
+    Parameters:
+    num_channels (int): Number of channels of the output.
+    """
+
+    def __init__(self, num_channels):
+        self.num_channels = num_channels
+        self.file = tempfile.TemporaryFile()
+        self.sum_pow = np.zeros(num_channels)
+        self.count = 0
+
+    def write(self, block, final=False):
+        """
+        Appends a block of shape [C, n].
+        """
+        self.file.write(np.ascontiguousarray(block.T, dtype=np.float32).tobytes())
+        self.sum_pow += np.square(block, dtype=np.float64).sum(axis=-1)
+        self.count += block.shape[-1]
+
+    def rms(self):
+        """Returns the RMS of each channel of the output written so far."""
+        return (self.sum_pow / max(self.count, 1)) ** 0.5
+
+    def replay(self, writer, block_size):
+        """
+        Passes the spooled output to writer.write() in blocks of block_size samples, then
+        closes the temporary file.
+        """
+        try:
+            self.file.flush()
+            if self.count == 0:
+                writer.write(np.zeros((self.num_channels, 0), dtype=np.float32), final=True)
+                return
+            samples = np.memmap(self.file, dtype=np.float32, mode='r', shape=(self.count, self.num_channels))
+            for start in range(0, self.count, block_size):
+                block = np.array(samples[start:start + block_size]).T
+                writer.write(block, final=start + block_size >= self.count)
+        finally:
+            self.close()
+
+    def close(self):
+        """Closes and removes the temporary file."""
+        self.file.close()
 
 class Wave_Processor(object):
     """
@@ -329,35 +492,16 @@ class Fbank_Processor(object):
     """
     
     def process(self, inputs, args):
-        # Convert frame length and shift from seconds to milliseconds.
-        frame_length = int(args.win_len / args.sampling_rate * 1000)
-        frame_shift = int(args.win_inc / args.sampling_rate * 1000)
-
-        # Set up configuration for the mel-filterbank computation.
-        fbank_config = {
-            "dither": 1.0,
-            "frame_length": frame_length,
-            "frame_shift": frame_shift,
-            "num_mel_bins": args.num_mels,
-            "sample_frequency": args.sampling_rate,
-            "window_type": args.win_type
-        }
+        # Set up configuration for the mel-filterbank computation, with the frame length
+        # and shift truncated to whole milliseconds.
+        config = fbank_config(args, round_ms=True)
 
         # Convert the input audio to a FloatTensor and scale it to match the expected input range.
         inputs = torch.FloatTensor(inputs * MAX_WAV_VALUE)
 
-        # Compute the mel-filterbank features using Kaldi's fbank function.
-        fbank = torchaudio.compliance.kaldi.fbank(inputs.unsqueeze(0), **fbank_config)
-
-        # Add delta and delta-delta features.
-        fbank_tr = torch.transpose(fbank, 0, 1)
-        fbank_delta = torchaudio.functional.compute_deltas(fbank_tr)
-        fbank_delta_delta = torchaudio.functional.compute_deltas(fbank_delta)
-        fbank_delta = torch.transpose(fbank_delta, 0, 1)
-        fbank_delta_delta = torch.transpose(fbank_delta_delta, 0, 1)
-        
-        # Concatenate the original Fbank, delta, and delta-delta features.
-        fbanks = torch.cat([fbank, fbank_delta, fbank_delta_delta], dim=1)
+        # Compute the mel-filterbank features together with the delta and delta-delta features,
+        # reusing the cached window and mel banks.
+        fbanks = fbank_with_deltas(inputs.unsqueeze(0), config)[0]
         
         return fbanks.numpy()
 
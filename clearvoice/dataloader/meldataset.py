@@ -10,6 +10,8 @@ import scipy
 import librosa
 import wave
 from pydub import AudioSegment
+from utils.frontend import get_mel_basis, get_window
+from utils.resample import resample as polyphase_resample
 
 MAX_WAV_VALUE = 32768.0
 
@@ -111,7 +113,8 @@ def resample(audio, sr_in, sr_out, target_len=None):
         return audio
     resample_factor = sr_out / sr_in
     new_samples = int(len(audio) * resample_factor)
-    audio = scipy.signal.resample(audio, new_samples)
+    # Polyphase resampling with a cached filter instead of an FFT over the whole signal
+    audio = polyphase_resample(audio, sr_in, sr_out)[:new_samples]
     return audio
 
 def load_segment(full_path, target_sampling_rate=None, segment_size=None):
@@ -198,10 +201,6 @@ def spectral_de_normalize_torch(magnitudes):
     return output
 
 
-mel_basis = {}
-hann_window = {}
-
-
 def mel_spectrogram(y, n_fft, num_mels, sampling_rate, hop_size, win_size, fmin, fmax, center=False):
     '''
     if torch.min(y) < -1.:
@@ -209,23 +208,19 @@ def mel_spectrogram(y, n_fft, num_mels, sampling_rate, hop_size, win_size, fmin,
     if torch.max(y) > 1.:
         print('max value is ', torch.max(y))
     '''
-    global mel_basis, hann_window
-    if fmax not in mel_basis:
-        #mel = librosa_mel_fn(sampling_rate, n_fft, num_mels, fmin, fmax)
-        # sr, n_fft, n_mels=128, fmin=0.0, fmax
-        mel = librosa.filters.mel(sr=sampling_rate, n_fft=n_fft, n_mels=num_mels, fmin=fmin, fmax=fmax)
-        mel_basis[str(fmax)+'_'+str(y.device)] = torch.from_numpy(mel).float().to(y.device)
-        hann_window[str(y.device)] = torch.hann_window(win_size).to(y.device)
+    # The mel basis and the window are built once per configuration and device
+    mel_basis = get_mel_basis(sampling_rate, n_fft, num_mels, fmin, fmax, device=y.device)
+    window = get_window('hanning', win_size, periodic=True, device=y.device)
 
     y = torch.nn.functional.pad(y.unsqueeze(1), (int((n_fft-hop_size)/2), int((n_fft-hop_size)/2)), mode='reflect')
     y = y.squeeze(1)
 
-    spec = torch.stft(y, n_fft, hop_length=hop_size, win_length=win_size, window=hann_window[str(y.device)],
+    spec = torch.stft(y, n_fft, hop_length=hop_size, win_length=win_size, window=window,
                       center=center, pad_mode='reflect', normalized=False, onesided=True, return_complex=False)
 
     spec = torch.sqrt(spec.pow(2).sum(-1)+(1e-9))
 
-    spec = torch.matmul(mel_basis[str(fmax)+'_'+str(y.device)], spec)
+    spec = torch.matmul(mel_basis, spec)
     spec = spectral_normalize_torch(spec)
 
     return spec
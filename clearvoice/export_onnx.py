@@ -0,0 +1,40 @@
+"""
+Exports ClearVoice models to ONNX files next to their checkpoints, for the onnxruntime
+backend (ClearVoice(..., backend='onnxruntime')). The parts of the models that the decoders
+call are exported with dynamic batch and time axes, and every export is checked against
+torch with ONNX Runtime at a length different from the traced one.
+
+Usage:
+    python export_onnx.py                                            # all models
+    python export_onnx.py speech_enhancement:FRCRN_SE_16K speech_super_resolution:MossFormer2_SR_48K
+"""
+import argparse
+from network_wrapper import network_wrapper
+from utils.onnx_backend import export_onnx
+
+# The models with ONNX exports (MossFormer2_SR_48K has two: the MossFormer2 stage and the vocoder)
+MODELS = [
+    ('speech_enhancement', 'FRCRN_SE_16K'),
+    ('speech_enhancement', 'MossFormerGAN_SE_16K'),
+    ('speech_enhancement', 'MossFormer2_SE_48K'),
+    ('speech_separation', 'MossFormer2_SS_16K'),
+    ('speech_super_resolution', 'MossFormer2_SR_48K'),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description='Export ClearVoice models to ONNX for the onnxruntime backend')
+    parser.add_argument('models', nargs='*', help='models to export as task:model_name (default: all models)')
+    parser.add_argument('--no-check', dest='check', action='store_false', help='skip comparing the exports with torch')
+    args = parser.parse_args()
+
+    models = [tuple(model.split(':', 1)) for model in args.models] if args.models else MODELS
+    for task, model_name in models:
+        model = network_wrapper()(task, model_name)
+        if model is None:
+            print(f'Unable to load {model_name} for {task}')
+            continue
+        for path in export_onnx(model, check=args.check):
+            print(f'{model_name}: wrote {path}')
+
+if __name__ == '__main__':
+    main()
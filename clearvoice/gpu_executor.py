@@ -0,0 +1,198 @@
+import os
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from utils.decode import batch_length
+
+# Default maximum number of channels decoded in one micro-batch
+DEFAULT_GPU_BATCH_SIZE = 8
+# Default time in milliseconds a stage waits for compatible stages of other jobs
+DEFAULT_GPU_BATCH_WAIT_MS = 5
+
+class StageRequest:
+    """
+    One pipeline stage submitted to the GPUExecutor: a model applied to a waveform.
+    """
+
+    def __init__(self, model, audio, sample_rate):
+        self.model = model
+        self.audio = audio
+        self.sample_rate = sample_rate
+        self.future = Future()
+
+    @property
+    def channels(self):
+        return self.audio.shape[0]
+
+    def batch_key(self):
+        """
+        Returns the key of the stages that can be decoded together with this one, or None
+        if this stage has to be decoded on its own (inputs longer than one_time_decode_length).
+        The key includes the batch length of the resampled input (see utils.decode.batch_length),
+        so that the result of a stage does not depend on the stages of other jobs.
+        """
+        args = self.model.args
+        # Length of the input after resampling, see utils.resample.resample
+        length = -(-self.audio.shape[-1] * args.sampling_rate // self.sample_rate)
+        if length > args.sampling_rate * args.one_time_decode_length:
+            return None
+        schedule = getattr(args, 'layer_schedule', None)
+        # The first stage's model decodes the whole batch, so the stages must share its weights and device
+        return (args.task, self.model.name, str(self.model.device), id(self.model.model),
+                getattr(args, 'precision', 'float32'), getattr(args, 'backend', 'torch'),
+                tuple(schedule) if schedule is not None else None, self.sample_rate, batch_length(length, args))
+
+class GPUExecutor:
+    """
+    Runs the model stages of concurrent jobs on one worker thread, so that the jobs share
+    the GPU without competing for it, while their downloads, decoding and encoding run
+    concurrently in other threads.
+
+    Compatible stages of different jobs (the same model weights and device, input sampling
+    rate and batch length, short enough for one-pass decoding) that are queued at the same time are decoded together as
+    one micro-batch of up to max_batch_size channels. A stage waits at most max_wait_ms for
+    other jobs to submit compatible stages.
+
+    Attributes:
+    - max_batch_size: Maximum number of channels decoded in one micro-batch.
+    - max_wait_ms: Time in milliseconds to wait for compatible stages.
+    - batches: Number of micro-batches run so far.
+    - stages: Number of stages run so far.
+    """
+
+    def __init__(self, max_batch_size=None, max_wait_ms=None):
+        """
+        Initializes the executor. The worker thread is started on the first submission.
+
+        Args:
+        - max_batch_size (int, optional): If None, the value of the CLEARVOICE_GPU_BATCH_SIZE
+          environment variable is used (DEFAULT_GPU_BATCH_SIZE if unset).
+        - max_wait_ms (float, optional): If None, the value of the CLEARVOICE_GPU_BATCH_WAIT_MS
+          environment variable is used (DEFAULT_GPU_BATCH_WAIT_MS if unset).
+        """
+        if max_batch_size is None:
+            max_batch_size = int(os.environ.get('CLEARVOICE_GPU_BATCH_SIZE', DEFAULT_GPU_BATCH_SIZE))
+        if max_wait_ms is None:
+            max_wait_ms = float(os.environ.get('CLEARVOICE_GPU_BATCH_WAIT_MS', DEFAULT_GPU_BATCH_WAIT_MS))
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max_wait_ms
+        self.batches = 0
+        self.stages = 0
+        self._queue = queue.Queue()
+        self._backlog = deque()  # Requests taken from the queue that did not fit in a batch
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, model, audio, sample_rate):
+        """
+        Queues a pipeline stage, see SpeechModel.process_tensor.
+
+        Args:
+        - model (SpeechModel): The model of the stage.
+        - audio (torch.Tensor): Input waveform of shape [C, T].
+        - sample_rate (int): Sampling rate of the input waveform.
+
+        Returns:
+        - concurrent.futures.Future: Resolves to the processed waveform of shape [C, T'].
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='clearvoice-gpu', daemon=True)
+                self._thread.start()
+        request = StageRequest(model, audio, sample_rate)
+        self._queue.put(request)
+        return request.future
+
+    def shutdown(self):
+        """
+        Stops the worker thread after the queued stages are done.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _next(self, timeout=None):
+        """
+        Returns the next request from the backlog or the queue, or None on shutdown.
+        Raises queue.Empty if no request arrives within timeout seconds.
+        """
+        if self._backlog:
+            return self._backlog.popleft()
+        return self._queue.get(timeout=timeout)
+
+    def _collect(self, first):
+        """
+        Collects the requests that are decoded together with first.
+        """
+        batch = [first]
+        key = first.batch_key()
+        if key is None:
+            return batch
+        channels = first.channels
+
+        # Compatible requests that are already waiting in the backlog
+        for request in list(self._backlog):
+            if request.batch_key() == key and channels + request.channels <= self.max_batch_size:
+                self._backlog.remove(request)
+                batch.append(request)
+                channels += request.channels
+
+        # Requests arriving from other jobs within the waiting time
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while channels < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)  # Shut down after this batch
+                break
+            if request.batch_key() == key and channels + request.channels <= self.max_batch_size:
+                batch.append(request)
+                channels += request.channels
+            else:
+                self._backlog.append(request)
+        return batch
+
+    def _run(self):
+        """
+        The worker loop: runs micro-batches of compatible stages until shutdown.
+        """
+        while True:
+            first = self._next()
+            if first is None:
+                break
+            batch = [request for request in self._collect(first) if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                # Forks of one model share its weights, so the first request's fork decodes the whole batch
+                outputs = batch[0].model.process_tensors([request.audio for request in batch], batch[0].sample_rate)
+            except BaseException as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            self.batches += 1
+            self.stages += len(batch)
+            for request, output in zip(batch, outputs):
+                request.future.set_result(output)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_gpu_executor():
+    """
+    Returns the process-wide GPUExecutor, creating it on first use.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = GPUExecutor()
+        return _executor
@@ -0,0 +1,117 @@
+"""
+Measures the quality cost of skipping MossFormer2 layers of MossFormer2_SS_16K on a
+calibration set and writes a recommended layer schedule, for
+ClearVoice(..., layer_schedule='layer_schedule.json') (see SpeechModel.set_layer_schedule).
+
+The calibration set is a list file with one mixture per line, followed by its reference
+sources: "mixture.wav source1.wav source2.wav". A few dozen mixtures of a few seconds are
+enough. Starting from all layers, the layer whose removal costs the least permutation-invariant
+SI-SNR is removed, one at a time, until removing any further layer exceeds --max-cost-db
+(or --min-layers is reached). The recommended schedule is the smallest one within the budget.
+
+Usage:
+    python layer_schedule.py --calibration calibration.lst
+    python layer_schedule.py --calibration calibration.lst --max-cost-db 1.0 --device cuda --output layer_schedule.json
+"""
+import json
+import time
+import argparse
+import numpy as np
+import torch
+from network_wrapper import network_wrapper
+from dataloader.dataloader import audioread
+from result_cache import set_result_cache
+from utils.quality import pit_si_snr
+
+TASK = 'speech_separation'
+MODEL_NAME = 'MossFormer2_SS_16K'
+
+def read_calibration(path, sampling_rate):
+    """Returns the (mixture, references) pairs of a calibration list file, with the mixture
+    normalized as DataReader does and the references of shape [num_spks, T]."""
+    items = []
+    with open(path) as f:
+        for line in f:
+            paths = line.split()
+            if len(paths) < 2:
+                continue
+            mixture, _, _ = audioread(paths[0], sampling_rate, True)
+            references = np.stack([audioread(ref, sampling_rate, False)[0][0] for ref in paths[1:]])
+            items.append((mixture[:1], references))
+    if not items:
+        raise ValueError(f'{path} holds no "mixture source1 source2" lines')
+    return items
+
+def evaluate(model, items, layers):
+    """Returns the mean permutation-invariant SI-SNR of the calibration set and the decoding
+    time in seconds when only the given layers are evaluated."""
+    model.set_layer_schedule(layers)
+    scores, seconds = [], 0.0
+    for mixture, references in items:
+        model.data = {'audio': mixture, 'audio_len': mixture.shape[-1]}
+        start = time.perf_counter()
+        with torch.no_grad():
+            outputs = model.decode()
+        if model.device.type == 'cuda':
+            torch.cuda.synchronize()
+        seconds += time.perf_counter() - start
+        estimates = np.stack([output[0] for output in outputs])  # [num_spks, T]
+        scores.append(pit_si_snr(estimates, references))
+    return float(np.mean(scores)), seconds
+
+def main():
+    parser = argparse.ArgumentParser(description=f'Measure the SI-SNR cost of skipping {MODEL_NAME} layers and recommend a schedule')
+    parser.add_argument('--calibration', type=str, required=True, help='list file of "mixture source1 source2" lines')
+    parser.add_argument('--max-cost-db', type=float, default=1.0, help='SI-SNR in dB the recommended schedule may lose')
+    parser.add_argument('--min-layers', type=int, default=1, help='stop removing layers at this number of layers')
+    parser.add_argument('--device', type=str, default='cpu', help='device the model runs on')
+    parser.add_argument('--output', type=str, default='layer_schedule.json', help='the schedule file to write')
+    args = parser.parse_args()
+
+    # Every decode has to run the model
+    set_result_cache(False)
+    model = network_wrapper()(TASK, MODEL_NAME)
+    model.to_device(args.device)
+    model.warmup()
+    items = read_calibration(args.calibration, model.args.sampling_rate)
+
+    layers = list(range(model.args.num_mossformer_layer))
+    baseline, baseline_seconds = evaluate(model, items, layers)
+    print(f'all {len(layers)} layers: {baseline:.2f} dB')
+    steps = []
+    recommended = {'layers': layers, 'si_snr': baseline, 'cost_db': 0.0, 'speedup': 1.0}
+    while len(layers) > args.min_layers:
+        # The layer whose removal costs the least
+        best = None
+        for layer in layers:
+            candidate = [l for l in layers if l != layer]
+            score, seconds = evaluate(model, items, candidate)
+            if best is None or score > best[1]:
+                best = (layer, score, seconds)
+        layer, score, seconds = best
+        layers = [l for l in layers if l != layer]
+        step = {'layers': layers, 'removed': layer, 'si_snr': score, 'cost_db': baseline - score,
+                'speedup': baseline_seconds / seconds}
+        steps.append(step)
+        print(f'{len(layers)} layers (removed {layer}): {score:.2f} dB, cost {step["cost_db"]:.2f} dB, '
+              f'{step["speedup"]:.2f}x')
+        if step['cost_db'] > args.max_cost_db:
+            break
+        recommended = step
+
+    schedule = {
+        'model_name': MODEL_NAME,
+        'num_layers': model.args.num_mossformer_layer,
+        'calibration': args.calibration,
+        'max_cost_db': args.max_cost_db,
+        'baseline_si_snr': baseline,
+        'steps': steps,
+        'recommended': recommended,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(schedule, f, indent=2)
+    print(f'recommended {len(recommended["layers"])} layers: cost {recommended["cost_db"]:.2f} dB, '
+          f'{recommended["speedup"]:.2f}x, written to {args.output}')
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,28 @@
+import time
+# Start of the cold start, before the heavy imports (torch, librosa and the model modules)
+PROCESS_START = time.perf_counter()
 import os
 import shutil
 import base64
+import asyncio
 import runpod
 from clearvoice import ClearVoice
+from model_registry import get_model_registry
+from startup import preload_models, is_warm_start, job_timings
 import tempfile
 import logging
 import json
 import subprocess
+IMPORT_SECONDS = time.perf_counter() - PROCESS_START
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Number of jobs a worker runs at once. Jobs use separate temporary directories, and their
+# model stages share one GPU executor, so this can be raised above 1.
+MAX_CONCURRENCY = int(os.environ.get('CLEARVOICE_MAX_CONCURRENCY', 1))
+
 def enhance_audio(input_path, output_path, model_pipeline, temp_dir='temp'):
     """
     Enhance audio using a pipeline of ClearVoice models.
@@ -20,7 +31,7 @@ def enhance_audio(input_path, output_path, model_pipeline, temp_dir='temp'):
         input_path (str): Path to the input audio file
         output_path (str): Path where the final enhanced audio will be saved
         model_pipeline (list of dict): List of dictionaries containing 'task' and 'model_name' for each step
-        temp_dir (str): Directory to store intermediate files
+        temp_dir (str): Directory for temporary files (intermediate results are kept in memory)
     
     Returns:
         str: Path to the enhanced audio file
@@ -28,27 +39,37 @@ def enhance_audio(input_path, output_path, model_pipeline, temp_dir='temp'):
     # Create temp directory if it doesn't exist
     os.makedirs(temp_dir, exist_ok=True)
     
-    # Track the current file being processed
-    current_file = input_path
+    for i, model_info in enumerate(model_pipeline):
+        logger.info(f"Step {i+1}: {model_info['task']} using {model_info['model_name']}")
+    
+    # Run all steps in memory and encode the result once
+    pipeline = ClearVoice.pipeline(model_pipeline)
+    pipeline(input_path, output_path=output_path)
+    
+    logger.info(f"Final enhanced audio saved to {output_path}")
+    return output_path
+
+async def enhance_audio_async(input_path, output_path, model_pipeline):
+    """
+    Asynchronous version of enhance_audio for concurrent jobs. Decoding and encoding run in
+    worker threads, and the model stages run on the shared GPU executor, which decodes
+    compatible stages of concurrent jobs together.
+    
+    Args:
+        input_path (str): Path to the input audio file
+        output_path (str): Path where the final enhanced audio will be saved
+        model_pipeline (list of dict): List of dictionaries containing 'task' and 'model_name' for each step
     
-    # Iterate through the model pipeline
+    Returns:
+        str: Path to the enhanced audio file
+    """
     for i, model_info in enumerate(model_pipeline):
-        task = model_info['task']
-        model_name = model_info['model_name']
-        
-        logger.info(f"Step {i+1}: {task} using {model_name}")
-        
-        # Generate a unique intermediate file name
-        intermediate_path = os.path.join(temp_dir, f'intermediate_{i}_{model_name}.wav')
-        
-        # Process the audio with the current model
-        process_audio(task, model_name, current_file, intermediate_path)
-        
-        # Update the current file to the intermediate file
-        current_file = intermediate_path
+        logger.info(f"Step {i+1}: {model_info['task']} using {model_info['model_name']}")
     
-    # Move the final result to the output path
-    shutil.copy(current_file, output_path)
+    # Loading the models may read checkpoints, which must not block the event loop
+    loop = asyncio.get_running_loop()
+    pipeline = await loop.run_in_executor(None, ClearVoice.pipeline, model_pipeline)
+    await pipeline.run_async(input_path, output_path=output_path)
     
     logger.info(f"Final enhanced audio saved to {output_path}")
     return output_path
@@ -67,7 +88,11 @@ def process_audio(task, model_name, input_path, output_path):
         str: Path to the processed audio file
     """
     try:
+        # ClearVoice fetches the model from the process-wide registry, so only the
+        # first request for a model pays for building it and loading the checkpoint
         cv = ClearVoice(task=task, model_names=[model_name])
+        registry = get_model_registry()
+        logger.info(f"Model registry: {len(registry)} cached, {registry.hits} hits, {registry.misses} misses")
         processed_wav = cv(input_path=input_path, online_write=False)
         cv.write(processed_wav, output_path=output_path)
         return output_path
@@ -154,9 +179,18 @@ def ensure_wav_format(input_path, temp_dir='temp'):
         logger.error(f"Error converting to WAV: {e}")
         return input_path  # Return original path as fallback
 
-def handler(event):
+def encode_base64_file(path):
+    """
+    Reads a file and returns its base64 encoded content.
     """
-    RunPod serverless handler function.
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode("utf-8")
+
+async def handler(event):
+    """
+    RunPod serverless handler function. Every job works in its own temporary directory,
+    and all blocking work runs outside the event loop, so that several jobs can run at
+    once (see MAX_CONCURRENCY).
     
     Expected input format:
     {
@@ -177,10 +211,16 @@ def handler(event):
         "output": {
             "enhanced_audio": "base64_encoded_enhanced_audio", # If return_type is "base64"
             "file_path": "/path/to/output.wav",                # If return_type is "file"
-            "pipeline_used": [list of models used]
+            "pipeline_used": [list of models used],
+            "timings": {"warm_start": ..., "processing_seconds": ..., "cold_start": {...}}
         }
     }
+    
+    A job is a warm start if all its models were loaded before it started. The cold start
+    timings of the worker (see preload_models) are reported alongside.
     """
+    loop = asyncio.get_running_loop()
+    job_start = time.perf_counter()
     try:
         # Create temporary directories for input and output
         temp_dir = tempfile.mkdtemp()
@@ -194,6 +234,7 @@ def handler(event):
         
         # Log input configuration
         logger.info(f"Processing request with pipeline: {json.dumps(model_pipeline)}")
+        warm_start = is_warm_start(model_pipeline)
         
         # Determine the input source and process accordingly
         if "audio_file" in input_data and isinstance(input_data["audio_file"], dict) and "local_path" in input_data["audio_file"]:
@@ -201,41 +242,42 @@ def handler(event):
             file_path = input_data["audio_file"]["local_path"]
             logger.info(f"Using uploaded file from path: {file_path}")
             # Convert to WAV if needed
-            input_path = ensure_wav_format(file_path, temp_dir)
+            input_path = await loop.run_in_executor(None, ensure_wav_format, file_path, temp_dir)
         elif "input_url" in input_data and input_data["input_url"]:
             # URL input
             url = input_data["input_url"]
             logger.info(f"Downloading audio from URL: {url}")
             download_path = os.path.join(temp_dir, "downloaded_file")
-            read_audio_from_url(url, download_path)
+            await loop.run_in_executor(None, read_audio_from_url, url, download_path)
             # Convert to WAV if needed
-            input_path = ensure_wav_format(download_path, temp_dir)
+            input_path = await loop.run_in_executor(None, ensure_wav_format, download_path, temp_dir)
         elif "audio" in input_data and input_data["audio"]:
             # Base64 input
             logger.info(f"Decoding base64 audio")
-            read_base64_audio(input_data["audio"], input_path)
+            await loop.run_in_executor(None, read_base64_audio, input_data["audio"], input_path)
         else:
             return {"error": "No audio input provided. Please provide 'audio_file', 'input_url', or 'audio'"}
         
         # Enhance the audio
-        enhance_audio(input_path, output_path, model_pipeline, temp_dir=os.path.join(temp_dir, "intermediates"))
+        await enhance_audio_async(input_path, output_path, model_pipeline)
         
         # Prepare the response based on the return type
         response = {
             "output": {
-                "pipeline_used": model_pipeline
+                "pipeline_used": model_pipeline,
+                "timings": job_timings(warm_start, job_start)
             }
         }
         
         if return_type == "base64":
             # Encode the output audio to base64
-            with open(output_path, "rb") as f:
-                encoded_audio = base64.b64encode(f.read()).decode("utf-8")
+            encoded_audio = await loop.run_in_executor(None, encode_base64_file, output_path)
             response["output"]["enhanced_audio"] = encoded_audio
         else:
             # Return the file path
             # Note: In RunPod, this path can be used in subsequent API calls or webhook handlers
-            final_output_path = os.path.join("/tmp", f"enhanced_audio_{os.path.basename(output_path)}")
+            # The name of the job directory keeps the paths of concurrent jobs apart
+            final_output_path = os.path.join("/tmp", f"enhanced_audio_{os.path.basename(temp_dir)}_{os.path.basename(output_path)}")
             shutil.copy(output_path, final_output_path)
             response["output"]["file_path"] = final_output_path
         
@@ -252,7 +294,14 @@ def handler(event):
         logger.error(f"Traceback: {trace}")
         return {"error": str(e), "traceback": trace}
 
+def concurrency_modifier(current_concurrency):
+    """
+    Returns the number of jobs RunPod may run on this worker at once.
+    """
+    return MAX_CONCURRENCY
+
 # Start the RunPod serverless handler
 if __name__ == "__main__":
     logger.info("Starting ClearerVoice-Studio RunPod serverless handler")
-    runpod.serverless.start({"handler": handler})
\ No newline at end of file
+    preload_models(get_default_pipeline(), PROCESS_START, IMPORT_SECONDS)
+    runpod.serverless.start({"handler": handler, "concurrency_modifier": concurrency_modifier})
\ No newline at end of file
@@ -0,0 +1,237 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import torch
+from network_wrapper import network_wrapper
+
+class ModelRegistry:
+    """
+    A process-wide cache of loaded speech models. Building a model means parsing its
+    YAML config, constructing the network and loading the checkpoint, which dominates
+    the cost of short requests. The registry builds each model once and hands out
+    lightweight copies that share the loaded weights.
+
+    Models are keyed by (task, model_name, device, dtype, backend). When the total parameter
+    memory exceeds the budget, the least recently used models are evicted.
+
+    Attributes:
+    - max_memory_mb: Memory budget in MB for the cached models (None or 0 means unbounded).
+    - hits: Number of requests served from the cache.
+    - misses: Number of requests that had to build a model.
+    """
+
+    def __init__(self, max_memory_mb=None):
+        """
+        Initializes an empty registry.
+
+        Args:
+        - max_memory_mb (float, optional): Memory budget in MB. If None, the value of the
+          CLEARVOICE_MODEL_CACHE_MB environment variable is used (unbounded if unset).
+        """
+        if max_memory_mb is None:
+            max_memory_mb = float(os.environ.get('CLEARVOICE_MODEL_CACHE_MB', 0))
+        self.max_memory_mb = max_memory_mb
+        self.hits = 0
+        self.misses = 0
+        self._models = OrderedDict()  # key -> SpeechModel, ordered from least to most recently used
+        self._sizes = {}  # key -> memory footprint in bytes
+        self._lock = threading.Lock()  # Guards _models, _sizes and _build_locks
+        self._build_locks = {}  # key -> lock, so that a model is only built once under concurrency
+
+    @staticmethod
+    def default_device():
+        """
+        Returns the device name that SpeechModel will select for a new model.
+        """
+        return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+    @staticmethod
+    def model_size(speech_model):
+        """
+        Computes the memory footprint in bytes of the parameters and buffers of a SpeechModel,
+        or of its exported files for models on the onnxruntime backend.
+        """
+        if speech_model.backend == 'onnxruntime':
+            return sum(os.path.getsize(path) for path in speech_model.checkpoint_paths if path.endswith('.onnx'))
+        size = 0
+        for tensor in list(speech_model.model.parameters()) + list(speech_model.model.buffers()):
+            size += tensor.numel() * tensor.element_size()
+        return size
+
+    def get(self, task, model_name, device=None, dtype='float32', backend='torch'):
+        """
+        Returns a ready-to-use SpeechModel for the given task and model name, building
+        and caching it on the first request.
+
+        Args:
+        - task (str): The task type (e.g., 'speech_enhancement').
+        - model_name (str): The model name (e.g., 'MossFormer2_SE_48K').
+        - device (str, optional): The device the model runs on. Defaults to default_device().
+        - dtype (str): The precision the model runs in, 'float32', 'float16', 'bfloat16'
+          or 'int8' (see SpeechModel.set_precision).
+        - backend (str): The backend that runs the model, 'torch' or 'onnxruntime'
+          (see SpeechModel.set_backend).
+
+        Returns:
+        - SpeechModel: A copy sharing the cached weights, or None if the model is unsupported.
+        """
+        if dtype == 'int8':
+            device = 'cpu'  # Quantized models only run on the CPU
+        if device is None:
+            device = self.default_device()
+        key = (task, model_name, device, dtype, backend)
+
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return self._models[key].fork()
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        with build_lock:
+            # Another thread may have built the model while we were waiting
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    self.hits += 1
+                    return self._models[key].fork()
+
+            model = network_wrapper()(task, model_name, precision=dtype, backend=backend)
+            if model is None:
+                return None
+            # SpeechModel picks a device itself, the one of the key is used instead
+            model.to_device(device)
+
+            with self._lock:
+                self.misses += 1
+                self._models[key] = model
+                self._sizes[key] = self.model_size(model)
+                self._evict(keep=key)
+            return model.fork()
+
+    def preload(self, stages, device=None, dtype=None, warmup=True, convert_checkpoints=False):
+        """
+        Builds the models of the given pipeline stages ahead of the first request, e.g. at
+        the startup of a serverless worker. Missing checkpoints are downloaded here instead
+        of during a request, and each model decodes a dummy input once (see SpeechModel.warmup).
+
+        Args:
+        - stages (list of dict or list of tuple): The stages, each given as
+          {'task': ..., 'model_name': ..., 'precision': ..., 'backend': ...} (precision and
+          backend are optional) or as
+          a (task, model_name) tuple.
+        - device (str, optional): The device the models run on. Defaults to default_device().
+        - dtype (str, optional): The precision of all models, overriding the stages.
+          Defaults to 'float32'.
+        - warmup (bool): Whether to run the dummy forward pass.
+        - convert_checkpoints (bool): Whether to write fast-loading copies of the checkpoints
+          that do not have one yet (see SpeechModel.convert_checkpoints), so that the next
+          cold start loads faster.
+
+        Returns:
+        - list of dict: One entry per distinct model with 'task', 'model_name', 'load_seconds'
+          (building the model, 0 if it was cached) and 'warmup_seconds'.
+        """
+        timings = []
+        seen = set()
+        for stage in stages:
+            precision, backend = 'float32', 'torch'
+            if isinstance(stage, dict):
+                task, model_name = stage['task'], stage['model_name']
+                precision = stage.get('precision', precision)
+                backend = stage.get('backend', backend)
+            else:
+                task, model_name = stage
+            precision = dtype or precision
+            if (task, model_name, precision, backend) in seen:
+                continue
+            seen.add((task, model_name, precision, backend))
+
+            start = time.perf_counter()
+            model = self.get(task, model_name, device, precision, backend)
+            if model is None:
+                raise ValueError(f'Unable to load {model_name} for {task}')
+            load_seconds = time.perf_counter() - start
+            if convert_checkpoints and model.backend == 'torch' and model.precision != 'int8':
+                model.convert_checkpoints(overwrite=False)
+
+            warmup_seconds = 0.0
+            if warmup:
+                start = time.perf_counter()
+                model.warmup()
+                warmup_seconds = time.perf_counter() - start
+            timings.append({'task': task, 'model_name': model_name, 'precision': precision, 'backend': backend,
+                            'load_seconds': load_seconds, 'warmup_seconds': warmup_seconds})
+        return timings
+
+    def is_loaded(self, task, model_name, device=None, dtype='float32', backend='torch'):
+        """
+        Returns True if the model is cached, i.e. a request for it does not build it.
+        """
+        if dtype == 'int8':
+            device = 'cpu'
+        if device is None:
+            device = self.default_device()
+        return (task, model_name, device, dtype, backend) in self
+
+    def _evict(self, keep):
+        """
+        Evicts the least recently used models until the cache fits in the memory budget.
+        The model identified by `keep` is never evicted. Must be called with the lock held.
+        """
+        if not self.max_memory_mb:
+            return
+        budget = self.max_memory_mb * 1024 * 1024
+        total = sum(self._sizes.values())
+        evicted = False
+        for key in list(self._models.keys()):
+            if total <= budget:
+                break
+            if key == keep:
+                continue
+            del self._models[key]
+            total -= self._sizes.pop(key)
+            evicted = True
+        if evicted and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def set_memory_budget(self, max_memory_mb):
+        """
+        Changes the memory budget and evicts models if the cache no longer fits.
+        """
+        with self._lock:
+            self.max_memory_mb = max_memory_mb
+            if self._models:
+                self._evict(keep=next(reversed(self._models)))
+
+    def clear(self):
+        """
+        Removes all cached models.
+        """
+        with self._lock:
+            self._models.clear()
+            self._sizes.clear()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._models
+
+    def __len__(self):
+        with self._lock:
+            return len(self._models)
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_model_registry():
+    """
+    Returns the process-wide ModelRegistry, creating it on first use.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
@@ -2,6 +2,42 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+def stream_window(x, cache, kernel, padding, final=False):
+    """
+    Builds the input window of one chunk for a streamed convolution over time (dim 3 of
+    [B, C, H, T, 2]) with `kernel` frames, which is zero-padded by `padding` frames on each
+    side in the offline computation.
+
+    Args:
+        x (torch.Tensor): New frames of shape [B, C, H, T, 2].
+        cache (torch.Tensor): The cache returned by the previous call, or None at the stream start.
+        kernel (int): Kernel size over time.
+        padding (int): Zero padding over time on each side.
+        final (bool): If True, the stream ends and the right padding is appended.
+
+    Returns:
+        tuple: The window, the number of output frames (possibly 0) and the cache for the next call.
+    """
+    if cache is None:
+        cache = x.new_zeros(*x.shape[:3], padding, *x.shape[4:])
+    window = torch.cat([cache, x], 3)
+    if final:
+        window = F.pad(window, [0, 0, 0, padding])
+    num_out = max(0, window.size(3) - kernel + 1)
+    return window, num_out, window[:, :, :, num_out:]
+
+
+def stream_delay(x, cache, num_out):
+    """
+    A delay line over time (dim 3 of [B, C, H, T, 2]) that aligns frames with the output of
+    a streamed layer, e.g. for skip connections. Returns the oldest num_out frames and keeps
+    the others as cache.
+    """
+    if cache is not None:
+        x = torch.cat([cache, x], 3)
+    return x[:, :, :, :num_out], x[:, :, :, num_out:]
+
+
 class UniDeepFsmn(nn.Module):
     """
     A single layer Deep Feedforward Sequential Memory Network (FSMN) for unidirectional processing.
@@ -59,6 +95,28 @@ class UniDeepFsmn(nn.Module):
         out1 = out.permute(0, 3, 2, 1)  # Restore original shape
         return input + out1.squeeze()  # Return the combined output
 
+    def stream(self, input, cache=None):
+        """
+        Cached-state forward pass for frame-by-frame (streaming) processing. The memory is
+        causal, so the cache holds the last lorder - 1 projected frames and every input frame
+        gives an output frame at once, the same as forward() on the whole sequence.
+
+        Parameters:
+        - input (Tensor): New frames of shape (batch_size, num_frames, input_dim).
+        - cache (Tensor, optional): The cache returned by the previous call.
+
+        Returns:
+        - tuple: The output frames (batch_size, num_frames, output_dim) and the cache.
+        """
+        if input.size(1) == 0:
+            return input, cache
+        p1 = self.project(F.relu(self.linear(input)))
+        if cache is None:
+            cache = p1.new_zeros(p1.size(0), self.lorder - 1, p1.size(2))  # Offline left padding
+        window = torch.cat([cache, p1], 1)
+        memory = self.conv1(window.unsqueeze(1).permute(0, 3, 2, 1)).permute(0, 3, 2, 1).squeeze(1)
+        return input + p1 + memory, window[:, window.size(1) - (self.lorder - 1):]
+
 
 class ComplexUniDeepFsmn(nn.Module):
     """
@@ -111,6 +169,34 @@ class ComplexUniDeepFsmn(nn.Module):
 
         return output
 
+    def stream(self, x, cache=None):
+        """
+        Cached-state forward pass for frame-by-frame (streaming) processing, see
+        UniDeepFsmn.stream. The memory of each FSMN layer is carried per input part.
+
+        Parameters:
+        - x (Tensor): New frames of shape (batch_size, channels, height, num_frames, 2).
+        - cache (dict, optional): The cache returned by the previous call.
+
+        Returns:
+        - tuple: The output frames, of the same shape as x, and the cache.
+        """
+        cache = {} if cache is None else cache
+        b, c, h, T, d = x.size()
+        x = torch.transpose(torch.reshape(x, (b, c * h, T, d)), 1, 2)
+
+        def fsmn(name, layer, part):
+            out, cache[name] = layer.stream(part, cache.get(name))
+            return out
+
+        real_L1 = fsmn('re_L1_re', self.fsmn_re_L1, x[..., 0]) - fsmn('im_L1_im', self.fsmn_im_L1, x[..., 1])
+        imaginary_L1 = fsmn('re_L1_im', self.fsmn_re_L1, x[..., 1]) + fsmn('im_L1_re', self.fsmn_im_L1, x[..., 0])
+        real = fsmn('re_L2_re', self.fsmn_re_L2, real_L1) - fsmn('im_L2_im', self.fsmn_im_L2, imaginary_L1)
+        imaginary = fsmn('re_L2_im', self.fsmn_re_L2, imaginary_L1) + fsmn('im_L2_re', self.fsmn_im_L2, real_L1)
+
+        output = torch.transpose(torch.stack((real, imaginary), dim=-1), 1, 2)
+        return torch.reshape(output, (b, c, h, T, d)), cache
+
 
 class ComplexUniDeepFsmn_L1(nn.Module):
     """
@@ -318,6 +404,34 @@ class ComplexConv2d(nn.Module):
 
         return output
 
+    def stream(self, x, cache=None, final=False):
+        """
+        Cached-state forward pass for frame-by-frame (streaming) processing over the last
+        axis (time). The cache holds the kernel - 1 last input frames, so only the new frames
+        are convolved. Concatenating the outputs of all calls, the last one with final=True,
+        gives the output of forward() on the whole sequence (zero padding only).
+
+        Args:
+            x (torch.Tensor): New frames of shape (batch, channel, axis1, frames, 2).
+            cache (torch.Tensor, optional): The cache returned by the previous call.
+            final (bool): If True, the stream ends and the right padding is applied.
+
+        Returns:
+            tuple: The completed output frames and the cache.
+        """
+        kernel, padding = self.conv_re.kernel_size[1], self.conv_re.padding[1]
+        window, num_out, cache = stream_window(x, cache, kernel, padding, final)
+        if num_out == 0:
+            # The convolution needs at least one kernel of frames to give the output shape
+            window = window.new_zeros(*window.shape[:3], kernel, 2)
+
+        def conv(part, layer):
+            return F.conv2d(part, layer.weight, layer.bias, layer.stride, (layer.padding[0], 0), layer.dilation, layer.groups)
+
+        real = conv(window[..., 0], self.conv_re) - conv(window[..., 1], self.conv_im)
+        imaginary = conv(window[..., 1], self.conv_re) + conv(window[..., 0], self.conv_im)
+        return torch.stack((real, imaginary), dim=-1)[:, :, :, :num_out], cache
+
 
 class ComplexConvTranspose2d(nn.Module):
     """
@@ -370,6 +484,39 @@ class ComplexConvTranspose2d(nn.Module):
 
         return output
 
+    def stream(self, x, cache=None, final=False):
+        """
+        Cached-state forward pass for frame-by-frame (streaming) processing over the last
+        axis (time), which must have stride 1. An output frame depends on kernel - 1 - padding
+        later input frames, so it is returned once they have arrived, and the cache holds the
+        kernel - 1 last input frames. Concatenating the outputs of all calls, the last one with
+        final=True, gives the output of forward() on the whole sequence.
+
+        Args:
+            x (torch.Tensor): New frames of shape (batch, channel, axis1, frames, 2).
+            cache (torch.Tensor, optional): The cache returned by the previous call.
+            final (bool): If True, the stream ends and all pending frames are returned.
+
+        Returns:
+            tuple: The completed output frames and the cache.
+        """
+        kernel, padding = self.tconv_re.kernel_size[1], self.tconv_re.padding[1]
+        # With stride 1, a transposed convolution is a convolution with kernel - 1 - padding
+        # frames of zero padding on each side
+        window, num_out, cache = stream_window(x, cache, kernel, kernel - 1 - padding, final)
+        if num_out == 0:
+            # The convolution needs at least one kernel of frames to give the output shape
+            window = window.new_zeros(*window.shape[:3], kernel, 2)
+
+        def tconv(part, layer):
+            # Cropping kernel - 1 frames on each side leaves the frames of a full window
+            return F.conv_transpose2d(part, layer.weight, layer.bias, layer.stride, (layer.padding[0], kernel - 1),
+                                      (layer.output_padding[0], 0), layer.groups, layer.dilation)
+
+        real = tconv(window[..., 0], self.tconv_re) - tconv(window[..., 1], self.tconv_im)
+        imaginary = tconv(window[..., 1], self.tconv_re) + tconv(window[..., 0], self.tconv_im)
+        return torch.stack((real, imaginary), dim=-1)[:, :, :, :num_out], cache
+
 class ComplexBatchNorm2d(nn.Module):
     """
     A complex-valued batch normalization layer that normalizes input tensors with 
@@ -114,6 +114,28 @@ class ConvSTFT(nn.Module):
             phase = torch.atan2(imag, real)  # Compute phase
             return mags, phase  # Return magnitude and phase
 
+    def stream(self, inputs, cache=None):
+        """
+        Computes the STFT frames of one chunk of a continuous signal. Samples that do not
+        fill a complete frame yet are returned as cache and prepended to the next chunk, so
+        that feeding a signal chunk by chunk gives the same frames as forward() on the whole.
+
+        Args:
+            inputs (torch.Tensor): New samples of shape (batch_size, length).
+            cache (torch.Tensor, optional): The cache returned by the previous call.
+
+        Returns:
+            tuple: The STFT frames of the chunk in the format of forward(), or None if the
+                   samples do not fill a frame yet, and the cache for the next call.
+        """
+        if cache is not None:
+            inputs = torch.cat([cache, inputs], -1)
+        if inputs.size(-1) < self.win_len:
+            return None, inputs  # Not enough samples for a frame yet
+        num_frames = (inputs.size(-1) - self.win_len) // self.stride + 1
+        outputs = self.forward(inputs[..., :(num_frames - 1) * self.stride + self.win_len])
+        return outputs, inputs[..., num_frames * self.stride:]
+
 
 class ConviSTFT(nn.Module):
     """
@@ -190,6 +212,41 @@ class ConviSTFT(nn.Module):
         outputs = outputs / (coff + 1e-8)  # Normalize the output to prevent division by zero
         return outputs
 
+    def stream(self, inputs, cache=None, phase=None):
+        """
+        Reconstructs the samples of a chunk of STFT frames of a continuous signal. The
+        overlap-add tail of the last frames is kept as cache and added to the next chunk,
+        so that only samples that no later frame contributes to are returned.
+
+        Args:
+            inputs (torch.Tensor): STFT frames of shape [B, N+2, T] (see forward()).
+            cache (tuple, optional): The cache returned by the previous call.
+            phase (torch.Tensor, optional): Phase tensor of shape [B, N//2+1, T].
+
+        Returns:
+            tuple: The completed samples of shape [B, 1, T * win_inc] and the cache, a tuple of
+                   the pending overlap-add signal and normalization.
+        """
+        num_frames = inputs.size(-1)
+        if num_frames == 0:
+            return inputs.new_zeros(inputs.size(0), 1, 0), cache
+        if phase is not None:
+            inputs = torch.cat([inputs * torch.cos(phase), inputs * torch.sin(phase)], 1)
+
+        outputs = F.conv_transpose1d(inputs, self.weight, stride=self.stride)
+        t = self.window.repeat(1, 1, num_frames)**2
+        coff = F.conv_transpose1d(t, self.enframe, stride=self.stride)
+        if cache is not None:
+            # Add the tail of the previous chunk to the overlapping start of this one
+            tail, tail_coff = cache
+            overlap = tail.size(-1)
+            outputs = torch.cat([outputs[..., :overlap] + tail, outputs[..., overlap:]], -1)
+            coff = torch.cat([coff[..., :overlap] + tail_coff, coff[..., overlap:]], -1)
+
+        ready = num_frames * self.stride
+        cache = (outputs[..., ready:], coff[..., ready:])
+        return outputs[..., :ready] / (coff[..., :ready] + 1e-8), cache
+
 
 def test_fft():
     """
@@ -7,6 +7,7 @@ sys.path.append(os.path.dirname(__file__))
 from models.frcrn_se.conv_stft import ConvSTFT, ConviSTFT
 import numpy as np
 from models.frcrn_se.unet import UNet
+from models.frcrn_se.complex_nn import stream_delay
 
 class FRCRN_Wrapper_StandAlone(nn.Module):
     """
@@ -161,7 +162,7 @@ class DCCRN(nn.Module):
         out_list.append(est_mask)
         return out_list
 
-    def inference(self, inputs):
+    def inference(self, inputs, keep_batch=False):
         """
         Inference method for the FRCRN model.
 
@@ -170,22 +171,34 @@ class DCCRN(nn.Module):
 
         Args:
             inputs (torch.Tensor): Input tensor representing audio signals.
+            keep_batch (bool): If True, return the waveforms of the whole batch [B, T]
+                               instead of the first one only.
 
         Returns:
             torch.Tensor: Estimated waveform after processing.
         """
         # Compute the complex spectrogram using STFT
         cmp_spec = self.stft(inputs)  # [B, D*2, T]
-        cmp_spec = torch.unsqueeze(cmp_spec, 1)  # [B, 1, D*2, T]
 
-        # Split into real and imaginary parts
-        cmp_spec = torch.cat([
-            cmp_spec[:, :, :self.feat_dim, :],  # Real part
-            cmp_spec[:, :, self.feat_dim:, :],  # Imaginary part
-        ], 1)  # [B, 2, D, T]
+        # Estimate the clean spectrogram and convert it back to a waveform
+        est_spec = self.enhance_spec(cmp_spec)
+        est_wav = torch.squeeze(self.istft(est_spec), 1)
+        if keep_batch:
+            return est_wav
+        return est_wav[0]  # Return the estimated waveform
 
-        cmp_spec = torch.unsqueeze(cmp_spec, 4)  # [B, 2, D, T, 1]
-        cmp_spec = torch.transpose(cmp_spec, 1, 4)  # [B, 1, D, T, 2]
+    def enhance_spec(self, cmp_spec):
+        """
+        Estimates the clean complex spectrogram from the noisy one. This is the part of
+        inference() between the STFT and the iSTFT, which is also used for streaming.
+
+        Args:
+            cmp_spec (torch.Tensor): Noisy complex spectrogram [B, D*2, T] from self.stft.
+
+        Returns:
+            torch.Tensor: Estimated complex spectrogram [B, D*2, T].
+        """
+        cmp_spec = self.split_spec(cmp_spec)  # [B, 1, D, T, 2]
 
         # Pass through the UNet to estimate masks
         unet1_out = self.unet(cmp_spec)
@@ -195,9 +208,52 @@ class DCCRN(nn.Module):
         cmp_mask2 = torch.tanh(unet2_out)
         cmp_mask2 = cmp_mask2 + cmp_mask1  # Combine masks
 
-        # Apply the estimated mask to compute the estimated waveform
-        _, est_wav, _ = self.apply_mask(cmp_spec, cmp_mask2)
-        return est_wav[0]  # Return the estimated waveform
+        # Apply the estimated mask to the complex spectrogram
+        est_spec, _ = self.mask_spec(cmp_spec, cmp_mask2)
+        return est_spec
+
+    def stream_spec(self, cmp_spec, cache=None, final=False):
+        """
+        Cached-state counterpart of enhance_spec() for frame-by-frame (streaming) processing:
+        only the new STFT frames are run through the UNets (see UNet.stream). The estimated
+        frames lag the input by the look-ahead of the UNet decoders, and the noisy frames and
+        first masks wait in delay lines until the second UNet catches up.
+
+        Args:
+            cmp_spec (torch.Tensor): New noisy STFT frames [B, D*2, T] from self.stft.
+            cache (dict, optional): The cache returned by the previous call.
+            final (bool): If True, the stream ends and all pending frames are returned.
+
+        Returns:
+            tuple: The completed estimated frames [B, D*2, T'] and the cache.
+        """
+        cache = {} if cache is None else cache
+        cmp_spec = self.split_spec(cmp_spec)  # [B, 1, D, T, 2]
+
+        unet1_out, cache['unet'] = self.unet.stream(cmp_spec, cache.get('unet'), final)
+        unet2_out, cache['unet2'] = self.unet2.stream(unet1_out, cache.get('unet2'), final)
+        num_out = unet2_out.size(3)
+        cmp_mask1, cache['mask1'] = stream_delay(torch.tanh(unet1_out), cache.get('mask1'), num_out)
+        cmp_spec, cache['spec'] = stream_delay(cmp_spec, cache.get('spec'), num_out)
+
+        est_spec, _ = self.mask_spec(cmp_spec, torch.tanh(unet2_out) + cmp_mask1)
+        return est_spec, cache
+
+    def split_spec(self, cmp_spec):
+        """
+        Converts a complex spectrogram [B, D*2, T] from self.stft into the UNet input
+        layout [B, 1, D, T, 2] with separate real and imaginary parts.
+        """
+        cmp_spec = torch.unsqueeze(cmp_spec, 1)  # [B, 1, D*2, T]
+
+        # Split into real and imaginary parts
+        cmp_spec = torch.cat([
+            cmp_spec[:, :, :self.feat_dim, :],  # Real part
+            cmp_spec[:, :, self.feat_dim:, :],  # Imaginary part
+        ], 1)  # [B, 2, D, T]
+
+        cmp_spec = torch.unsqueeze(cmp_spec, 4)  # [B, 2, D, T, 1]
+        return torch.transpose(cmp_spec, 1, 4)  # [B, 1, D, T, 2]
 
     def apply_mask(self, cmp_spec, cmp_mask):
         """
@@ -210,6 +266,22 @@ class DCCRN(nn.Module):
         Returns:
             tuple: Estimated spectrogram, waveform, and mask.
         """
+        est_spec, cmp_mask = self.mask_spec(cmp_spec, cmp_mask)
+        est_wav = self.istft(est_spec)  # Inverse STFT to obtain waveform
+        est_wav = torch.squeeze(est_wav, 1)  # Remove unnecessary dimensions
+        return est_spec, est_wav, cmp_mask
+
+    def mask_spec(self, cmp_spec, cmp_mask):
+        """
+        Multiplies the complex spectrogram with the complex mask.
+
+        Args:
+            cmp_spec (torch.Tensor): Complex spectrogram tensor [B, 1, D, T, 2].
+            cmp_mask (torch.Tensor): Estimated mask tensor [B, 1, D, T, 2].
+
+        Returns:
+            tuple: Estimated spectrogram [B, D*2, T] and mask [B, D*2, T].
+        """
         # Compute the estimated complex spectrogram using masks
         est_spec = torch.cat([
             cmp_spec[:, :, :, :, 0] * cmp_mask[:, :, :, :, 0] - cmp_spec[:, :, :, :, 1] * cmp_mask[:, :, :, :, 1],
@@ -220,9 +292,7 @@ class DCCRN(nn.Module):
         cmp_mask = torch.squeeze(cmp_mask, 1)
         cmp_mask = torch.cat([cmp_mask[:, :, :, 0], cmp_mask[:, :, :, 1]], 1)  # Combine masks
 
-        est_wav = self.istft(est_spec)  # Inverse STFT to obtain waveform
-        est_wav = torch.squeeze(est_wav, 1)  # Remove unnecessary dimensions
-        return est_spec, est_wav, cmp_mask
+        return est_spec, cmp_mask
 
     def get_params(self, weight_decay=0.0):
         """
@@ -75,3 +75,35 @@ class SELayer(nn.Module):
 
         # Scale the input features by the attention weights
         return x * y
+
+    def stream(self, x, cache=None):
+        """
+        Causal counterpart of forward() for frame-by-frame (streaming) processing. The global
+        average over the whole input is not known before the input ends, so each frame is
+        scaled with the attention weights of the average over the frames seen so far. The
+        cache holds the running sum and count. Unlike the other streamed layers, the output
+        therefore differs from forward(), most at the start of a stream.
+
+        Args:
+            x (torch.Tensor): New frames of shape (B, C, D, T, 2).
+            cache (tuple, optional): The cache returned by the previous call.
+
+        Returns:
+            tuple: The output frames, same shape as `x`, and the cache.
+        """
+        b, c, d, t, _ = x.size()
+        if t == 0:
+            return x, cache
+        total, count = cache if cache is not None else (0.0, 0)
+
+        # Running averages over frequency and all frames up to each frame, [B, T, C, 2]
+        sums = total + torch.cumsum(x.sum(2), dim=2)
+        counts = count + d * torch.arange(1, t + 1, device=x.device, dtype=x.dtype)
+        means = (sums / counts[:, None]).transpose(1, 2)
+        x_r, x_i = means[..., 0], means[..., 1]
+
+        # Attention weights of each frame, [B, C, 1, T, 2]
+        y_r = self.fc_r(x_r) - self.fc_i(x_i)
+        y_i = self.fc_r(x_i) + self.fc_i(x_r)
+        y = torch.stack([y_r, y_i], -1).transpose(1, 2).unsqueeze(2)
+        return x * y, (sums[:, :, -1:], count + d * t)
@@ -0,0 +1,113 @@
+import torch
+import numpy as np
+
+class StreamingFRCRN:
+    """
+    A streaming (chunk-in/chunk-out) inference session for the FRCRN model.
+
+    Audio is pushed in chunks of any length, typically frames of win_inc samples, and
+    enhanced samples are returned as soon as they are final. Only the new STFT frames of a
+    chunk are run through the model, whose layers carry their state between chunks (see
+    DCCRN.stream_spec and UNet.stream):
+    - the STFT framing buffer (samples that do not fill a frame yet),
+    - the last input frames of every convolution and the memory of the time FSMN layers,
+    - the frames held back for the look-ahead of the transposed convolutions and the
+      skip connections and masks that wait for them,
+    - the running averages of the squeeze-and-excitation layers,
+    - the iSTFT overlap-add tail.
+
+    The UNet decoders use transposed convolutions that look one frame ahead each, so a
+    frame can only be emitted once `lookahead_frames` later frames are available. The
+    algorithmic delay is therefore fixed to `latency` samples, and the cost per chunk is
+    proportional to its number of frames.
+
+    The squeeze-and-excitation layers pool over the whole input in offline inference, which
+    a stream cannot know in advance; streamed, they pool over the frames seen so far. This
+    is the only difference to offline inference, and it fades as the stream gets longer
+    (see tests/test_frcrn_streaming.py).
+
+    Example:
+        session = StreamingFRCRN(model)
+        for frame in frames:  # each frame holds win_inc samples
+            enhanced = session.process(frame)
+        enhanced_tail = session.flush()
+
+    Args:
+        model (DCCRN or FRCRN_SE_16K): The loaded FRCRN model in evaluation mode.
+    """
+
+    def __init__(self, model):
+        # Accept both the DCCRN network and its FRCRN_SE_16K wrapper
+        if not hasattr(model, 'unet'):
+            model = model.model
+        self.model = model
+        self.device = next(self.model.parameters()).device
+        self.frame_size = self.model.win_inc
+        # One frame of look-ahead per decoder of the two UNets
+        self.lookahead_frames = self.model.unet.model_length + self.model.unet2.model_length
+        self.reset()
+
+    @property
+    def latency(self):
+        """The algorithmic delay in samples between an input sample and its enhanced output."""
+        return self.model.win_len - self.model.win_inc + self.lookahead_frames * self.model.win_inc
+
+    def reset(self):
+        """
+        Clears the state so that the session can be used for a new stream.
+        """
+        self.stft_cache = None  # Samples that do not fill an STFT frame yet
+        self.model_cache = None  # Layer states of the model, see DCCRN.stream_spec
+        self.istft_cache = None  # Overlap-add tail of the emitted frames
+
+    def process(self, chunk):
+        """
+        Pushes a chunk of noisy audio and returns the enhanced samples that are final.
+
+        Args:
+            chunk (numpy.ndarray or torch.Tensor): Noisy samples of shape [T].
+
+        Returns:
+            torch.Tensor: Enhanced samples of shape [T'], possibly empty. Over the whole
+                          stream, the output lags the input by `latency` samples.
+        """
+        if isinstance(chunk, np.ndarray):
+            chunk = torch.from_numpy(np.float32(chunk))
+        chunk = chunk.to(self.device, torch.float32).reshape(1, -1)
+
+        with torch.no_grad():
+            frames, self.stft_cache = self.model.stft.stream(chunk, self.stft_cache)
+            if frames is None:
+                return chunk.new_zeros(0)
+            return self._emit(frames)
+
+    def flush(self):
+        """
+        Ends the stream: emits the frames held back for look-ahead and the overlap-add tail,
+        then resets the session. Trailing samples that do not fill an STFT frame are dropped,
+        as in offline inference.
+
+        Returns:
+            torch.Tensor: The remaining enhanced samples of shape [T'].
+        """
+        outputs = []
+        with torch.no_grad():
+            if self.model_cache is not None:
+                frames = torch.zeros(1, 2 * self.model.feat_dim, 0, device=self.device)
+                outputs.append(self._emit(frames, final=True))
+            if self.istft_cache is not None:
+                tail, tail_coff = self.istft_cache
+                outputs.append((tail / (tail_coff + 1e-8)).reshape(-1))
+        self.reset()
+        if not outputs:
+            return torch.zeros(0, device=self.device)
+        return torch.cat(outputs)
+
+    def _emit(self, frames, final=False):
+        """
+        Runs new STFT frames through the model and converts the completed estimated frames
+        to samples.
+        """
+        est_spec, self.model_cache = self.model.stream_spec(frames, self.model_cache, final)
+        est_wav, self.istft_cache = self.model.istft.stream(est_spec, self.istft_cache)
+        return est_wav.reshape(-1)
@@ -2,6 +2,7 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import models.frcrn_se.complex_nn as complex_nn
+from models.frcrn_se.complex_nn import stream_delay
 from models.frcrn_se.se_layer import SELayer
 
 
@@ -57,6 +58,16 @@ class Encoder(nn.Module):
         x = self.relu(x)   # Apply Leaky ReLU activation
         return x
 
+    def stream(self, x, cache=None, final=False):
+        """
+        Cached-state forward pass over the time axis (W), see ComplexConv2d.stream.
+
+        Returns:
+            tuple: The completed output frames and the cache.
+        """
+        x, cache = self.conv.stream(x, cache, final)
+        return self.relu(self.bn(x)), cache
+
 
 class Decoder(nn.Module):
     """
@@ -106,6 +117,16 @@ class Decoder(nn.Module):
         x = self.relu(x)       # Apply Leaky ReLU activation
         return x
 
+    def stream(self, x, cache=None, final=False):
+        """
+        Cached-state forward pass over the time axis (W), see ComplexConvTranspose2d.stream.
+
+        Returns:
+            tuple: The completed output frames and the cache.
+        """
+        x, cache = self.transconv.stream(x, cache, final)
+        return self.relu(self.bn(x)), cache
+
 
 class UNet(nn.Module):
     """
@@ -239,6 +260,55 @@ class UNet(nn.Module):
         cmp_spec = self.linear(p)  # Apply linear transformation to produce final output
         return cmp_spec  # Return the computed output tensor
 
+    def stream(self, inputs, cache=None, final=False):
+        """
+        Cached-state forward pass for frame-by-frame (streaming) processing over the time
+        axis. Every convolution carries its last input frames and the time FSMN its memory,
+        so only the new frames are processed. The transposed convolutions of the decoders look
+        one frame ahead each, so the output lags the input by model_length frames, and the
+        skip connections wait in delay lines until the decoders catch up. The FSMN layers of
+        the encoders and decoders run over frequency and need no state.
+
+        Concatenating the outputs of all calls, the last one with final=True, gives the
+        frames of forward() on the whole input, except that the SE layers use the average
+        of the frames seen so far (see SELayer.stream).
+
+        Args:
+            inputs (torch.Tensor): New frames of shape (batch_size, channels, height, frames, 2).
+            cache (dict, optional): The cache returned by the previous call.
+            final (bool): If True, the stream ends and all pending frames are returned.
+
+        Returns:
+            tuple: The completed output frames and the cache.
+        """
+        cache = {} if cache is None else cache
+        x = inputs
+        xs_se = []  # Streamed SE outputs of the encoders, used for the skip connections
+
+        for i, encoder in enumerate(self.encoders):
+            if i > 0:
+                x = self.fsmn_enc[i](x)
+            x, cache['encoder{}'.format(i)] = encoder.stream(x, cache.get('encoder{}'.format(i)), final)
+            x_se, cache['se_layer_enc{}'.format(i)] = self.se_layers_enc[i].stream(x, cache.get('se_layer_enc{}'.format(i)))
+            xs_se.append(x_se)
+
+        p, cache['fsmn'] = self.fsmn.stream(x, cache.get('fsmn'))
+
+        for i, decoder in enumerate(self.decoders):
+            p, cache['decoder{}'.format(i)] = decoder.stream(p, cache.get('decoder{}'.format(i)), final)
+            if i < self.model_length - 1:
+                p = self.fsmn_dec[i](p)
+            if i == self.model_length - 1:
+                break
+            if i < self.model_length - 2:
+                p, cache['se_layer_dec{}'.format(i)] = self.se_layers_dec[i].stream(p, cache.get('se_layer_dec{}'.format(i)))
+            # The encoder frames are ahead of the decoder frames by the look-ahead of the decoders
+            skip, cache['skip{}'.format(i)] = stream_delay(xs_se[self.model_length - 2 - i], cache.get('skip{}'.format(i)), p.size(3))
+            p = torch.cat([p, skip], dim=1)
+
+        cmp_spec, _ = self.linear.stream(p)
+        return cmp_spec, cache
+
     def set_size(self, model_complexity, model_depth=20, input_channels=1):
         """
         Set the architecture parameters for the UNet model based on specified complexity and depth.
@@ -3,6 +3,7 @@ import torch.nn as nn
 from torch import Tensor
 import torch.nn.init as init
 import torch.nn.functional as F
+from models.mossformer2_se.fsmn import stream_memory
 
 EPS = 1e-8
 
@@ -300,6 +301,23 @@ class ConvModule(nn.Module):
     def forward(self, inputs: Tensor) -> Tensor:
         return inputs + self.sequential(inputs).transpose(1, 2)
 
+    def stream(self, inputs: Tensor, cache=None, final=False):
+        """
+        Cached-state forward pass for chunk-by-chunk (streaming) processing. The output lags
+        the input by (kernel_size - 1) // 2 frames. See fsmn.stream_memory.
+
+        Inputs: inputs, cache, final
+            inputs (batch, time, dim): New frames of the sequence
+            cache: The cache returned by the previous call, or None at the stream start
+            final (bool): If True, the stream ends and all pending frames are returned
+        Outputs: outputs, cache
+            outputs (batch, time', dim): The completed output frames
+        """
+        context = (self.sequential[1].conv.kernel_size[0] - 1) // 2
+        # The depthwise convolution pads the window itself, only its center frames are kept
+        conv_fn = lambda window: self.sequential(window).transpose(1, 2)[:, context:window.size(1) - context]
+        return stream_memory(conv_fn, inputs, cache, context, final)
+
 class ConvModule_Dilated(nn.Module):
     """
     Conformer convolution module starts with a pointwise convolution and a gated linear unit (GLU).
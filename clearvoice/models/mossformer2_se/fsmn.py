@@ -5,6 +5,152 @@ from torch.nn.parameter import Parameter
 import numpy as np
 import os
 
+def stream_window(inputs, cache, context, final=False):
+    """
+    Builds the input window of one chunk for a 'same'-padded convolution over time that uses
+    `context` frames on each side. The cache holds the frames of earlier chunks that are still
+    needed: `context` frames of left context and the frames that still lack right context.
+
+    Args:
+        inputs (torch.Tensor): New frames of shape (batch_size, num_frames, dim).
+        cache (torch.Tensor): The cache returned by the previous call, or None at the stream start.
+        context (int): Number of context frames on each side.
+        final (bool): If True, the stream ends and the missing right context is zero-padded.
+
+    Returns:
+        tuple: The window of shape (batch_size, num_out + 2 * context, dim), from which num_out
+               (possibly 0) output frames can be computed, and the cache for the next call.
+    """
+    if cache is None:
+        # The left context of the first frame is zero, as in the offline padding
+        cache = inputs.new_zeros(inputs.size(0), context, inputs.size(2))
+    window = th.cat([cache, inputs], 1)
+    if final:
+        window = F.pad(window, [0, 0, 0, context])
+    num_out = max(0, window.size(1) - 2 * context)
+    return window, window[:, num_out:]
+
+
+def stream_delay(inputs, cache, num_out):
+    """
+    A delay line that aligns frames with the output of a streamed convolution, e.g. for
+    residual connections. Returns the oldest num_out frames and keeps the others as cache.
+
+    Args:
+        inputs (torch.Tensor): New frames of shape (batch_size, num_frames, dim).
+        cache (torch.Tensor): The cache returned by the previous call, or None.
+        num_out (int): Number of frames to release.
+
+    Returns:
+        tuple: The released frames and the cache for the next call.
+    """
+    if cache is not None:
+        inputs = th.cat([cache, inputs], 1)
+    return inputs[:, :num_out], inputs[:, num_out:]
+
+
+def stream_memory(conv_fn, inputs, cache, context, final=False):
+    """
+    Streams a memory block x + conv(x), where conv is a convolution over time with `context`
+    frames on each side. Feeding a sequence chunk by chunk gives the same frames as the offline
+    computation, delayed by `context` frames.
+
+    Args:
+        conv_fn (callable): Maps a window of shape (batch_size, num_out + 2 * context, dim) to
+            the convolution output of the num_out center frames (batch_size, num_out, dim).
+        inputs (torch.Tensor): New frames of shape (batch_size, num_frames, dim).
+        cache (torch.Tensor): The cache returned by the previous call, or None.
+        context (int): Number of context frames on each side.
+        final (bool): If True, the stream ends and all pending frames are returned.
+
+    Returns:
+        tuple: The completed output frames (batch_size, num_out, dim) and the cache.
+    """
+    window, cache = stream_window(inputs, cache, context, final)
+    num_out = window.size(1) - 2 * context
+    if num_out <= 0:
+        return inputs[:, :0], cache
+    return window[:, context:context + num_out] + conv_fn(window), cache
+
+
+class StreamingSession(object):
+    """
+    A chunk-in/chunk-out session over a layer or block with a stream() method, e.g.
+    UniDeepFsmn, Gated_FSMN_Block or MossformerBlock_GFSMN. The session holds the cache of
+    the stream() calls, so that a sequence can be pushed in chunks of any length:
+
+        session = StreamingSession(block)
+        for chunk in chunks:  # each chunk of shape (batch_size, frames, dim)
+            outputs = session.process(chunk)
+        outputs_tail = session.flush()
+
+    Joined, the outputs equal the output of the module's forward() on the whole sequence,
+    delayed by the look-ahead of its convolutions.
+
+    Attention layers (FLASH_ShareA_FFConvM) only stream causally. Modules with attention
+    layers built with causal=False, such as those of the shipped checkpoints, are refused
+    unless approximate=True: their streamed outputs then differ from forward().
+
+    Args:
+        module (nn.Module): The layer or block to stream, in evaluation mode.
+        approximate (bool): Whether to accept non-causal attention layers.
+    """
+
+    def __init__(self, module, approximate=False):
+        non_causal = [name for name, layer in module.named_modules() if getattr(layer, 'causal', None) is False]
+        if non_causal and not approximate:
+            raise ValueError(f'{type(module).__name__} has non-causal attention layers ({non_causal[0]}), '
+                             f'which stream approximately only; pass approximate=True to stream it anyway')
+        self.module = module
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the state so that the session can be used for a new sequence.
+        """
+        self.cache = None
+        self.last_chunk = None  # Gives the batch size and feature dimension of the flush
+
+    def process(self, chunk):
+        """
+        Pushes the next frames of the sequence and returns the output frames that are complete.
+
+        Args:
+            chunk (torch.Tensor): New frames of shape (batch_size, frames, dim).
+
+        Returns:
+            torch.Tensor: The completed output frames (batch_size, frames', dim), possibly none.
+        """
+        with th.no_grad():
+            outputs, self.cache = self.module.stream(chunk, self.cache)
+        self.last_chunk = chunk
+        return outputs
+
+    def flush(self):
+        """
+        Ends the sequence: returns the output frames that were held back for look-ahead and
+        resets the session.
+
+        Returns:
+            torch.Tensor: The remaining output frames (batch_size, frames', dim).
+        """
+        if self.last_chunk is None:
+            raise ValueError('flush() needs at least one process() call')
+        with th.no_grad():
+            outputs, _ = self.module.stream(self.last_chunk[:, :0], self.cache, final=True)
+        self.reset()
+        return outputs
+
+
+def fsmn_memory(conv, window):
+    """
+    Applies an FSMN memory convolution (Conv2d over [batch, dim, time, 1]) without padding to a
+    window of shape (batch_size, frames, dim), returning (batch_size, frames - kernel + 1, dim).
+    """
+    x_per = th.unsqueeze(window, 1).permute(0, 3, 2, 1)
+    return conv(x_per).permute(0, 3, 2, 1).squeeze(1)
+
+
 class UniDeepFsmn(nn.Module):
     """
     UniDeepFsmn is a neural network module that implements a single-deep feedforward sequence memory network (FSMN).
@@ -53,6 +199,27 @@ class UniDeepFsmn(nn.Module):
         out1 = out.permute(0, 3, 2, 1)  # Permute back to original dimensions
         return input + out1.squeeze()  # Return enhanced input
 
+    def stream(self, input, cache=None, final=False):
+        """
+        Cached-state forward pass for chunk-by-chunk (streaming) processing. The memory block
+        carries its left context between calls and waits for lorder - 1 frames of right
+        context, so the output lags the input by lorder - 1 frames. Concatenating the outputs
+        of all calls, the last one with final=True, gives the output of forward() on the whole.
+
+        Args:
+            input (torch.Tensor): New frames of shape (batch_size, num_frames, input_dim).
+            cache (dict, optional): The cache returned by the previous call.
+            final (bool): If True, the stream ends and all pending frames are returned.
+
+        Returns:
+            tuple: The completed output frames (batch_size, num_out, output_dim) and the cache.
+        """
+        cache = {} if cache is None else cache
+        p1 = self.project(F.relu(self.linear(input)))  # Project to output dimension
+        out, cache['memory'] = stream_memory(lambda w: fsmn_memory(self.conv1, w), p1, cache.get('memory'), self.lorder - 1, final)
+        residual, cache['input'] = stream_delay(input, cache.get('input'), out.size(1))
+        return residual + out, cache
+
 
 class UniDeepFsmn_dual(nn.Module):
     """
@@ -108,6 +275,28 @@ class UniDeepFsmn_dual(nn.Module):
         out1 = out.permute(0, 3, 2, 1)  # Permute back to original dimensions
         return input + out1.squeeze()  # Return enhanced input
 
+    def stream(self, input, cache=None, final=False):
+        """
+        Cached-state forward pass for chunk-by-chunk (streaming) processing, see
+        UniDeepFsmn.stream. Each of the two memory blocks waits for lorder - 1 frames of
+        right context, so the output lags the input by 2 * (lorder - 1) frames.
+
+        Args:
+            input (torch.Tensor): New frames of shape (batch_size, num_frames, input_dim).
+            cache (dict, optional): The cache returned by the previous call.
+            final (bool): If True, the stream ends and all pending frames are returned.
+
+        Returns:
+            tuple: The completed output frames (batch_size, num_out, output_dim) and the cache.
+        """
+        cache = {} if cache is None else cache
+        context = self.lorder - 1
+        p1 = self.project(F.relu(self.linear(input)))  # Project to output dimension
+        conv1_out, cache['memory1'] = stream_memory(lambda w: fsmn_memory(self.conv1, w), p1, cache.get('memory1'), context, final)
+        out, cache['memory2'] = stream_memory(lambda w: fsmn_memory(self.conv2, w), conv1_out, cache.get('memory2'), context, final)
+        residual, cache['input'] = stream_delay(input, cache.get('input'), out.size(1))
+        return residual + out, cache
+
 
 class DilatedDenseNet(nn.Module):
     """
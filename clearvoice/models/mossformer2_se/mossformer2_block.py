@@ -9,7 +9,7 @@ from torch import nn, einsum
 from einops import rearrange
 from rotary_embedding_torch import RotaryEmbedding
 from models.mossformer2_se.conv_module import ConvModule, GLU, FFConvM_Dilated
-from models.mossformer2_se.fsmn import UniDeepFsmn, UniDeepFsmn_dilated
+from models.mossformer2_se.fsmn import UniDeepFsmn, UniDeepFsmn_dilated, stream_delay
 from torchinfo import summary
 from models.mossformer2_se.layer_norm import CLayerNorm, GLayerNorm, GlobLayerNorm, ILayerNorm
 
@@ -219,6 +219,24 @@ class FFConvM(nn.Module):
         output = self.mdl(x)  # Pass through the model
         return output
 
+    def stream(self, x, cache=None, final=False):
+        """
+        Cached-state forward pass for chunk-by-chunk (streaming) processing. Only the
+        convolution module needs context, so the output lags the input by its
+        (kernel_size - 1) // 2 frames.
+
+        Args:
+            x (torch.Tensor): New frames of shape (batch, frames, dim_in).
+            cache (optional): The cache returned by the previous call.
+            final (bool): If True, the stream ends and all pending frames are returned.
+
+        Returns:
+            tuple: The completed output frames and the cache.
+        """
+        norm, linear, act, conv, dropout = self.mdl
+        output, cache = conv.stream(act(linear(norm(x))), cache, final)
+        return dropout(output), cache
+
 class FFM(nn.Module):
     """
     FFM is a feed-forward module with normalization and dropout.
@@ -441,6 +459,119 @@ class FLASH_ShareA_FFConvM(nn.Module):
         # Reshape and remove padding from outputs
         return map(lambda t: rearrange(t, 'b g n d -> b (g n) d')[:, :n], (quad_out_v + lin_out_v, quad_out_u + lin_out_u))
 
+    def stream(self, x, cache=None, final=False):
+        """
+        Chunked causal forward pass for incremental inference. Every call takes the next
+        frames of the sequence and returns the frames that are complete; the state of
+        the token shift, the convolution modules and the attention is kept in the cache.
+        The output lags the input by the look-ahead of to_hidden and to_out (2 x 8 frames
+        with the default settings), and the cost per call only depends on the chunk length.
+
+        The attention runs as in the causal branch of cal_attention: the quadratic
+        attention is restricted to earlier frames of the current group and the linear
+        attention uses the lin_kv / lin_ku sums of the completed groups, which are carried
+        between calls. For layers built with causal=True, the concatenated outputs equal
+        those of forward() on the whole sequence. Layers trained non-causally can run
+        this way too, at some cost in quality.
+
+        Args:
+            x (Tensor): New frames of shape (batch, frames, features).
+            cache (dict, optional): The cache returned by the previous call.
+            final (bool): If True, the stream ends and all pending frames are returned.
+
+        Returns:
+            tuple: The completed output frames and the cache.
+        """
+        cache = {} if cache is None else cache
+        normed_x = x
+        residual = x
+
+        # Token shifting with the last frame of the previous chunk
+        if self.shift_tokens:
+            x_shift, x_pass = normed_x.chunk(2, dim=-1)
+            previous = cache.get('shift', x_shift.new_zeros(x_shift.size(0), 1, x_shift.size(2)))
+            x_shift = torch.cat((previous, x_shift), dim=1)
+            cache['shift'] = x_shift[:, -1:]
+            normed_x = torch.cat((x_shift[:, :-1], x_pass), dim=-1)
+
+        # Initial projections, delayed by the look-ahead of the convolution modules
+        hidden, cache['to_hidden'] = self.to_hidden.stream(normed_x, cache.get('to_hidden'), final)
+        qk, cache['to_qk'] = self.to_qk.stream(normed_x, cache.get('to_qk'), final)
+        v, u = hidden.chunk(2, dim=-1)
+
+        quad_q, lin_q, quad_k, lin_k = self.qk_offset_scale(qk)
+        att_v, att_u = self.stream_attention(quad_q, lin_q, quad_k, lin_k, v, u, cache)
+
+        # Output calculation with gating
+        out = (att_u * v) * self.gateActivate(att_v * u)
+        out, cache['to_out'] = self.to_out.stream(out, cache.get('to_out'), final)
+        residual, cache['residual'] = stream_delay(residual, cache.get('residual'), out.size(1))
+        return residual + out, cache
+
+    def stream_attention(self, quad_q, lin_q, quad_k, lin_k, v, u, cache):
+        """
+        Causal attention over the next frames of a sequence, see stream(). The cache holds the
+        position of the next frame, the keys and values of the current (incomplete) group and
+        the linear attention sums of the completed groups.
+
+        Args:
+            quad_q, lin_q, quad_k, lin_k, v, u (Tensor): Projections of the new frames,
+                each of shape (batch, frames, dim).
+            cache (dict): The attention state, updated in place.
+
+        Returns:
+            Tuple[Tensor, Tensor]: Attention outputs for v and u of shape (batch, frames, dim).
+        """
+        b, n, g = v.shape[0], v.shape[1], self.group_size
+        pos = cache.get('pos', 0)
+        if n == 0:
+            return v, u
+
+        # Rotary embeddings use the absolute positions of the frames in the sequence
+        if exists(self.rotary_pos_emb):
+            quad_q, lin_q, quad_k, lin_k = map(lambda t: self.rotary_pos_emb.rotate_queries_or_keys(t, offset=pos), (quad_q, lin_q, quad_k, lin_k))
+
+        if 'lin_kv' not in cache:
+            cache['lin_kv'] = v.new_zeros(b, lin_k.shape[-1], v.shape[-1])
+            cache['lin_ku'] = u.new_zeros(b, lin_k.shape[-1], u.shape[-1])
+
+        outputs_v, outputs_u = [], []
+        start = 0
+        while start < n:
+            # Split the chunk at group boundaries
+            offset = (pos + start) % g
+            end = min(n, start + g - offset)
+            q = quad_q[:, start:end]
+            group_k, group_v, group_u = (torch.cat((cache[name], t[:, start:end]), dim=1) if offset > 0 else t[:, start:end]
+                                         for name, t in (('quad_k', quad_k), ('v', v), ('u', u)))
+
+            # Quadratic attention over the earlier frames of the current group
+            attn = F.relu(einsum('b i d, b j d -> b i j', q, group_k) / g) ** 2
+            causal_mask = torch.ones((end - start, offset + end - start), dtype=torch.bool, device=v.device).triu(offset + 1)
+            attn = self.dropout(attn).masked_fill(causal_mask, 0.)
+            out_v = einsum('b i j, b j d -> b i d', attn, group_v)
+            out_u = einsum('b i j, b j d -> b i d', attn, group_u)
+
+            # Linear attention over the completed groups
+            out_v = out_v + einsum('b d e, b n d -> b n e', cache['lin_kv'], lin_q[:, start:end])
+            out_u = out_u + einsum('b d e, b n d -> b n e', cache['lin_ku'], lin_q[:, start:end])
+            outputs_v.append(out_v)
+            outputs_u.append(out_u)
+
+            group_lin_k = torch.cat((cache['lin_k'], lin_k[:, start:end]), dim=1) if offset > 0 else lin_k[:, start:end]
+            if offset + end - start == g:
+                # The group is complete: add it to the linear attention state
+                cache['lin_kv'] = cache['lin_kv'] + einsum('b n d, b n e -> b d e', group_lin_k, group_v) / g
+                cache['lin_ku'] = cache['lin_ku'] + einsum('b n d, b n e -> b d e', group_lin_k, group_u) / g
+                for name in ('quad_k', 'lin_k', 'v', 'u'):
+                    cache.pop(name, None)
+            else:
+                cache['quad_k'], cache['lin_k'], cache['v'], cache['u'] = group_k, group_lin_k, group_v, group_u
+            start = end
+
+        cache['pos'] = pos + n
+        return torch.cat(outputs_v, dim=1), torch.cat(outputs_u, dim=1)
+
 class Gated_FSMN(nn.Module):
     """
     Gated Frequency Selective Memory Network (FSMN) class.
@@ -490,6 +621,31 @@ class Gated_FSMN(nn.Module):
         x = x_v * x_u + input  # Combine outputs with the original input
         return x
 
+    def stream(self, x, cache=None, final=False):
+        """
+        Cached-state forward pass for chunk-by-chunk (streaming) processing. Each layer carries
+        its left context between calls, and the branches and the residual are delayed so that
+        they stay aligned. The output lags the input by the look-ahead of to_u plus that of
+        the FSMN (8 + 19 frames with the default settings). Concatenating the outputs of all
+        calls, the last one with final=True, gives the output of forward() on the whole.
+
+        Args:
+            x (Tensor): New frames of shape (batch_size, frames, in_channels).
+            cache (dict, optional): The cache returned by the previous call.
+            final (bool): If True, the stream ends and all pending frames are returned.
+
+        Returns:
+            tuple: The completed output frames and the cache.
+        """
+        cache = {} if cache is None else cache
+        x_u, cache['to_u'] = self.to_u.stream(x, cache.get('to_u'), final)
+        x_v, cache['to_v'] = self.to_v.stream(x, cache.get('to_v'), final)
+        x_u, cache['fsmn'] = self.fsmn.stream(x_u, cache.get('fsmn'), final)
+        # Align the second branch and the input with the FSMN output
+        x_v, cache['v'] = stream_delay(x_v, cache.get('v'), x_u.size(1))
+        input, cache['input'] = stream_delay(x, cache.get('input'), x_u.size(1))
+        return x_v * x_u + input, cache
+
 
 class Gated_FSMN_Block(nn.Module):
     """
@@ -541,6 +697,33 @@ class Gated_FSMN_Block(nn.Module):
         conv2 = self.conv2(norm2)  # Apply final convolution
         return conv2.transpose(2, 1) + input  # Residual connection
 
+    def stream(self, input, cache=None, final=False):
+        """
+        Cached-state forward pass for chunk-by-chunk (streaming) processing. All layers
+        except the gated FSMN work frame by frame, so the output lags the input by the
+        look-ahead of Gated_FSMN.stream.
+
+        Args:
+            input (Tensor): New frames of shape (batch_size, frames, dim).
+            cache (dict, optional): The cache returned by the previous call.
+            final (bool): If True, the stream ends and all pending frames are returned.
+
+        Returns:
+            tuple: The completed output frames and the cache.
+        """
+        cache = {} if cache is None else cache
+        # Pointwise convolutions do not accept empty sequences, e.g. when flushing the stream
+        if input.size(1) > 0:
+            norm1 = self.norm1(self.conv1(input.transpose(2, 1))).transpose(2, 1)
+        else:
+            norm1 = input.new_zeros(input.size(0), 0, self.norm1.normalized_shape[0])
+        seq_out, cache['gated_fsmn'] = self.gated_fsmn.stream(norm1, cache.get('gated_fsmn'), final)
+        input, cache['input'] = stream_delay(input, cache.get('input'), seq_out.size(1))
+        if seq_out.size(1) == 0:
+            return input, cache
+        conv2 = self.conv2(self.norm2(seq_out.transpose(2, 1)))
+        return conv2.transpose(2, 1) + input, cache
+
 
 class MossformerBlock_GFSMN(nn.Module):
     """
@@ -631,6 +814,26 @@ class MossformerBlock_GFSMN(nn.Module):
             
         return x
 
+    def stream(self, x, cache=None, final=False):
+        """
+        Chunked causal forward pass for incremental inference, see FLASH_ShareA_FFConvM.stream
+        and Gated_FSMN_Block.stream. The output lags the input by the sum of the look-aheads
+        of all layers.
+
+        Args:
+            x (Tensor): New frames of shape (batch_size, frames, dim).
+            cache (list, optional): The cache returned by the previous call.
+            final (bool): If True, the stream ends and all pending frames are returned.
+
+        Returns:
+            tuple: The completed output frames and the cache.
+        """
+        cache = [[None, None] for _ in self.layers] if cache is None else cache
+        for ii, flash in enumerate(self.layers):
+            x, cache[ii][0] = flash.stream(x, cache[ii][0], final)
+            x, cache[ii][1] = self.fsmn[ii].stream(x, cache[ii][1], final)
+        return x, cache
+
 
 class MossformerBlock(nn.Module):
     """
@@ -733,3 +936,20 @@ class MossformerBlock(nn.Module):
             x = flash(x, mask=mask)  # Apply attention layer with optional mask
         
         return x  # Return the final output tensor
+
+    def stream(self, x, cache=None, final=False):
+        """
+        Chunked causal forward pass for incremental inference, see FLASH_ShareA_FFConvM.stream.
+
+        Args:
+            x (Tensor): New frames of shape (batch_size, frames, dim).
+            cache (list, optional): The cache returned by the previous call.
+            final (bool): If True, the stream ends and all pending frames are returned.
+
+        Returns:
+            tuple: The completed output frames and the cache.
+        """
+        cache = [None for _ in self.layers] if cache is None else cache
+        for ii, flash in enumerate(self.layers):
+            x, cache[ii] = flash.stream(x, cache[ii], final)
+        return x, cache
@@ -331,6 +331,7 @@ class MossFormerM(nn.Module):
     def forward(
         self,
         src,
+        layers=None,
     ):
         """
         Arguments
@@ -341,12 +342,14 @@ class MossFormerM(nn.Module):
                    L = time points
                    N = number of filters
             The sequence to the encoder layer (required).
+        layers : list of int
+            The layers of the MossFormer2 block to evaluate (optional, all layers by default).
         src_mask : tensor
             The mask for the src sequence (optional).
         src_key_padding_mask : tensor
             The mask for the src keys per batch (optional).
         """
-        output = self.mossformerM(src)
+        output = self.mossformerM(src, layers=layers)
         output = self.norm(output)
 
         return output
@@ -483,7 +486,7 @@ class Computation_Block(nn.Module):
         if norm is not None:
             self.intra_norm = select_norm(norm, out_channels, 3)  # Initialize normalization layer
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(self, x: torch.Tensor, layers=None) -> torch.Tensor:
         """Returns the output tensor.
 
         Args:
@@ -491,6 +494,8 @@ class Computation_Block(nn.Module):
                 B = Batch size,
                 N = Number of filters,
                 S = Sequence length.
+            layers (list of int, optional): The layers of the intra model to evaluate
+                (all layers by default), see MossformerBlock_GFSMN.
 
         Returns:
             out (torch.Tensor): Output tensor of dimension [B, N, S].
@@ -501,7 +506,7 @@ class Computation_Block(nn.Module):
         intra = x.permute(0, 2, 1).contiguous()
 
         # Process through the intra model
-        intra = self.intra_mdl(intra)
+        intra = self.intra_mdl(intra, layers=layers)
 
         # Permute back to [B, N, S]
         intra = intra.permute(0, 2, 1).contiguous()
@@ -617,7 +622,7 @@ class MossFormer_MaskNet(nn.Module):
             nn.Conv1d(out_channels, out_channels, 1), nn.Sigmoid()
         )
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(self, x: torch.Tensor, layers=None) -> torch.Tensor:
         """Returns the output tensor.
 
         Args:
@@ -625,6 +630,8 @@ class MossFormer_MaskNet(nn.Module):
                 B = Batch size,
                 N = Number of channels (filters),
                 S = Sequence length.
+            layers (list of int, optional): The MossFormer2 layers to evaluate (all layers
+                by default), e.g. a schedule written by layer_schedule.py.
 
         Returns:
             out (torch.Tensor): Output tensor of dimension [spks, B, N, S], 
@@ -649,7 +656,7 @@ class MossFormer_MaskNet(nn.Module):
             x = base + emb  # Add positional embeddings to encoded features
 
         # [B, N, S] - Process through the computation block
-        x = self.mdl(x)
+        x = self.mdl(x, layers=layers)
         x = self.prelu(x)  # Apply PReLU activation
 
         # [B, N*spks, S] - Project features to multiple speaker outputs
@@ -763,11 +770,12 @@ class MossFormer(nn.Module):
             bias=False
         )
 
-    def forward(self, input: torch.Tensor) -> list:
+    def forward(self, input: torch.Tensor, layers=None) -> list:
         """Processes the input through the encoder, mask net, and decoder.
 
         Args:
             input (torch.Tensor): Input tensor of shape [B, T], where B is the batch size and T is the input length.
+            layers (list of int, optional): The MossFormer2 layers of the mask net to evaluate (all layers by default).
 
         Returns:
             out (list): List of output tensors for each speaker, each of shape [B, T].
@@ -776,13 +784,13 @@ class MossFormer(nn.Module):
         x = self.enc(input)
 
         # Generate the mask for each speaker using the mask net
-        mask = self.mask_net(x)
+        mask = self.mask_net(x, layers=layers)
 
         # Duplicate the features for each speaker
         x = torch.stack([x] * self.num_spks)
 
         # Apply the mask to separate the sources
-        sep_x = x * mask
+        sep_x = self.apply_mask(x, mask)
 
         # Decoding process to reconstruct the separated sources
         est_source = torch.cat(
@@ -805,6 +813,18 @@ class MossFormer(nn.Module):
         
         return out  # Return list of separated outputs
 
+    def apply_mask(self, x, mask):
+        """Applies the speaker masks to the encoder features.
+
+        Args:
+            x (torch.Tensor): Encoder features duplicated for each speaker [num_spks, B, N, L].
+            mask (torch.Tensor): Speaker masks from the mask net [num_spks, B, N, L].
+
+        Returns:
+            sep_x (torch.Tensor): Masked features of each speaker [num_spks, B, N, L].
+        """
+        return x * mask
+
 
 class MossFormer2_SS_16K(nn.Module):
     """
@@ -842,14 +862,15 @@ class MossFormer2_SS_16K(nn.Module):
             max_length=20000
         )
 
-    def forward(self, x: torch.Tensor) -> list:
+    def forward(self, x: torch.Tensor, layers=None) -> list:
         """Processes the input through the MossFormer model.
 
         Args:
             x (torch.Tensor): Input tensor of shape [B, T], where B is the batch size and T is the input length.
+            layers (list of int, optional): The MossFormer2 layers to evaluate (all layers by default).
 
         Returns:
             outputs (list): List of output tensors for each speaker.
         """
-        outputs = self.model(x)  # Forward pass through the MossFormer model
+        outputs = self.model(x, layers=layers)  # Forward pass through the MossFormer model
         return outputs  # Return the list of outputs
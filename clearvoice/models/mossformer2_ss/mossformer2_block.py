@@ -742,7 +742,8 @@ class MossformerBlock_GFSMN(nn.Module):
         self,
         x,
         *,
-        mask=None
+        mask=None,
+        layers=None
     ):
         """
         Forward pass through the Mossformer Block.
@@ -750,16 +751,19 @@ class MossformerBlock_GFSMN(nn.Module):
         Args:
             x (Tensor): Input tensor of shape (batch_size, seq_len, dim).
             mask (Tensor, optional): Attention mask to apply. Defaults to None.
+            layers (list of int, optional): Indices of the layers to evaluate, in increasing
+                order. The other layers are skipped, which is the identity since every FLASH
+                layer and Gated FSMN block adds its output to its input. Defaults to all layers.
 
         Returns:
             Tensor: Output tensor after passing through all layers, of shape (batch_size, seq_len, dim).
         """
-        ii = 0
-        # Iterate through all FLASH attention layers and Gated FSMN blocks
-        for flash in self.layers:
-            x = flash(x, mask=mask)  # Apply FLASH attention layer
+        if layers is None:
+            layers = range(len(self.layers))
+        # Iterate through the selected FLASH attention layers and Gated FSMN blocks
+        for ii in layers:
+            x = self.layers[ii](x, mask=mask)  # Apply FLASH attention layer
             x = self.fsmn[ii](x)     # Apply corresponding Gated FSMN block
-            ii += 1  # Increment index for the Gated FSMN block
 
         return x  # Return the final output after all layers
 
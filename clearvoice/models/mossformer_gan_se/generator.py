@@ -373,7 +373,7 @@ class SyncANet(nn.Module):
         """
         out_list = []  # List to store outputs
         mag = torch.sqrt(x[:, 0, :, :]**2 + x[:, 1, :, :]**2).unsqueeze(1)  # Calculate magnitude
-        noisy_phase = torch.angle(torch.complex(x[:, 0, :, :], x[:, 1, :, :])).unsqueeze(1)  # Calculate phase
+        noisy_phase = torch.atan2(x[:, 1, :, :], x[:, 0, :, :]).unsqueeze(1)  # Calculate phase (angle of the complex input, exportable to ONNX)
         x_in = torch.cat([mag, x], dim=1)  # Concatenate magnitude and input for processing
 
         x = self.dense_encoder(x_in)  # Feature extraction using dense encoder
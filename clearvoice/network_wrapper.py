@@ -1,3 +1,4 @@
+import os
 import argparse
 import json
 import yamlargparse
@@ -43,6 +44,12 @@ class network_wrapper(nn.Module):
         parser.add_argument('--sampling-rate', dest='sampling_rate', type=int, default=16000, help='Sampling rate')
         parser.add_argument('--one-time-decode-length', dest='one_time_decode_length', type=float, default=60.0, help='Max segment length for one-pass decoding')
         parser.add_argument('--decode-window', dest='decode_window', type=float, default=1.0, help='Decoding chunk size')
+        parser.add_argument('--decode-batch-size', dest='decode_batch_size', type=int, default=4, help='Number of decoding chunks per forward pass in segmented decoding')
+        parser.add_argument('--stitch-mode', dest='stitch_mode', type=str, default='hard_cut', choices=['hard_cut', 'ola'], help='Stitching of decoding chunks: hard cut or Hann crossfade overlap-add')
+        parser.add_argument('--prefetch-size', dest='prefetch_size', type=int, default=4, help='Number of input files read ahead while the model is running (0 to disable)')
+        parser.add_argument('--io-workers', dest='io_workers', type=int, default=2, help='Number of threads for reading and writing audio files')
+        parser.add_argument('--long-form-threshold', dest='long_form_threshold', type=float, default=0, help='Inputs longer than this (seconds) are read and written block by block when writing online (0 to disable)')
+        parser.add_argument('--long-form-block', dest='long_form_block', type=float, default=60.0, help='Block length (seconds) read at once in long-form processing')
 
         # FFT parameters for feature extraction
         parser.add_argument('--window-len', dest='win_len', type=int, default=400, help='Window length for framing')
@@ -78,6 +85,12 @@ class network_wrapper(nn.Module):
         parser.add_argument('--num-spks', dest='num_spks', type=int, default=2, help='Number of speakers to separate')
         parser.add_argument('--one-time-decode-length', dest='one_time_decode_length', type=float, default=60.0, help='Max segment length for one-pass decoding')
         parser.add_argument('--decode-window', dest='decode_window', type=float, default=1.0, help='Decoding chunk size')
+        parser.add_argument('--decode-batch-size', dest='decode_batch_size', type=int, default=4, help='Number of decoding chunks per forward pass in segmented decoding')
+        parser.add_argument('--stitch-mode', dest='stitch_mode', type=str, default='hard_cut', choices=['hard_cut', 'ola'], help='Stitching of decoding chunks: hard cut or Hann crossfade overlap-add')
+        parser.add_argument('--prefetch-size', dest='prefetch_size', type=int, default=4, help='Number of input files read ahead while the model is running (0 to disable)')
+        parser.add_argument('--io-workers', dest='io_workers', type=int, default=2, help='Number of threads for reading and writing audio files')
+        parser.add_argument('--long-form-threshold', dest='long_form_threshold', type=float, default=0, help='Inputs longer than this (seconds) are read and written block by block when writing online (0 to disable)')
+        parser.add_argument('--long-form-block', dest='long_form_block', type=float, default=60.0, help='Block length (seconds) read at once in long-form processing')
 
         # Encoder settings
         parser.add_argument('--encoder_kernel-size', dest='encoder_kernel_size', type=int, default=16, help='Kernel size for Conv1D encoder')
@@ -129,6 +142,10 @@ class network_wrapper(nn.Module):
         parser.add_argument('--sampling-rate', dest='sampling_rate', type=int, default=16000, help='Sampling rate')
         parser.add_argument('--one-time-decode-length', dest='one_time_decode_length', type=float, default=60.0, help='Max segment length for one-pass decoding')
         parser.add_argument('--decode-window', dest='decode_window', type=float, default=1.0, help='Decoding chunk size')
+        parser.add_argument('--decode-batch-size', dest='decode_batch_size', type=int, default=4, help='Number of decoding chunks per forward pass in segmented decoding')
+        parser.add_argument('--stitch-mode', dest='stitch_mode', type=str, default='hard_cut', choices=['hard_cut', 'ola'], help='Stitching of decoding chunks: hard cut or Hann crossfade overlap-add')
+        parser.add_argument('--prefetch-size', dest='prefetch_size', type=int, default=4, help='Number of input files read ahead while the model is running (0 to disable)')
+        parser.add_argument('--io-workers', dest='io_workers', type=int, default=2, help='Number of threads for reading and writing audio files')
 
         # Parse arguments from the config file
         self.args = parser.parse_args(['--config', self.config_path])
@@ -166,7 +183,7 @@ class network_wrapper(nn.Module):
         # Parse arguments from the config file
         self.args = parser.parse_args(['--config', self.config_path])
 
-    def __call__(self, task, model_name):
+    def __call__(self, task, model_name, precision='float32', backend='torch'):
         """
         Calls the appropriate argument-loading function based on the task type 
         (e.g., 'speech_enhancement', 'speech_separation', or 'target_speaker_extraction').
@@ -175,6 +192,9 @@ class network_wrapper(nn.Module):
         Args:
         - task (str): The task type ('speech_enhancement', 'speech_separation', 'target_speaker_extraction').
         - model_name (str): The name of the model to load (e.g., 'FRCRN_SE_16K').
+        - precision (str): The precision the model runs in, 'float32', 'float16', 'bfloat16' or 'int8'
+          (see SpeechModel.set_precision).
+        - backend (str): The backend that runs the model, 'torch' or 'onnxruntime' (see SpeechModel.set_backend).
         
         Returns:
         - self.network: The instantiated neural network model.
@@ -225,4 +245,9 @@ class network_wrapper(nn.Module):
             print("No network found!")
             return
         
+        self.network.set_precision(precision)
+        self.network.set_backend(backend)
+        # Opt-in compiled execution of the MossFormer2 block stacks
+        if os.environ.get('CLEARVOICE_COMPILE') == '1' and backend == 'torch' and precision != 'int8':
+            self.network.compile_blocks()
         return self.network  # Return the instantiated network model
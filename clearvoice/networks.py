@@ -16,15 +16,48 @@ import torch
 import torch.nn as nn
 import soundfile as sf
 import os
+import copy
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import subprocess
 import librosa
+import torchaudio
 from tqdm import tqdm
 import numpy as np
 from pydub import AudioSegment
-from utils.decode import decode_one_audio
-from dataloader.dataloader import DataReader
+from utils.decode import decode_one_audio, decode_batch_audio, batch_length, window_decoder, to_output, LONG_FORM_NETWORKS
+from utils.segmenter import SegmentStream, to_tensor, get_decode_batch_size, get_stitch_mode
+from utils.resample import resample
+from dataloader.dataloader import DataReader, PrefetchReader, LongFormReader, LongFormWriter, LongFormSpooler, audiowrite, audio_norm
+from dataloader.audio_io import audio_duration
+from result_cache import get_result_cache
+from utils.checkpoint import load_fast_checkpoint, save_fast_checkpoint, fast_checkpoint_path
+from utils.mixed_precision import AUTOCAST_DTYPES, enable_autocast
+from utils.onnx_backend import OnnxModule, create_session, load_onnx_model
+from utils.compilation import compile_blocks, save_compile_cache
 
 MAX_WAV_VALUE = 32768.0
+# Number of batches worth of inputs that are read before bucketing them by length
+BUCKET_BUFFER_FACTOR = 8
+# Length in seconds of the blocks read from a file in long-form processing
+DEFAULT_LONG_FORM_BLOCK = 60.0
+# Length in seconds of the dummy input decoded by SpeechModel.warmup
+WARMUP_SECONDS = 1.0
+# Precisions supported by SpeechModel.set_precision
+PRECISIONS = ('float32', 'float16', 'bfloat16', 'int8')
+# Networks that may run in float16/bfloat16: their numerically sensitive modules are float32
+# islands (see utils.mixed_precision), they pass the parity test of tests/test_mixed_precision.py
+# and precision_report.py measures them against float32. Others are refused by set_precision.
+AUTOCAST_NETWORKS = ('FRCRN_SE_16K', 'MossFormerGAN_SE_16K', 'MossFormer2_SE_48K', 'MossFormer2_SS_16K', 'MossFormer2_SR_48K')
+# Networks whose MossFormer2 layers can be skipped, see SpeechModel.set_layer_schedule
+LAYER_SKIP_NETWORKS = ('MossFormer2_SS_16K',)
+# Backends supported by SpeechModel.set_backend
+BACKENDS = ('torch', 'onnxruntime')
+# Module types whose weights are quantized in int8 mode. Dynamic quantization covers the
+# Linear projections of FFConvM, FLASH_ShareA_FFConvM (to_hidden, to_qk, to_out) and FSMN,
+# and the recurrent layers of FRCRN.
+INT8_MODULE_TYPES = {nn.Linear, nn.GRU, nn.LSTM}
 
 class SpeechModel:
     """
@@ -73,6 +106,195 @@ class SpeechModel:
         self.name = None
         self.data = {}
         self.print = False
+        self.writer = None  # Thread pool for writing outputs, only set during process()
+        self.pending_writes = deque()
+        self.checkpoint_paths = []  # Checkpoint files of the loaded weights, part of result cache keys
+        self.loaded_checkpoints = []  # (module, checkpoint_path, model_key) of every loaded checkpoint
+        self.precision = 'float32'
+        self.args.precision = self.precision
+        self.backend = 'torch'
+        self.args.backend = self.backend
+        self.compiled = False
+        self.args.layer_schedule = None
+        self.shared = False  # True for copies made by fork(), whose weights others hold as well
+
+    def fork(self):
+        """
+        Returns a shallow copy of this SpeechModel that shares the loaded network weights
+        but has its own arguments and per-call state (input data and results). This allows
+        one loaded model to be handed out to several ClearVoice objects.
+
+        Returns:
+        SpeechModel: The copy sharing self.model.
+        """
+        clone = copy.copy(self)
+        clone.args = copy.copy(self.args)
+        clone.data = {}
+        clone.result = {}
+        clone.writer = None
+        clone.pending_writes = deque()
+        clone.shared = True
+        return clone
+
+    def check_not_shared(self, change):
+        """
+        Raises a ValueError if the weights of this model are shared with other copies (see
+        fork()), so that changing them in place would change the other copies as well.
+
+        Args:
+        - change: Description of the refused change, for the error message.
+        """
+        if self.shared:
+            raise ValueError(f'{self.name} shares its weights with other copies and cannot {change}, request it '
+                             f'from the model registry instead with get(..., device=..., dtype=..., backend=...)')
+
+    def to_device(self, device):
+        """
+        Moves the model to the given device, which is used for all following computations.
+
+        Args:
+        - device: The device, e.g. 'cpu' or 'cuda'.
+        """
+        device = torch.device(device)
+        if device != self.device:
+            self.check_not_shared(f'be moved to {device}')
+        self.device = device
+        self.args.use_cuda = 1 if self.device.type == 'cuda' else 0
+        self.model.to(self.device)
+        if self.backend == 'onnxruntime':
+            # ONNX Runtime sessions select their execution providers for a device when created
+            for module in self.model.modules():
+                if isinstance(module, OnnxModule):
+                    module.session = create_session(module.path, self.device)
+
+    def set_precision(self, precision, validated_only=True):
+        """
+        Changes the precision the model runs in.
+
+        - 'float32': The default, the weights as trained.
+        - 'int8': The weights of INT8_MODULE_TYPES are quantized to int8 with dynamic
+          quantization, and their activations are quantized on the fly. Quantized kernels
+          only run on the CPU, so the model is moved to the CPU. Convolutions stay in float32.
+          The weights are quantized in place, so copies sharing them (see fork()) are refused;
+          the model registry builds int8 models separately.
+        - 'float16', 'bfloat16': Mixed precision. The models run under autocast, except for
+          numerically sensitive parts that stay in float32 (see utils.mixed_precision), and
+          their outputs are float32. The weights stay in float32. float16 is meant for GPUs,
+          bfloat16 for GPUs and CPUs that support it. Only AUTOCAST_NETWORKS run in mixed
+          precision.
+
+        Args:
+        - precision: One of PRECISIONS.
+        - validated_only: If False, mixed precision is also allowed for networks outside of
+          AUTOCAST_NETWORKS, e.g. to measure them with precision_report.py.
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f'Unknown precision {precision}, please select from: {", ".join(PRECISIONS)}')
+        if precision in AUTOCAST_DTYPES and validated_only and self.args.network not in AUTOCAST_NETWORKS:
+            raise ValueError(f'{self.name} has not been validated in {precision}, please select from: '
+                             f'{", ".join(AUTOCAST_NETWORKS)}')
+        if precision == self.precision:
+            return
+        self.check_not_shared(f'be changed to {precision}')
+        if self.precision != 'float32' or self.backend != 'torch':
+            raise ValueError(f'{self.name} runs in {self.precision} on {self.backend} and cannot be changed to {precision}')
+        if precision == 'int8':
+            self.to_device('cpu')
+            # In place, so that the float32 weights are never held twice
+            torch.ao.quantization.quantize_dynamic(self.model, INT8_MODULE_TYPES, dtype=torch.qint8, inplace=True)
+        elif precision in AUTOCAST_DTYPES:
+            enable_autocast(self.model, precision)
+        self.precision = precision
+        self.args.precision = precision
+
+    def set_backend(self, backend):
+        """
+        Changes the backend that runs the network.
+
+        - 'torch': The default, eager PyTorch.
+        - 'onnxruntime': The network runs as the ONNX exports of the model (see
+          export_onnx.py) in ONNX Runtime sessions, with graph-level fusion and a thread
+          pool sized by CLEARVOICE_ORT_THREADS. The pre- and post-processing of the decoders
+          stays in torch, so decode() behaves the same. The torch weights are released.
+
+        Args:
+        - backend: One of BACKENDS.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown backend {backend}, please select from: {", ".join(BACKENDS)}')
+        if backend == self.backend:
+            return
+        if self.backend != 'torch' or self.precision != 'float32':
+            raise ValueError(f'{self.name} runs in {self.precision} on {self.backend} and cannot be changed to {backend}')
+        self.model, onnx_paths = load_onnx_model(self)
+        # The exports are part of the result cache keys, the torch weights are no longer used
+        self.checkpoint_paths = self.checkpoint_paths + onnx_paths
+        self.loaded_checkpoints = []
+        self.backend = backend
+        self.args.backend = backend
+
+    def set_layer_schedule(self, layers):
+        """
+        Selects the MossFormer2 layers the model evaluates, trading quality for throughput,
+        e.g. a schedule measured by layer_schedule.py. The schedule is part of the arguments
+        of this SpeechModel, so copies from the model registry can run different schedules
+        on the same weights.
+
+        Args:
+        - layers: Indices of the layers to evaluate, the path of a schedule file written by
+          layer_schedule.py (its recommended layers are used), or None for all layers.
+        """
+        if layers is not None:
+            if self.args.network not in LAYER_SKIP_NETWORKS:
+                raise ValueError(f'Layer schedules are not supported for {self.name}, please select from: '
+                                 f'{", ".join(LAYER_SKIP_NETWORKS)}')
+            if self.backend != 'torch':
+                raise ValueError(f'Layer schedules require the torch backend, {self.name} runs on {self.backend}')
+            if isinstance(layers, str):
+                with open(layers) as f:
+                    layers = json.load(f)['recommended']['layers']
+            layers = sorted(set(int(layer) for layer in layers))
+            num_layers = self.args.num_mossformer_layer
+            if not layers or layers[0] < 0 or layers[-1] >= num_layers:
+                raise ValueError(f'A layer schedule needs at least one layer, from 0 to {num_layers - 1}')
+        self.args.layer_schedule = layers
+
+    def compile_blocks(self, mode=None):
+        """
+        Compiles the MossFormer2 block stacks of the model with torch.compile (see
+        utils.compilation), with the compilation artifacts cached on disk. Models without
+        such blocks are unchanged. The compilation happens on the first decode, e.g. in warmup().
+
+        Args:
+        - mode: The torch.compile mode, CLEARVOICE_COMPILE_MODE by default.
+        """
+        if self.backend != 'torch' or self.precision == 'int8':
+            raise ValueError(f'{self.name} runs in {self.precision} on {self.backend} and cannot be compiled')
+        if not self.compiled:
+            self.check_not_shared('be compiled')
+            self.compiled = compile_blocks(self.model, mode) > 0
+
+    def warmup(self, seconds=WARMUP_SECONDS):
+        """
+        Decodes a short dummy input once, so that the first request does not pay for
+        cuDNN algorithm selection, CUDA context and allocator initialization, the
+        creation of cached windows and filters and, for compiled models, compilation.
+        The result cache is bypassed.
+
+        Args:
+        - seconds: Length of the dummy input in seconds.
+        """
+        if self.args.task == 'target_speaker_extraction':
+            return  # Needs a video input
+        # Quiet noise rather than silence, which would make input normalizations divide by zero
+        generator = torch.Generator().manual_seed(0)
+        audio = 0.01 * torch.randn(1, int(self.args.sampling_rate * seconds), generator=generator)
+        with torch.no_grad():
+            decode_one_audio(self.model, self.device, audio, self.args)
+        if self.device.type == 'cuda':
+            torch.cuda.synchronize()
+        if self.compiled:
+            save_compile_cache()  # So that the next cold start loads the compiled graphs
 
     def get_free_gpu(self):
         """
@@ -157,6 +379,12 @@ class SpeechModel:
             self._load_model(self.model, checkpoint_path, model_key='model')
 
     def _load_model(self, model, checkpoint_path, model_key=None):
+        self.checkpoint_paths.append(checkpoint_path)
+        self.loaded_checkpoints.append((model, checkpoint_path, model_key))
+        # Map the converted copy of the checkpoint straight into the model if there is one
+        # (see convert_checkpoints), without unpickling it or remapping its keys
+        if load_fast_checkpoint(model, checkpoint_path, model_key):
+            return
         # Load the checkpoint file into memory (map_location ensures compatibility with different devices)
         checkpoint = torch.load(checkpoint_path, map_location=lambda storage, loc: storage)
         # Load the model's state dictionary (weights and biases) into the current model
@@ -175,45 +403,365 @@ class SpeechModel:
             elif self.print: print(f'{key} not loaded')
         model.load_state_dict(state)
 
-    def decode(self):
+    def convert_checkpoints(self, overwrite=True):
+        """
+        Stores the loaded weights of the model as fast-loading copies of its checkpoints
+        (safetensors files next to the checkpoints), which later loads map into the model
+        without unpickling the checkpoints or remapping their keys.
+
+        Args:
+        - overwrite: If False, checkpoints that already have a copy are skipped.
+
+        Returns:
+        list: The paths of the written copies.
+        """
+        if self.precision == 'int8' or self.backend != 'torch':
+            raise ValueError(f'Only float32 torch weights can be converted, {self.name} runs in {self.precision} on {self.backend}')
+        paths = []
+        for model, checkpoint_path, model_key in self.loaded_checkpoints:
+            if overwrite or not os.path.isfile(fast_checkpoint_path(checkpoint_path, model_key)):
+                paths.append(save_fast_checkpoint(model, checkpoint_path, model_key))
+        return paths
+
+    def decode(self, as_tensor=False):
         """
         Decodes the input audio data using the loaded model and ensures the output matches the original audio length.
 
         This method processes the audio through a speech model (e.g., for enhancement, separation, etc.),
+        with all channels of self.data['audio'] (an array or tensor of shape [C, T]) in one batch,
         and truncates the resulting audio to match the original input's length. The method supports multiple speakers 
         if the model handles multi-speaker audio.
 
+        Args:
+        - as_tensor: If True, the output is a float32 tensor on the model's device instead of a
+                     numpy array (see utils.decode.to_output), for passing it on to the next model.
+
         Returns:
-        output_audio: The decoded audio after processing, truncated to the input audio length. 
+        output_audio: The decoded audio of shape [C, T] after processing, truncated to the input audio length.
                   If multi-speaker audio is processed, a list of truncated audio outputs per speaker is returned.
         """
-        # Decode the audio using the loaded model on the given device (e.g., CPU or GPU)
-        output_audios = []
-        for i in range(len(self.data['audio'])):
-            output_audio = decode_one_audio(self.model, self.device, self.data['audio'][i], self.args)
-            # Ensure the decoded output matches the length of the input audio
-            if isinstance(output_audio, list):
-                # If multi-speaker audio (a list of outputs), truncate each speaker's audio to input length
+        # Skip the model if the same input was already processed with the same model and options
+        cache = get_result_cache()
+        key = None
+        if cache is not None:
+            key = self.result_key(cache, self.data['audio'])
+            output_audios = cache.get(key)
+            if output_audios is not None:
+                return self.cached_output(output_audios, as_tensor)
+
+        # Decode all channels of the [C, T] audio together on the given device (e.g., CPU or GPU)
+        output_audios = decode_one_audio(self.model, self.device, self.data['audio'], self.args, as_tensor)
+        # Ensure the decoded output matches the length of the input audio
+        if isinstance(output_audios, list):
+            # If multi-speaker audio (a list of [C, T] outputs), truncate each speaker's audio to input length
+            output_audios = [output_audio[..., :self.data['audio_len']] for output_audio in output_audios]
+        else:
+            # Single output, truncate to input audio length
+            output_audios = output_audios[..., :self.data['audio_len']]
+
+        if key is not None:
+            cache.put(key, output_audios)
+        return output_audios
+
+    def cached_output(self, output_audios, as_tensor):
+        """
+        Converts an output taken from the result cache (numpy arrays) to the output type of
+        decode(as_tensor).
+        """
+        if isinstance(output_audios, list):
+            return [to_output(output_audio, as_tensor, self.device) for output_audio in output_audios]
+        return to_output(output_audios, as_tensor, self.device)
+
+    def result_key(self, cache, audio):
+        """
+        Builds the result cache key of decoding the given model input with this model.
+
+        Args:
+        - cache: The ResultCache.
+        - audio: The model input of shape [C, T].
+
+        Returns:
+        str: The cache key, see ResultCache.make_key.
+        """
+        return cache.make_key(audio, self.args.task, self.name, self.checkpoint_paths, self.args)
+
+    def process_tensor(self, audio, sample_rate):
+        """
+        Processes an in-memory waveform instead of reading it from a file. The waveform is
+        resampled to the model's sampling rate only if the rates differ, and the output stays
+        a float32 tensor on the model's device so that it can be passed to the next model.
+        Only the result cache (when enabled, to hash and store the samples) and the bandwidth
+        substitution of MossFormer2_SR_48K copy the audio to the host.
+
+        Only models producing a single output per channel (speech enhancement and speech
+        super-resolution) are supported.
+
+        Args:
+            audio (torch.Tensor): Input waveform of shape [C, T] in the range [-1, 1].
+            sample_rate (int): Sampling rate of the input waveform.
+
+        Returns:
+            torch.Tensor: Processed waveform of shape [C, T'] at self.args.sampling_rate.
+        """
+        with torch.no_grad():
+            audio, scalars = self.prepare_tensor(audio, sample_rate)
+
+            self.data = {}
+            self.data['audio'] = audio  # [C, T], all channels are decoded as one batch
+            self.data['audio_len'] = audio.shape[-1]
+            return self.finish_tensor(self.decode(as_tensor=True), scalars)
+
+    def process_tensors(self, audios, sample_rate):
+        """
+        Processes several in-memory waveforms, e.g. from different requests, with one forward
+        pass (see decode_batch). The waveforms are expected to be short enough for one-pass
+        decoding, longer ones should be passed to process_tensor.
+
+        Args:
+            audios (list of torch.Tensor): Input waveforms of shape [C, T] in the range [-1, 1].
+            sample_rate (int): Sampling rate of the input waveforms.
+
+        Returns:
+            list of torch.Tensor: Processed waveforms as returned by process_tensor.
+        """
+        if len(audios) == 1:
+            return [self.process_tensor(audios[0], sample_rate)]
+        with torch.no_grad():
+            items, all_scalars = [], []
+            for audio in audios:
+                audio, scalars = self.prepare_tensor(audio, sample_rate)
+                items.append({'audio': audio, 'audio_len': audio.shape[-1]})
+                all_scalars.append(scalars)
+            output_audios = self.decode_batch(items, as_tensor=True)
+            return [self.finish_tensor(output, scalars) for output, scalars in zip(output_audios, all_scalars)]
+
+    def prepare_tensor(self, audio, sample_rate):
+        """
+        Moves a waveform to the model's device, resamples it to the model's sampling rate and
+        normalizes it the same way DataReader does.
+
+        Returns:
+            tuple: (audio, scalars), where scalars holds the normalization scalar of each
+                   channel, or is None if the model does not use normalization.
+        """
+        audio = audio.to(self.device, torch.float32)
+        if sample_rate != self.args.sampling_rate:
+            audio = resample(audio, sample_rate, self.args.sampling_rate)
+
+        # Normalize the input the same way DataReader does for these models
+        scalars = None
+        if self.args.network in ['FRCRN_SE_16K', 'MossFormer2_SS_16K']:
+            normed = []
+            scalars = []
+            for channel in audio:
+                channel_normed, scalar = audio_norm(channel)
+                normed.append(channel_normed)
+                scalars.append(scalar)
+            audio = torch.stack(normed)
+        return audio, scalars
+
+    def finish_tensor(self, output_audios, scalars):
+        """
+        Undoes the normalization of a prepared waveform on the decoded output, a float32
+        tensor on the model's device (see decode(as_tensor=True)).
+        """
+        if isinstance(output_audios, list):
+            raise ValueError(f'{self.name} produces multiple outputs and cannot be used with process_tensor')
+
+        outputs = output_audios
+        if scalars is not None:
+            # Out of place, the decoded tensor may be a view of a larger batch output
+            outputs = outputs * torch.tensor(scalars, dtype=torch.float32, device=self.device).unsqueeze(-1)
+        return outputs
+
+    def decode_batch(self, items, as_tensor=False):
+        """
+        Decodes several short audio inputs with as few forward passes as possible. The channels
+        of all items are grouped by their batch length (see utils.decode.batch_length), each
+        group is decoded as one batch, and the outputs are regrouped per item. The output of an
+        item therefore does not depend on the other items it is decoded with.
+
+        Args:
+        - items: A list of dicts, each holding the [C, T] 'audio' and 'audio_len' of one input
+                 in the same format as self.data.
+        - as_tensor: If True, the items hold tensors on the model's device and the outputs are
+                     float32 tensors on the device, as returned by decode(as_tensor=True).
+
+        Returns:
+        A list with one output per item, in the same format as returned by decode().
+        """
+        outputs = [None] * len(items)
+        # Items processed before are taken from the result cache, only the others are decoded
+        cache = get_result_cache()
+        keys = [None] * len(items)
+        if cache is not None:
+            for i, item in enumerate(items):
+                keys[i] = self.result_key(cache, item['audio'])
+                outputs[i] = cache.get(keys[i])
+                if outputs[i] is not None:
+                    outputs[i] = self.cached_output(outputs[i], as_tensor)
+        pending = [i for i in range(len(items)) if outputs[i] is None]
+        if not pending:
+            return outputs
+
+        # Group the channels of all items by batch length, padding within a group is the same
+        # as the padding of decoding the channel on its own
+        rows = [channel for i in pending for channel in items[i]['audio']]
+        groups = {}
+        for r, row in enumerate(rows):
+            groups.setdefault(batch_length(len(row), self.args), []).append(r)
+
+        row_outputs = [None] * len(rows)
+        for group in groups.values():
+            lengths = [len(rows[r]) for r in group]
+            if as_tensor:
+                # Stacked on the device, the rows are not copied to the host
+                batch = torch.zeros((len(group), max(lengths)), dtype=torch.float32, device=self.device)
+            else:
+                batch = np.zeros((len(group), max(lengths)), dtype=np.float32)
+            for j, r in enumerate(group):
+                batch[j, :lengths[j]] = rows[r]
+            for r, output in zip(group, decode_batch_audio(self.model, self.device, batch, lengths, self.args, as_tensor)):
+                row_outputs[r] = output
+        stack = torch.stack if as_tensor else np.stack
+
+        # Regroup the rows into items, truncated to the input length
+        row_idx = 0
+        for i in pending:
+            item = items[i]
+            num_channels = len(item['audio'])
+            item_outputs = row_outputs[row_idx:row_idx + num_channels]
+            row_idx += num_channels
+            if isinstance(item_outputs[0], list):
+                output_audios_np = []
                 for spk in range(self.args.num_spks):
-                    output_audio[spk] = output_audio[spk][:self.data['audio_len']]
+                    output_audios_np.append(stack([output[spk][:item['audio_len']] for output in item_outputs]))
             else:
-                # Single output, truncate to input audio length
-                output_audio = output_audio[:self.data['audio_len']]
-            output_audios.append(output_audio)
-            
-        if isinstance(output_audios[0], list):
-            output_audios_np = []
-            for spk in range(self.args.num_spks):
-                output_audio_buf = []
-                for i in range(len(output_audios)):
-                    output_audio_buf.append(output_audios[i][spk])
-                    #output_audio_buf = np.vstack((output_audio_buf, output_audios[i][spk])).T
-                output_audios_np.append(np.array(output_audio_buf))
+                output_audios_np = stack([output[:item['audio_len']] for output in item_outputs])
+            if keys[i] is not None:
+                cache.put(keys[i], output_audios_np)
+            outputs[i] = output_audios_np
+        return outputs
+
+    def renormalize(self, output_audios, scalars):
+        """
+        Undoes the input normalization applied by DataReader by scaling every channel of the
+        output with its normalization scalar.
+
+        Args:
+        - output_audios: The decoded audio of shape [C, T], or a list of such arrays per speaker.
+        - scalars: A list with one normalization scalar per channel.
+
+        Returns:
+        The renormalized audio.
+        """
+        if not isinstance(output_audios, list):
+            # Scale all channels at once, in place
+            output_audios *= np.asarray(scalars, dtype=output_audios.dtype).reshape(-1, *([1] * (output_audios.ndim - 1)))
+        return output_audios
+
+    def emit(self, output_audios, wav_id, online_write, output_wave_dir=None):
+        """
+        Writes the processed audio of one input to disk, or stores it in self.result.
+        self.data must hold the audio information of the input.
+
+        Args:
+        - output_audios: The processed audio.
+        - wav_id: The ID (file name) of the input.
+        - online_write: Whether to write the processed audio to disk.
+        - output_wave_dir: The output directory if online_write is True.
+        """
+        if online_write:
+            # If online writing is enabled, save the output audio to files
+            if isinstance(output_audios, list):
+                # In case of multi-speaker output, save each speaker's output separately
+                for spk in range(self.args.num_spks):
+                    output_file = os.path.join(output_wave_dir, wav_id.replace('.'+self.data['ext'], f'_s{spk+1}.'+self.data['ext']))
+                    self.submit_write(output_file, spk=spk, audio=output_audios)
+            else:
+                # Single-speaker or standard output
+                output_file = os.path.join(output_wave_dir, wav_id)
+                self.submit_write(output_file, spk=None, audio=output_audios)
         else:
-            output_audios_np = np.array(output_audios)
-        return output_audios_np
+            # If not writing to disk, store the output in the result dictionary
+            self.result[wav_id] = output_audios
+
+    def submit_write(self, output_path, spk=None, audio=None):
+        """
+        Writes an output file in the writer pool if one is running, otherwise writes it
+        directly. The audio information of the current input is copied, because self.data
+        is replaced by the next input while the write is in progress.
+
+        Args:
+        - output_path: The file path where the audio will be saved.
+        - spk: A speaker index for multi-speaker outputs.
+        - audio: The audio to write.
+        """
+        if self.writer is None:
+            self.write_audio(output_path, key=None, spk=spk, audio=audio)
+            return
+        audio_info = {key: value for key, value in self.data.items() if key != 'audio'}
+        self.pending_writes.append(self.writer.submit(self.write_audio, output_path, None, spk, audio, audio_info))
+        # Bound the number of outputs held in memory by waiting for the oldest writes
+        self.wait_writes(max(1, getattr(self.args, 'prefetch_size', 0)))
+
+    def wait_writes(self, max_pending=0):
+        """
+        Waits until at most max_pending writes are in progress. Errors raised by a write
+        are re-raised here.
+        """
+        while len(self.pending_writes) > max_pending:
+            self.pending_writes.popleft().result()
+
+    def process_buffer(self, buffer, batch_size, online_write, output_wave_dir=None):
+        """
+        Decodes a buffer of read inputs in length-sorted batches, then renormalizes and emits
+        the outputs in the original input order. Inputs longer than one_time_decode_length
+        are decoded one by one with segmented decoding.
+
+        Args:
+        - buffer: A list of (data, scalars) tuples, where data has the same format as self.data.
+        - batch_size: The maximum number of channels decoded in one forward pass.
+        - online_write: Whether to write the processed audio to disk.
+        - output_wave_dir: The output directory if online_write is True.
+        """
+        max_batch_len = self.args.sampling_rate * self.args.one_time_decode_length
+        outputs = [None] * len(buffer)
+
+        # Bucket the short inputs by batch length, only inputs of the same batch length are
+        # decoded together (see decode_batch). Sorting by length makes equal batch lengths adjacent.
+        order = sorted(range(len(buffer)), key=lambda i: buffer[i][0]['audio_len'])
+        bucket = []
+        bucket_channels = 0
+        bucket_length = None
+        for i in order + [None]:
+            if i is not None:
+                data = buffer[i][0]
+                if data['audio_len'] > max_batch_len:
+                    self.data = data
+                    outputs[i] = self.decode()
+                    continue
+                length = batch_length(data['audio_len'], self.args)
+                if not bucket or (length == bucket_length and bucket_channels + len(data['audio']) <= batch_size):
+                    bucket.append(i)
+                    bucket_channels += len(data['audio'])
+                    bucket_length = length
+                    continue
+            if bucket:
+                bucket_outputs = self.decode_batch([buffer[j][0] for j in bucket])
+                for j, output in zip(bucket, bucket_outputs):
+                    outputs[j] = output
+            if i is not None:
+                bucket = [i]
+                bucket_channels = len(buffer[i][0]['audio'])
+                bucket_length = length
+
+        for (data, scalars), output_audios in zip(buffer, outputs):
+            self.data = data
+            output_audios = self.renormalize(output_audios, scalars)
+            self.emit(output_audios, data['id'], online_write, output_wave_dir)
 
-    def process(self, input_path, online_write=False, output_path=None):
+    def process(self, input_path, online_write=False, output_path=None, batch_size=1):
         """
         Load and process audio files from the specified input path. Optionally, 
         write the output audio files to the specified output directory.
@@ -223,6 +771,9 @@ class SpeechModel:
             online_write (bool): Whether to write the processed audio to disk in real-time.
             output_path (str): Optional path for writing output files. If None, output 
                                will be stored in self.result.
+            batch_size (int): If larger than 1, short inputs from different files of the same batch length
+                              (see utils.decode.batch_length) are decoded together, up to batch_size
+                              channels per forward pass.
         
         Returns:
             dict or ndarray: Processed audio results either as a dictionary or as a single array, 
@@ -234,7 +785,7 @@ class SpeechModel:
         self.args.input_path = input_path
         data_reader = DataReader(self.args)  # Initialize a data reader to load the audio files
 
-
+        output_wave_dir = None
         # Check if online writing is enabled
         if online_write:
             output_wave_dir = self.args.output_dir  # Set the default output directory
@@ -244,52 +795,75 @@ class SpeechModel:
             if not os.path.isdir(output_wave_dir):
                 os.makedirs(output_wave_dir)
         
+        # Very long recordings are processed block by block instead of being read at once
+        long_form_paths = []
+        if online_write and self.args.task != 'target_speaker_extraction':
+            long_form_paths = self.split_long_form(data_reader)
+
         num_samples = len(data_reader)  # Get the total number of samples to process
         print(f'Running {self.name} ...')  # Display the model being used
 
+        # Files are read ahead and outputs are written in background threads, so that
+        # file I/O overlaps with the model computation
+        prefetch_size = getattr(self.args, 'prefetch_size', 0)
+        io_workers = getattr(self.args, 'io_workers', 1)
+
         if self.args.task == 'target_speaker_extraction':
             from utils.video_process import process_tse
             assert online_write == True
             process_tse(self.args, self.model, self.device, data_reader, output_wave_dir)
         else:
-            # Disable gradient calculation for better efficiency during inference
-            with torch.no_grad():
-                for idx in tqdm(range(num_samples)):  # Loop over all audio samples
-                    self.data = {}
-                    # Read the audio, waveform ID, and audio length from the data reader
-                    input_audio, wav_id, input_len, scalars, audio_info = data_reader[idx]
-                    # Store the input audio and metadata in self.data
-                    self.data['audio'] = input_audio
-                    self.data['id'] = wav_id
-                    self.data['audio_len'] = input_len
-                    self.data.update(audio_info)
-                    
-                    # Perform the audio decoding/processing
-                    output_audios = self.decode()
-
-                    # Perform audio renormalization
-                    if not isinstance(output_audios, list):
-                        if len(scalars) > 1:
-                            for i in range(len(scalars)):
-                                output_audios[:,i] = output_audios[:,i] * scalars[i]
-                        else:
-                                output_audios = output_audios * scalars[0]
-                        
-                    if online_write:
-                        # If online writing is enabled, save the output audio to files
-                        if isinstance(output_audios, list):
-                            # In case of multi-speaker output, save each speaker's output separately
-                            for spk in range(self.args.num_spks):
-                                output_file = os.path.join(output_wave_dir, wav_id.replace('.'+self.data['ext'], f'_s{spk+1}.'+self.data['ext']))
-                                self.write_audio(output_file, key=None, spk=spk, audio=output_audios)
-                        else:
-                            # Single-speaker or standard output
-                            output_file = os.path.join(output_wave_dir, wav_id)
-                            self.write_audio(output_file, key=None, spk=None, audio=output_audios)
-                    else:
-                        # If not writing to disk, store the output in the result dictionary
-                        self.result[wav_id] = output_audios
-            
+            # Inputs are collected in a buffer and bucketed by length when batching is enabled
+            buffer = []
+            buffer_size = batch_size * BUCKET_BUFFER_FACTOR
+            items = iter(PrefetchReader(data_reader, prefetch_size, io_workers))
+            if online_write and prefetch_size > 0:
+                self.writer = ThreadPoolExecutor(max_workers=max(1, io_workers))
+            try:
+                # Disable gradient calculation for better efficiency during inference
+                with torch.no_grad():
+                    for idx in tqdm(range(num_samples)):  # Loop over all audio samples
+                        self.data = {}
+                        # Read the audio, waveform ID, and audio length from the prefetch queue
+                        input_audio, wav_id, input_len, scalars, audio_info = next(items)
+                        # Store the input audio and metadata in self.data
+                        self.data['audio'] = input_audio
+                        self.data['id'] = wav_id
+                        self.data['audio_len'] = input_len
+                        self.data.update(audio_info)
+
+                        if batch_size > 1:
+                            buffer.append((self.data, scalars))
+                            if len(buffer) >= buffer_size:
+                                self.process_buffer(buffer, batch_size, online_write, output_wave_dir)
+                                buffer = []
+                            continue
+
+                        # Perform the audio decoding/processing
+                        output_audios = self.decode()
+
+                        # Perform audio renormalization
+                        output_audios = self.renormalize(output_audios, scalars)
+
+                        # Write the output audio or store it in self.result
+                        self.emit(output_audios, wav_id, online_write, output_wave_dir)
+
+                    if buffer:
+                        self.process_buffer(buffer, batch_size, online_write, output_wave_dir)
+
+                    for path in long_form_paths:
+                        self.process_long_form(path, output_wave_dir)
+            finally:
+                items.close()
+                if self.writer is not None:
+                    # Wait for the remaining outputs to be written
+                    try:
+                        self.wait_writes(0)
+                    finally:
+                        self.writer.shutdown()
+                        self.writer = None
+                        self.pending_writes.clear()
+
             # Return the processed results if not writing to disk
             if not online_write:
                 if len(self.result) == 1:
@@ -299,7 +873,102 @@ class SpeechModel:
                     # Otherwise, return the entire result dictionary
                     return self.result
 
-    def write_audio(self, output_path, key=None, spk=None, audio=None):
+    def split_long_form(self, data_reader):
+        """
+        Removes the inputs longer than args.long_form_threshold seconds (and longer than
+        one_time_decode_length) from the data reader, so that they can be processed with
+        process_long_form. Long-form processing is disabled if the threshold is 0 or the
+        network does not support it.
+
+        Args:
+        - data_reader: The DataReader of the inputs.
+
+        Returns:
+        list: The paths of the long inputs.
+        """
+        threshold = getattr(self.args, 'long_form_threshold', 0)
+        if not threshold or self.args.network not in LONG_FORM_NETWORKS:
+            return []
+        threshold = max(threshold, self.args.one_time_decode_length)
+        short_paths, long_paths = [], []
+        for path in data_reader.file_list:
+            try:
+                is_long = audio_duration(path) > threshold
+            except Exception:
+                is_long = False  # Let the regular reader report unreadable files
+            (long_paths if is_long else short_paths).append(path)
+        data_reader.file_list = short_paths
+        return long_paths
+
+    def process_long_form(self, path, output_wave_dir):
+        """
+        Processes one long recording block by block and writes the output incrementally.
+        Blocks are read from the file (or a memory-mapped decoded copy), fed to segmented
+        decoding on the same window grid as in-memory decoding, resampled back to the input
+        rate and encoded as they become final. The memory use is bounded by the block length
+        and the decoding window instead of the length of the recording.
+
+        Speech separation rescales every output to the input level over the whole recording,
+        so its outputs are first written to temporary files and then rescaled in a second pass.
+
+        Args:
+        - path: The file path of the input audio.
+        - output_wave_dir: The output directory.
+        """
+        wav_id = path.split('/')[-1]
+        use_norm = self.args.network in ['FRCRN_SE_16K', 'MossFormer2_SS_16K']
+        block_seconds = getattr(self.args, 'long_form_block', 0) or DEFAULT_LONG_FORM_BLOCK
+        reader = LongFormReader(path, self.args.sampling_rate, use_norm, block_seconds)
+        sinks = []
+        try:
+            audio_info = reader.audio_info
+            self.data = dict(audio_info, id=wav_id, audio_len=reader.length)
+            window = int(self.args.sampling_rate * self.args.decode_window)
+            stride = int(window * 0.75)
+            streams = [SegmentStream(window_decoder(self.model, self.device, self.args, mean_square), window, stride,
+                                     get_decode_batch_size(self.args), get_stitch_mode(self.args))
+                       for mean_square in reader.mean_squares]
+
+            if self.args.task == 'speech_separation':
+                sinks = [LongFormSpooler(len(streams)) for _ in range(self.args.num_spks)]
+            else:
+                sinks = [LongFormWriter(os.path.join(output_wave_dir, wav_id), audio_info, self.args.sampling_rate,
+                                        reader.scalars)]
+
+            def emit(outputs, final=False):
+                # outputs holds one tensor of shape [T] or [num_spks, T] per channel, or None per channel
+                if outputs[0] is None:
+                    outputs = np.zeros((len(streams), len(sinks), 0), dtype=np.float32)
+                else:
+                    outputs = np.stack([output.detach().cpu().numpy() for output in outputs])
+                    if outputs.ndim == 2:
+                        outputs = outputs[:, None, :]
+                if outputs.shape[-1] > 0 or final:
+                    for spk, sink in enumerate(sinks):
+                        sink.write(outputs[:, spk, :], final)
+
+            with torch.no_grad():
+                for block in reader.blocks():
+                    emit([stream.push(to_tensor(channel, self.device)) for channel, stream in zip(block, streams)])
+                emit([stream.flush() for stream in streams], final=True)
+
+            if self.args.task == 'speech_separation':
+                # Normalize the outputs back to the input magnitude for each speaker and channel
+                rms_input = reader.mean_squares ** 0.5
+                for spk, spooler in enumerate(sinks):
+                    output_file = os.path.join(output_wave_dir, wav_id.replace('.'+audio_info['ext'], f'_s{spk+1}.'+audio_info['ext']))
+                    gains = [rms_input[c] / rms_out * reader.scalars[c] for c, rms_out in enumerate(spooler.rms())]
+                    writer = LongFormWriter(output_file, audio_info, self.args.sampling_rate, gains)
+                    try:
+                        spooler.replay(writer, reader.block_size)
+                    finally:
+                        writer.close()
+        finally:
+            reader.close()
+            for sink in sinks:
+                sink.close()
+
+    def write_audio(self, output_path, key=None, spk=None, audio=None, audio_info=None):
         """
         This function writes an audio signal to an output file, applying necessary transformations
         such as resampling, channel handling, and format conversion based on the provided parameters
@@ -313,7 +982,11 @@ class SpeechModel:
                                  audio from a multi-speaker dataset or result.
             audio (numpy.ndarray, optional): A numpy array containing the audio data to be written.
                                  If provided, key and spk are ignored.
+            audio_info (dict, optional): The input audio information (sample_rate, channels,
+                                 sample_width and ext). Defaults to self.data.
         """
+        if audio_info is None:
+            audio_info = self.data
         
         if audio is not None:
             if spk is not None:
@@ -326,42 +999,17 @@ class SpeechModel:
             else:
                 result_ = self.result[key]
                 
-        if self.data['sample_rate'] != self.args.sampling_rate:
-            if self.data['channels'] == 2:
-                left_channel = librosa.resample(result_[0,:], orig_sr=self.args.sampling_rate, target_sr=self.data['sample_rate'])
-                right_channel = librosa.resample(result_[1,:], orig_sr=self.args.sampling_rate, target_sr=self.data['sample_rate'])
-                result = np.vstack((left_channel, right_channel)).T
-            else:
-                result = librosa.resample(result_[0,:], orig_sr=self.args.sampling_rate, target_sr=self.data['sample_rate'])
-        else:
-            if self.data['channels'] == 2:
-                left_channel = result_[0,:]
-                right_channel = result_[1,:]
-                result = np.vstack((left_channel, right_channel)).T
-            else:
-                result = result_[0,:]
-                
-        if self.data['sample_width'] == 4: ##32 bit float
-            MAX_WAV_VALUE = 2147483648.0
-            np_type = np.int32
-        elif self.data['sample_width'] == 2: ##16 bit int
-            MAX_WAV_VALUE = 32768.0
-            np_type = np.int16
-        else:
-            self.data['sample_width'] = 2 ##16 bit int
-            MAX_WAV_VALUE = 32768.0
-            np_type = np.int16
-                        
-        result = result * MAX_WAV_VALUE
-        result = result.astype(np_type)
-        audio_segment = AudioSegment(
-            result.tobytes(),  # Raw audio data as bytes
-            frame_rate=self.data['sample_rate'],  # Sample rate
-            sample_width=self.data['sample_width'],          # No. bytes per sample
-            channels=self.data['channels']               # No. channels
-        )
-        audio_format = 'ipod' if self.data['ext'] in ['m4a', 'aac'] else self.data['ext']
-        audio_segment.export(output_path, format=audio_format)
+        # Keep the left and right channels of stereo audio, the first channel otherwise
+        num_channels = 2 if audio_info['channels'] == 2 else 1
+        result = result_[:num_channels]
+        if audio_info['sample_rate'] != self.args.sampling_rate:
+            # Resample all channels at once with the cached polyphase filter
+            result = resample(result, self.args.sampling_rate, audio_info['sample_rate'])
+
+        if audio_info['sample_width'] not in [2, 3, 4]:
+            audio_info = dict(audio_info, sample_width=2) ##16 bit int
+        # The [C, T] result is written as interleaved [T, C] frames
+        audiowrite(output_path, result.T, audio_info)
                     
     def write(self, output_path, add_subdir=False, use_key=False):
         """
@@ -453,6 +1101,19 @@ class CLS_FRCRN_SE_16K(SpeechModel):
         # Set the model to evaluation mode (no gradient calculation)
         self.model.eval()
 
+    def streaming_session(self):
+        """
+        Creates a streaming inference session that enhances audio chunk by chunk at a fixed
+        algorithmic delay, e.g. for live calls. Chunks must be at args.sampling_rate.
+
+        Returns:
+        StreamingFRCRN: A new session; every stream should use its own session.
+        """
+        from models.frcrn_se.streaming import StreamingFRCRN
+        if self.backend != 'torch':
+            raise ValueError(f'Streaming requires the torch backend, {self.name} runs on {self.backend}')
+        return StreamingFRCRN(self.model)
+
 class CLS_MossFormer2_SE_48K(SpeechModel):
     """
     A subclass of SpeechModel that implements the MossFormer2 architecture for 
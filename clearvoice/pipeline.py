@@ -0,0 +1,163 @@
+import os
+import asyncio
+import numpy as np
+import torch
+from model_registry import get_model_registry
+from dataloader.dataloader import audioread, audiowrite
+from dataloader.misc import get_file_extension
+from utils.resample import resample
+
+class ClearVoicePipeline:
+    """
+    Runs several ClearVoice models one after another on the same audio, e.g. speech
+    enhancement followed by speech super-resolution. The audio is decoded once, passed
+    between the stages as a float32 tensor on the model device and encoded once at the end,
+    so no intermediate files are written. Resampling only happens between stages that run
+    at different sampling rates.
+    """
+
+    def __init__(self, stages):
+        """
+        Loads the models of all pipeline stages.
+
+        Parameters:
+        ----------
+        stages: list of dict or list of tuple
+            the pipeline stages in order, each given as {'task': ..., 'model_name': ...}
+            (with an optional 'precision' and 'backend', see ClearVoice) or as a (task, model_name) tuple.
+            Only the tasks 'speech_enhancement' and 'speech_super_resolution' are supported.
+        """
+        self.models = []
+        for stage in stages:
+            precision, backend = 'float32', 'torch'
+            if isinstance(stage, dict):
+                task, model_name = stage['task'], stage['model_name']
+                precision = stage.get('precision', precision)
+                backend = stage.get('backend', backend)
+            else:
+                task, model_name = stage
+            if task not in ['speech_enhancement', 'speech_super_resolution']:
+                raise ValueError(f'{task} is not supported in a pipeline, please select from: '
+                                 'speech_enhancement or speech_super_resolution')
+            model = get_model_registry().get(task, model_name, dtype=precision, backend=backend)
+            if model is None:
+                raise ValueError(f'Unable to load {model_name} for {task}')
+            self.models.append(model)
+
+    def __call__(self, input_path, output_path=None):
+        """
+        Runs all stages on one audio file.
+
+        Parameters:
+        ----------
+        input_path: str
+            path to the input audio file
+        output_path: str, optional
+            if given, the final output is written to this path. The format is taken from the
+            file extension, or from the input file if output_path has no extension.
+
+        Returns:
+        --------
+        numpy.ndarray of shape [C, T] holding the processed audio
+        """
+        audio, audio_info = self.read(input_path)
+        sample_rate = audio_info['sample_rate']
+        # Outputs are written at the input sampling rate, unless super-resolution raised it
+        output_rate = sample_rate
+
+        for model in self.models:
+            print(f'Running {model.name} ...')
+            audio = model.process_tensor(audio, sample_rate)
+            sample_rate = model.args.sampling_rate
+            if model.args.task == 'speech_super_resolution':
+                output_rate = sample_rate
+
+        result = self.finish(audio, sample_rate, output_rate)
+        if isinstance(output_path, str):
+            self.write(result, output_path, audio_info, output_rate)
+        return result
+
+    async def run_async(self, input_path, output_path=None, executor=None):
+        """
+        Runs all stages on one audio file from an asyncio event loop, e.g. in a server
+        handling several jobs at once. Reading and writing run in worker threads, and the
+        model stages run on the GPU executor, which decodes compatible stages of concurrent
+        jobs together.
+
+        Parameters:
+        ----------
+        input_path: str
+            path to the input audio file
+        output_path: str, optional
+            if given, the final output is written to this path (see __call__)
+        executor: GPUExecutor, optional
+            the executor of the model stages, the process-wide one by default
+
+        Returns:
+        --------
+        numpy.ndarray of shape [C, T] holding the processed audio
+        """
+        if executor is None:
+            from gpu_executor import get_gpu_executor
+            executor = get_gpu_executor()
+        # asyncio.to_thread needs Python 3.9, the default thread pool of the loop is used instead
+        loop = asyncio.get_running_loop()
+        audio, audio_info = await loop.run_in_executor(None, self.read, input_path)
+        sample_rate = audio_info['sample_rate']
+        output_rate = sample_rate
+
+        for model in self.models:
+            audio = await asyncio.wrap_future(executor.submit(model, audio, sample_rate))
+            sample_rate = model.args.sampling_rate
+            if model.args.task == 'speech_super_resolution':
+                output_rate = sample_rate
+
+        result = await loop.run_in_executor(None, self.finish, audio, sample_rate, output_rate)
+        if isinstance(output_path, str):
+            await loop.run_in_executor(None, self.write, result, output_path, audio_info, output_rate)
+        return result
+
+    def read(self, input_path):
+        """
+        Decodes the input audio file.
+
+        Returns:
+        --------
+        tuple of the [C, T] float32 tensor and the input audio information returned by audioread
+        """
+        audios, _, audio_info = audioread(input_path, None, use_norm=False)
+        return torch.from_numpy(audios), audio_info  # [C, T] float32, shares the decoded buffer
+
+    def finish(self, audio, sample_rate, output_rate):
+        """
+        Resamples the output of the last stage to the output sampling rate and moves it to the host.
+        """
+        with torch.no_grad():
+            if sample_rate != output_rate:
+                audio = resample(audio, sample_rate, output_rate)
+        return audio.cpu().numpy()
+
+    def write(self, result, output_path, audio_info, sample_rate):
+        """
+        Encodes the pipeline output into a single file.
+
+        Parameters:
+        ----------
+        result: numpy.ndarray
+            processed audio of shape [C, T]
+        output_path: str
+            path of the output file
+        audio_info: dict
+            the input audio information returned by audioread
+        sample_rate: int
+            sampling rate of result
+        """
+        output_dir = os.path.dirname(output_path)
+        if output_dir and not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        info = dict(audio_info)
+        info['sample_rate'] = sample_rate
+        ext = get_file_extension(output_path).replace('.', '')
+        if ext:
+            info['ext'] = ext
+        audiowrite(output_path, np.ascontiguousarray(result.T), info)
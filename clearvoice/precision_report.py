@@ -0,0 +1,119 @@
+"""
+Compares a reduced-precision mode of ClearVoice models with float32 inference on the bundled
+samples and reports quality and speed: the SI-SNR of the reduced-precision output against
+the float32 output (higher is closer, identical outputs are far above 40 dB), the real-time
+factor of both modes and the speedup.
+
+The SI-SNR also gates each model: the script exits with status 1 if any output falls below
+--min-si-snr (MIN_SI_SNR of the precision by default), so a model is only served in a
+reduced precision once it passes on the samples. Models outside of AUTOCAST_NETWORKS
+(networks.py) can be measured in float16/bfloat16 here before they are added to it.
+
+Usage:
+    python precision_report.py --precision int8
+    python precision_report.py --precision float16 --device cuda
+    python precision_report.py --precision int8 --models speech_enhancement:FRCRN_SE_16K --output int8_report.md
+"""
+import sys
+import argparse
+import time
+import numpy as np
+import torch
+from network_wrapper import network_wrapper
+from dataloader.dataloader import audioread
+from result_cache import set_result_cache
+from utils.quality import si_snr
+
+DEFAULT_MODELS = [
+    ('speech_enhancement', 'FRCRN_SE_16K'),
+    ('speech_enhancement', 'MossFormerGAN_SE_16K'),
+    ('speech_enhancement', 'MossFormer2_SE_48K'),
+    ('speech_separation', 'MossFormer2_SS_16K'),
+    ('speech_super_resolution', 'MossFormer2_SR_48K'),
+]
+# Bundled samples used for each task
+SAMPLES = {
+    'speech_enhancement': ['samples/input.wav', 'samples/speech2_short.wav'],
+    'speech_separation': ['samples/input_ss.wav'],
+    'speech_super_resolution': ['samples/input_sr_8k.wav'],
+}
+# Default minimum SI-SNR in dB against float32 that every output must reach, per precision
+MIN_SI_SNR = {'float16': 30.0, 'bfloat16': 20.0, 'int8': 15.0}
+# Networks whose inputs are normalized by DataReader
+NORM_NETWORKS = ['FRCRN_SE_16K', 'MossFormer2_SS_16K']
+
+def run(model, audio):
+    """Decodes one input and returns the output and the decoding time in seconds."""
+    model.data = {'audio': audio, 'audio_len': audio.shape[-1]}
+    start = time.perf_counter()
+    with torch.no_grad():
+        output = model.decode()
+    if model.device.type == 'cuda':
+        torch.cuda.synchronize()
+    return output, time.perf_counter() - start
+
+def compare(task, model_name, precision, device):
+    """Returns one report row per sample for a model."""
+    reference = network_wrapper()(task, model_name)
+    reference.to_device(device)
+    candidate = network_wrapper()(task, model_name)
+    # Also for networks not validated yet, the report is what validates them
+    candidate.set_precision(precision, validated_only=False)
+    if precision != 'int8':
+        candidate.to_device(device)
+    reference.warmup()
+    candidate.warmup()
+
+    rows = []
+    for path in SAMPLES[task]:
+        audio, _, _ = audioread(path, reference.args.sampling_rate, model_name in NORM_NETWORKS)
+        duration = audio.shape[-1] / reference.args.sampling_rate
+        reference_output, reference_time = run(reference, audio)
+        candidate_output, candidate_time = run(candidate, audio)
+        if isinstance(reference_output, list):
+            quality = np.mean([si_snr(c, r).mean() for c, r in zip(candidate_output, reference_output)])
+        else:
+            quality = si_snr(candidate_output, reference_output).mean()
+        rows.append((model_name, path, duration, quality, reference_time / duration,
+                     candidate_time / duration, reference_time / candidate_time))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description='Quality and speed of reduced-precision inference against float32')
+    parser.add_argument('--precision', type=str, default='int8', help='the precision to compare with float32')
+    parser.add_argument('--models', nargs='*', default=None, help='models as task:model_name (default: all models)')
+    parser.add_argument('--device', type=str, default='cpu', help='device of the float32 reference (and of float16/bfloat16)')
+    parser.add_argument('--min-si-snr', type=float, default=None, help='minimum SI-SNR in dB against float32 (default: MIN_SI_SNR)')
+    parser.add_argument('--output', type=str, default=None, help='also write the report to this file')
+    args = parser.parse_args()
+
+    # Every decode has to run the model
+    set_result_cache(False)
+    models = [tuple(model.split(':', 1)) for model in args.models] if args.models else DEFAULT_MODELS
+    min_si_snr = args.min_si_snr if args.min_si_snr is not None else MIN_SI_SNR.get(args.precision, 0.0)
+
+    lines = [f'# {args.precision} vs float32 ({args.device} reference)', '',
+             '| model | sample | seconds | SI-SNR vs float32 (dB) | RTF float32 | RTF ' + args.precision + ' | speedup | parity |',
+             '|---|---|---|---|---|---|---|---|']
+    failed = []
+    for task, model_name in models:
+        for row in compare(task, model_name, args.precision, args.device):
+            passed = row[3] >= min_si_snr
+            if not passed and model_name not in failed:
+                failed.append(model_name)
+            lines.append('| {} | {} | {:.1f} | {:.1f} | {:.3f} | {:.3f} | {:.2f}x | '.format(*row) + ('pass' if passed else 'FAIL') + ' |')
+    lines.append('')
+    if failed:
+        lines.append(f'Below {min_si_snr:.1f} dB SI-SNR, keep in float32: {", ".join(failed)}')
+    else:
+        lines.append(f'All models reach {min_si_snr:.1f} dB SI-SNR')
+    report = '\n'.join(lines) + '\n'
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
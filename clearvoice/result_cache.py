@@ -0,0 +1,245 @@
+import os
+import io
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+import numpy as np
+import torch
+
+# Bytes read at once when hashing checkpoint files
+HASH_READ_SIZE = 1 << 20
+# Decoding options that change the output of a model, part of every cache key
+# Size budget in MB when CLEARVOICE_RESULT_CACHE_MB is unset, so that a cache directory cannot fill the disk
+DEFAULT_SIZE_MB = 1024
+DECODE_PARAMS = ('sampling_rate', 'decode_window', 'one_time_decode_length', 'stitch_mode', 'num_spks', 'precision', 'backend', 'layer_schedule')
+
+class ResultCache:
+    """
+    A content-addressed cache of model outputs. Every processing step is deterministic
+    given its input samples, the model and the decoding options, so a repeated input
+    (e.g., a retried job) or a pipeline that shares its first stages with an earlier
+    one can skip the model entirely.
+
+    Entries are keyed by make_key() and stored as compressed float arrays, either in
+    memory or as .npz files in a directory. When the stored entries exceed the size
+    budget, the least recently used entries are evicted.
+
+    Attributes:
+    - cache_dir: Directory of the stored entries, or None to keep them in memory.
+    - max_size_mb: Size budget in MB for the stored entries (0 means unbounded).
+    - hits: Number of lookups served from the cache.
+    - misses: Number of lookups that found no entry.
+    """
+
+    def __init__(self, cache_dir=None, max_size_mb=None):
+        """
+        Initializes the cache. Entries already stored in cache_dir are reused.
+
+        Args:
+        - cache_dir (str, optional): Directory of the stored entries. If None, the value of the
+          CLEARVOICE_RESULT_CACHE_DIR environment variable is used (in memory if unset).
+        - max_size_mb (float, optional): Size budget in MB. If None, the value of the
+          CLEARVOICE_RESULT_CACHE_MB environment variable is used (DEFAULT_SIZE_MB if unset).
+          Pass 0 for an unbounded cache.
+        """
+        if cache_dir is None:
+            cache_dir = os.environ.get('CLEARVOICE_RESULT_CACHE_DIR') or None
+        if max_size_mb is None:
+            max_size_mb = float(os.environ.get('CLEARVOICE_RESULT_CACHE_MB') or DEFAULT_SIZE_MB)
+        self.cache_dir = cache_dir
+        self.max_size_mb = max_size_mb
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> compressed bytes (or None on disk), least recently used first
+        self._sizes = {}  # key -> size in bytes
+        self._lock = threading.Lock()  # Guards _entries, _sizes and the files in cache_dir
+        self._file_digests = {}  # (path, size, mtime) -> sha256 of the file
+
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Index the stored entries from the least to the most recently used
+            names = [name for name in os.listdir(self.cache_dir) if name.endswith('.npz')]
+            paths = sorted((os.path.join(self.cache_dir, name) for name in names), key=os.path.getmtime)
+            for path in paths:
+                key = os.path.basename(path)[:-len('.npz')]
+                self._entries[key] = None
+                self._sizes[key] = os.path.getsize(path)
+            self._evict()
+
+    @staticmethod
+    def hash_audio(audio):
+        """
+        Returns the sha256 hex digest of the samples and shape of an audio array or tensor,
+        taken as float32.
+        """
+        if isinstance(audio, torch.Tensor):
+            audio = audio.detach().to('cpu', torch.float32).numpy()
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        digest = hashlib.sha256(str(audio.shape).encode())
+        digest.update(memoryview(audio).cast('B'))
+        return digest.hexdigest()
+
+    def file_digest(self, path):
+        """
+        Returns the sha256 hex digest of a file, e.g. a checkpoint. The digest is computed
+        once per process and recomputed only if the size or modification time of the file changes.
+        """
+        stat = os.stat(path)
+        file_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        digest = self._file_digests.get(file_key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(HASH_READ_SIZE), b''):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+            self._file_digests[file_key] = digest
+        return digest
+
+    def make_key(self, audio, task, model_name, checkpoint_paths, args):
+        """
+        Builds the cache key of one processing step.
+
+        Args:
+        - audio (numpy.ndarray or torch.Tensor): The model input, as passed to the decoder.
+        - task (str): The task type (e.g., 'speech_enhancement').
+        - model_name (str): The model name (e.g., 'MossFormer2_SE_48K').
+        - checkpoint_paths (list of str): The checkpoint files the model weights were loaded from.
+        - args (Namespace): The model arguments, of which DECODE_PARAMS are part of the key.
+
+        Returns:
+        - str: The sha256 hex digest of the audio hash, task, model, checkpoints and decode options.
+        """
+        fields = {
+            'audio': self.hash_audio(audio),
+            'task': task,
+            'model_name': model_name,
+            'checkpoints': [self.file_digest(path) for path in checkpoint_paths],
+            'params': {name: getattr(args, name, None) for name in DECODE_PARAMS},
+        }
+        return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the stored output for key, a numpy.ndarray or a list of arrays (e.g., one per
+        speaker), or None if there is no entry.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            data = self._entries[key]
+            if data is None:
+                path = self._path(key)
+                try:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    os.utime(path)  # The modification time orders the entries on disk
+                except OSError:
+                    # Removed by another process sharing the directory
+                    del self._entries[key]
+                    del self._sizes[key]
+                    self.misses += 1
+                    return None
+            self.hits += 1
+
+        with np.load(io.BytesIO(data)) as stored:
+            arrays = [stored[f'arr_{i}'] for i in range(len(stored.files) - 1)]
+            is_list = bool(stored['is_list'])
+        return arrays if is_list else arrays[0]
+
+    def put(self, key, output):
+        """
+        Stores an output, a numpy.ndarray or a list of arrays, under key. Tensors (decoded with
+        as_tensor) are stored as arrays.
+        """
+        is_list = isinstance(output, list)
+        arrays = output if is_list else [output]
+        arrays = [array.detach().cpu() if isinstance(array, torch.Tensor) else array for array in arrays]
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, *[np.asarray(array, dtype=np.float32) for array in arrays], is_list=is_list)
+        data = buffer.getvalue()
+
+        with self._lock:
+            if self.cache_dir is None:
+                self._entries[key] = data
+            else:
+                # Write to a temporary file first, so that readers never see a partial entry
+                fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, self._path(key))
+                self._entries[key] = None
+            self._entries.move_to_end(key)
+            self._sizes[key] = len(data)
+            self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def _evict(self):
+        """
+        Evicts the least recently used entries until the cache fits in the size budget.
+        Must be called with the lock held.
+        """
+        if not self.max_size_mb:
+            return
+        budget = self.max_size_mb * 1024 * 1024
+        total = sum(self._sizes.values())
+        while total > budget and self._entries:
+            key, _ = self._entries.popitem(last=False)
+            total -= self._sizes.pop(key)
+            if self.cache_dir is not None:
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+
+    def clear(self):
+        """
+        Removes all entries.
+        """
+        with self._lock:
+            if self.cache_dir is not None:
+                for key in self._entries:
+                    try:
+                        os.remove(self._path(key))
+                    except OSError:
+                        pass
+            self._entries.clear()
+            self._sizes.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_result_cache():
+    """
+    Returns the process-wide ResultCache, or None if result caching is disabled. Unless
+    set_result_cache() was called, the cache is enabled by setting CLEARVOICE_RESULT_CACHE_MB
+    or CLEARVOICE_RESULT_CACHE_DIR (with a budget of DEFAULT_SIZE_MB unless the former is set).
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None and (os.environ.get('CLEARVOICE_RESULT_CACHE_MB') or os.environ.get('CLEARVOICE_RESULT_CACHE_DIR')):
+            _cache = ResultCache()
+        return _cache if isinstance(_cache, ResultCache) else None
+
+def set_result_cache(cache):
+    """
+    Sets the process-wide ResultCache. Pass False to disable result caching, or None to
+    fall back to the environment variables.
+    """
+    global _cache
+    with _cache_lock:
+        _cache = cache
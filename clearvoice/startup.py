@@ -0,0 +1,65 @@
+import os
+import json
+import time
+import logging
+from model_registry import get_model_registry
+
+logger = logging.getLogger(__name__)
+
+# Cold start timings in seconds of this worker, filled in by preload_models()
+STARTUP_TIMINGS = {}
+
+def preload_models(default_pipeline, process_start, import_seconds):
+    """
+    Loads the models of the configured pipeline into the model registry before the first
+    request and runs a dummy forward pass through each, so that requests never download
+    checkpoints or build models. Shared by the serverless entry points (main.py and handler.py).
+    The pipeline is read from CLEARVOICE_PRELOAD_PIPELINE (a JSON list of stages,
+    default_pipeline if unset). Preloading is disabled with CLEARVOICE_PRELOAD=0, and the
+    dummy forward pass with CLEARVOICE_WARMUP=0. With CLEARVOICE_CONVERT_CHECKPOINTS=1,
+    fast-loading copies of the checkpoints are written (see convert_checkpoints.py) so that
+    later cold starts load faster.
+
+    Args:
+        default_pipeline (list of dict): The stages preloaded if CLEARVOICE_PRELOAD_PIPELINE is unset
+        process_start (float): time.perf_counter() at the start of the entry point
+        import_seconds (float): Time spent importing the entry point's modules
+
+    Returns:
+        dict: The cold start timings in seconds, also stored in STARTUP_TIMINGS
+    """
+    STARTUP_TIMINGS['import_seconds'] = import_seconds
+    if os.environ.get('CLEARVOICE_PRELOAD', '1') != '0':
+        stages = default_pipeline
+        if os.environ.get('CLEARVOICE_PRELOAD_PIPELINE'):
+            stages = json.loads(os.environ['CLEARVOICE_PRELOAD_PIPELINE'])
+        timings = get_model_registry().preload(stages, warmup=os.environ.get('CLEARVOICE_WARMUP', '1') != '0',
+                                               convert_checkpoints=os.environ.get('CLEARVOICE_CONVERT_CHECKPOINTS') == '1')
+        for timing in timings:
+            logger.info(f"Preloaded {timing['model_name']} for {timing['task']}: "
+                        f"load {timing['load_seconds']:.2f}s, warmup {timing['warmup_seconds']:.2f}s")
+        STARTUP_TIMINGS['load_seconds'] = sum(timing['load_seconds'] for timing in timings)
+        STARTUP_TIMINGS['warmup_seconds'] = sum(timing['warmup_seconds'] for timing in timings)
+    STARTUP_TIMINGS['total_seconds'] = time.perf_counter() - process_start
+    logger.info(f"Cold start: {json.dumps({key: round(value, 3) for key, value in STARTUP_TIMINGS.items()})}")
+    return STARTUP_TIMINGS
+
+def is_warm_start(model_pipeline):
+    """
+    Returns True if all models of a pipeline are loaded, i.e. a job running it builds none.
+    """
+    registry = get_model_registry()
+    return all(registry.is_loaded(stage['task'], stage['model_name'], dtype=stage.get('precision', 'float32'),
+                                  backend=stage.get('backend', 'torch'))
+               for stage in model_pipeline)
+
+def job_timings(warm_start, job_start):
+    """
+    Returns the timings reported with a job: whether it was a warm start, its processing
+    time in seconds and the cold start timings of the worker (see preload_models).
+    """
+    return {
+        "warm_start": warm_start,
+        "processing_seconds": time.perf_counter() - job_start,
+        "cold_start": STARTUP_TIMINGS
+    }
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules of clearvoice are imported as top-level modules (run from clearvoice/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
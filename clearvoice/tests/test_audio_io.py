@@ -0,0 +1,55 @@
+import subprocess
+import sys
+import numpy as np
+import pytest
+import soundfile as sf
+import dataloader.audio_io as audio_io
+from dataloader.audio_io import AudioFileWriter, read_soundfile
+
+SAMPLE_RATE = 16000
+
+@pytest.mark.parametrize('ext', ['wav', 'flac'])
+@pytest.mark.parametrize('sample_width, subtype', [(2, 'PCM_16'), (3, 'PCM_24')])
+def test_write_read_round_trip(tmp_path, ext, sample_width, subtype):
+    audio = 0.5 * np.sin(np.linspace(0, 100, 2 * SAMPLE_RATE, dtype=np.float32)).reshape(2, -1)
+    path = str(tmp_path / f'out.{ext}')
+    audio_info = {'sample_rate': SAMPLE_RATE, 'channels': 2, 'sample_width': sample_width, 'ext': ext}
+    with AudioFileWriter(path, audio_info) as writer:
+        writer.write(audio.T)
+    assert sf.info(path).subtype == subtype
+    decoded, decoded_info = read_soundfile(path)
+    assert decoded_info == {'sample_rate': SAMPLE_RATE, 'channels': 2, 'sample_width': sample_width}
+    np.testing.assert_allclose(decoded.T, audio, atol=2.0 / 2 ** (8 * sample_width - 1))
+
+def test_flac_caps_32_bit_at_24_bit(tmp_path):
+    path = str(tmp_path / 'out.flac')
+    audio_info = {'sample_rate': SAMPLE_RATE, 'channels': 1, 'sample_width': 4, 'ext': 'flac'}
+    with AudioFileWriter(path, audio_info) as writer:
+        writer.write(np.zeros((SAMPLE_RATE, 1), dtype=np.float32))
+    assert sf.info(path).subtype == 'PCM_24'
+
+def fake_ffmpeg(script):
+    # Runs a Python script in place of ffmpeg, with the same pipes and log redirection
+    def popen(cmd, **kwargs):
+        return real_popen([sys.executable, '-c', script], **kwargs)
+    real_popen = subprocess.Popen
+    return popen
+
+def test_ffmpeg_decode_with_long_log(monkeypatch):
+    # More log than a pipe buffer holds, written before the samples
+    script = ('import sys; sys.stderr.write("bad packet\\n" * 100000); sys.stderr.flush(); '
+              'sys.stdout.buffer.write(bytes(4 * 1000))')
+    monkeypatch.setattr(audio_io.subprocess, 'Popen', fake_ffmpeg(script))
+    buffer = bytearray()
+    audio_io.decode_ffmpeg('damaged.mp3', buffer.extend)
+    assert len(buffer) == 4 * 1000
+
+def test_ffmpeg_encode_with_long_log(monkeypatch, tmp_path):
+    script = ('import sys; sys.stderr.write("warning\\n" * 100000); sys.stderr.flush(); '
+              'sys.stdin.buffer.read(); sys.exit(1)')
+    monkeypatch.setattr(audio_io.subprocess, 'Popen', fake_ffmpeg(script))
+    writer = AudioFileWriter(str(tmp_path / 'out.mp3'),
+                                      {'sample_rate': 16000, 'sample_width': 2, 'channels': 1, 'ext': 'mp3'})
+    writer.write(np.zeros(1 << 20, dtype=np.float32))
+    with pytest.raises(RuntimeError, match='warning'):
+        writer.close()
@@ -0,0 +1,46 @@
+from argparse import Namespace
+import numpy as np
+import pytest
+import torch
+from models.frcrn_se.frcrn import FRCRN_SE_16K
+from networks import SpeechModel
+from result_cache import set_result_cache
+from utils.decode import batch_length
+
+@pytest.fixture
+def speech_model():
+    # A short decoding window, so that the inputs have different batch lengths
+    args = Namespace(task='speech_enhancement', network='FRCRN_SE_16K', sampling_rate=16000,
+                     one_time_decode_length=120, decode_window=0.25, win_type='hanning', win_len=640,
+                     win_inc=320, fft_len=640)
+    model = SpeechModel(args)
+    torch.manual_seed(0)
+    model.model = FRCRN_SE_16K(args).model.eval()
+    model.name = args.network
+    set_result_cache(False)
+    yield model
+    set_result_cache(None)
+
+def make_buffer(shapes):
+    rng = np.random.default_rng(0)
+    buffer = []
+    for i, (channels, length) in enumerate(shapes):
+        audio = (0.1 * rng.standard_normal((channels, length))).astype(np.float32)
+        buffer.append(({'id': f'{i}.wav', 'audio': audio, 'audio_len': length}, [1.0] * channels))
+    return buffer
+
+def test_batch_length(speech_model):
+    assert batch_length(1000, speech_model.args) == 4000
+    assert batch_length(6000, speech_model.args) == 6000
+
+def test_batched_output_matches_unbatched(speech_model):
+    shapes = [(1, 6000), (2, 1000), (1, 8000), (1, 3000), (2, 6000), (1, 8000)]
+    results = []
+    for batch_size in (1, 4):
+        speech_model.result = {}
+        with torch.no_grad():
+            speech_model.process_buffer(make_buffer(shapes), batch_size, online_write=False)
+        results.append(speech_model.result)
+    for wav_id, output in results[0].items():
+        assert results[1][wav_id].shape == output.shape
+        np.testing.assert_allclose(results[1][wav_id], output, rtol=1e-4, atol=1e-4)
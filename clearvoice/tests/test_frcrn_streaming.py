@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+import pytest
+import torch
+from models.frcrn_se.frcrn import FRCRN_SE_16K
+from models.frcrn_se.se_layer import SELayer
+from models.frcrn_se.streaming import StreamingFRCRN
+from utils.quality import si_snr
+
+# Minimum SI-SNR in dB of the joined stream against offline inference, where the streamed
+# squeeze-and-excitation layers only pool over the frames seen so far
+MIN_SI_SNR = 40.0
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    return FRCRN_SE_16K(SimpleNamespace(win_len=640, win_inc=320, fft_len=640, win_type='hanning')).eval()
+
+def stream(model, audio, chunk_size):
+    session = StreamingFRCRN(model)
+    outputs = [session.process(audio[0, i:i + chunk_size]) for i in range(0, audio.size(-1), chunk_size)]
+    outputs.append(session.flush())
+    return torch.cat(outputs)
+
+@pytest.mark.parametrize('chunk_size', [320, 1000])
+def test_stream_state_matches_inference(model, monkeypatch, chunk_size):
+    # Without the squeeze-and-excitation layers, the carried layer states reproduce offline inference
+    monkeypatch.setattr(SELayer, 'forward', lambda self, x: x)
+    monkeypatch.setattr(SELayer, 'stream', lambda self, x, cache=None: (x, cache))
+    audio = 0.1 * torch.randn(1, 16000)
+    with torch.no_grad():
+        expected = model.model.inference(audio)
+    streamed = stream(model, audio, chunk_size)
+    assert streamed.shape == expected.shape
+    torch.testing.assert_close(streamed, expected, rtol=0, atol=1e-3)
+
+def test_stream_matches_inference(model):
+    # 250 STFT frames, far more than the look-ahead of the decoders
+    audio = 0.1 * torch.randn(1, 80000)
+    with torch.no_grad():
+        expected = model.model.inference(audio)
+    # Chunks that do not align with the STFT frames
+    streamed = stream(model, audio, 1000)
+    assert streamed.shape == expected.shape
+    assert si_snr(streamed.numpy()[None], expected.numpy()[None]).min() >= MIN_SI_SNR
@@ -0,0 +1,32 @@
+from argparse import Namespace
+import torch
+import torch.nn as nn
+from gpu_executor import StageRequest
+from networks import SpeechModel
+
+def make_model(network='FRCRN_SE_16K'):
+    args = Namespace(task='speech_enhancement', network=network, sampling_rate=16000,
+                     one_time_decode_length=20, decode_window=1)
+    model = SpeechModel(args)
+    model.model = nn.Linear(4, 4)
+    model.name = network
+    return model
+
+def batch_key(model, samples=8000, sample_rate=16000):
+    return StageRequest(model, torch.zeros(1, samples), sample_rate).batch_key()
+
+def test_batch_key_separates_weights_and_devices():
+    model = make_model()
+    fork = model.fork()
+    assert batch_key(model) == batch_key(fork)
+    # A separately built instance holds other weights
+    assert batch_key(model) != batch_key(make_model())
+    fork.device = torch.device('meta')
+    assert batch_key(model) != batch_key(fork)
+
+def test_batch_key_separates_batch_lengths():
+    model = make_model()
+    # Shorter than the decoding window, both are padded to it
+    assert batch_key(model, 8000) == batch_key(model, 4000)
+    assert batch_key(model, 20000) != batch_key(model, 21000)
+    assert batch_key(model, 16000 * 21) is None
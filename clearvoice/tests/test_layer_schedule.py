@@ -0,0 +1,69 @@
+from argparse import Namespace
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import torch
+import torch.nn as nn
+from gpu_executor import StageRequest
+from models.mossformer2_ss.mossformer2 import MossFormer2_SS_16K
+from networks import SpeechModel
+from result_cache import ResultCache
+
+NUM_LAYERS = 24
+
+@pytest.fixture(scope='module')
+def network():
+    # Random weights at reduced widths, with the full stack of layers
+    torch.manual_seed(0)
+    args = SimpleNamespace(encoder_embedding_dim=64, mossformer_sequence_dim=64, num_mossformer_layer=NUM_LAYERS,
+                           encoder_kernel_size=16, num_spks=2)
+    return MossFormer2_SS_16K(args).eval()
+
+def make_model(network='MossFormer2_SS_16K'):
+    args = Namespace(task='speech_separation', network=network, sampling_rate=16000, one_time_decode_length=20,
+                     decode_window=1, num_spks=2, num_mossformer_layer=NUM_LAYERS)
+    model = SpeechModel(args)
+    model.model = nn.Linear(4, 4)
+    model.name = network
+    return model
+
+def separate(network, layers):
+    torch.manual_seed(1)
+    audio = 0.1 * torch.randn(1, 4000)
+    with torch.no_grad():
+        return torch.stack(network(audio, layers=layers))
+
+def test_all_layers_match_no_schedule(network):
+    assert torch.equal(separate(network, list(range(NUM_LAYERS))), separate(network, None))
+
+def test_subset_changes_output(network):
+    assert not torch.allclose(separate(network, [0, 5, 23]), separate(network, None))
+
+@pytest.mark.parametrize('layers', [[], [NUM_LAYERS], [-1], [0, NUM_LAYERS]])
+def test_invalid_schedules_are_rejected(layers):
+    model = make_model()
+    with pytest.raises(ValueError):
+        model.set_layer_schedule(layers)
+    assert getattr(model.args, 'layer_schedule', None) is None
+
+def test_schedule_requires_a_separation_network():
+    with pytest.raises(ValueError):
+        make_model('FRCRN_SE_16K').set_layer_schedule([0, 1])
+
+def test_schedule_is_part_of_the_keys():
+    model = make_model()
+    audio = np.zeros((1, 8000), dtype=np.float32)
+    cache = ResultCache(max_size_mb=1)
+
+    def keys():
+        request = StageRequest(model, torch.from_numpy(audio), 16000)
+        return cache.make_key(audio, model.args.task, model.name, [], model.args), request.batch_key()
+
+    full_keys = keys()
+    model.set_layer_schedule([3, 1, 1])
+    assert model.args.layer_schedule == [1, 3]
+    schedule_keys = keys()
+    assert schedule_keys[0] != full_keys[0]
+    assert schedule_keys[1] != full_keys[1]
+    model.set_layer_schedule(None)
+    assert keys() == full_keys
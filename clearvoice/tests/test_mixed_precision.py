@@ -0,0 +1,75 @@
+import os
+from argparse import Namespace
+import numpy as np
+import pytest
+import torch
+import torch.nn as nn
+from network_wrapper import network_wrapper
+from networks import AUTOCAST_NETWORKS, SpeechModel
+from precision_report import MIN_SI_SNR
+from result_cache import set_result_cache
+from utils.mixed_precision import FP32_ISLANDS
+from utils.quality import si_snr
+
+TASKS = {
+    'FRCRN_SE_16K': 'speech_enhancement',
+    'MossFormerGAN_SE_16K': 'speech_enhancement',
+    'MossFormer2_SE_48K': 'speech_enhancement',
+    'MossFormer2_SS_16K': 'speech_separation',
+    'MossFormer2_SR_48K': 'speech_super_resolution',
+}
+# bfloat16 autocast runs on the CPU, float16 needs a GPU
+PRECISION = 'bfloat16'
+# Length in seconds of the input, and of the decoding window so that the models do not pad it
+SECONDS = 0.5
+
+@pytest.fixture
+def random_weights(monkeypatch):
+    # The configs are read relative to the clearvoice directory, the checkpoints are not loaded
+    monkeypatch.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    monkeypatch.setattr(SpeechModel, 'load_model', lambda self: None)
+    set_result_cache(False)
+    yield
+    set_result_cache(None)
+
+def build(model_name, precision):
+    torch.manual_seed(0)
+    model = network_wrapper()(TASKS[model_name], model_name, precision=precision)
+    model.args.decode_window = SECONDS
+    return model
+
+def quality(reference, candidate):
+    """Returns the mean SI-SNR in dB of the candidate's output against the reference's."""
+    generator = torch.Generator().manual_seed(1)
+    audio = 0.1 * torch.randn(1, int(reference.args.sampling_rate * SECONDS), generator=generator).numpy()
+    outputs = []
+    for model in (reference, candidate):
+        model.data = {'audio': audio, 'audio_len': audio.shape[-1]}
+        with torch.no_grad():
+            outputs.append(model.decode())
+    if isinstance(outputs[0], list):
+        return np.mean([si_snr(c, r).mean() for c, r in zip(outputs[1], outputs[0])])
+    return si_snr(outputs[1], outputs[0]).mean()
+
+@pytest.mark.parametrize('model_name', AUTOCAST_NETWORKS)
+def test_autocast_matches_float32(random_weights, model_name):
+    reference = build(model_name, 'float32')
+    candidate = build(model_name, PRECISION)
+    assert any(type(module).__name__ in FP32_ISLANDS for module in candidate.model.modules())
+    assert quality(reference, candidate) >= MIN_SI_SNR[PRECISION]
+
+@pytest.mark.parametrize('model_name', list(TASKS))
+def test_int8_matches_float32(random_weights, model_name):
+    reference = build(model_name, 'float32')
+    candidate = build(model_name, 'int8')
+    assert any(module._get_name().startswith('Dynamic') for module in candidate.model.modules())
+    assert quality(reference, candidate) >= MIN_SI_SNR['int8']
+
+def test_unvalidated_network_is_refused():
+    model = SpeechModel(Namespace(task='target_speaker_extraction', network='AV_MossFormer2_TSE_16K'))
+    model.model = nn.Linear(4, 4)
+    model.name = 'AV_MossFormer2_TSE_16K'
+    with pytest.raises(ValueError):
+        model.set_precision('float16')
+    model.set_precision('float16', validated_only=False)
+    assert model.precision == 'float16'
@@ -0,0 +1,44 @@
+from argparse import Namespace
+import pytest
+import torch
+import torch.nn as nn
+import model_registry
+from model_registry import ModelRegistry
+from networks import SpeechModel
+
+def fake_network_wrapper():
+    def build(task, model_name, precision='float32', backend='torch'):
+        model = SpeechModel(Namespace(task=task, network=model_name))
+        model.model = nn.Linear(4, 4)
+        model.name = model_name
+        return model
+    return build
+
+def test_get_moves_the_model_to_the_requested_device(monkeypatch):
+    monkeypatch.setattr(model_registry, 'network_wrapper', fake_network_wrapper)
+    registry = ModelRegistry()
+    # The meta device stands in for a device that SpeechModel would not pick by itself
+    model = registry.get('speech_enhancement', 'FRCRN_SE_16K', device='meta')
+    assert model.device == torch.device('meta')
+    assert next(model.model.parameters()).device == torch.device('meta')
+    assert registry.get('speech_enhancement', 'FRCRN_SE_16K', device='meta').device == torch.device('meta')
+    assert registry.hits == 1
+
+def test_forks_cannot_change_the_shared_weights(monkeypatch):
+    monkeypatch.setattr(model_registry, 'network_wrapper', fake_network_wrapper)
+    registry = ModelRegistry()
+    fork = registry.get('speech_enhancement', 'FRCRN_SE_16K', device='cpu')
+    with pytest.raises(ValueError):
+        fork.set_precision('int8')
+    with pytest.raises(ValueError):
+        fork.to_device('meta')
+    with pytest.raises(ValueError):
+        fork.compile_blocks()
+    # Per-copy arguments do not reach the cached entry
+    fork.args.decode_window = 2
+
+    cached = registry._models[('speech_enhancement', 'FRCRN_SE_16K', 'cpu', 'float32', 'torch')]
+    assert type(cached.model) is nn.Linear and cached.precision == 'float32' and not cached.compiled
+    assert next(cached.model.parameters()).device == torch.device('cpu')
+    assert not hasattr(cached.args, 'decode_window')
+    assert registry.get('speech_enhancement', 'FRCRN_SE_16K', device='cpu').precision == 'float32'
@@ -0,0 +1,41 @@
+import pytest
+import torch
+from models.mossformer2_se.fsmn import StreamingSession, UniDeepFsmn, UniDeepFsmn_dual
+from models.mossformer2_se.mossformer2_block import Gated_FSMN_Block, MossformerBlock, MossformerBlock_GFSMN
+
+def stream(module, inputs, chunk_frames):
+    session = StreamingSession(module)
+    outputs = [session.process(chunk) for chunk in torch.split(inputs, chunk_frames, dim=1)]
+    outputs.append(session.flush())
+    return torch.cat(outputs, dim=1)
+
+@pytest.mark.parametrize('chunk_frames', [1, 37, 300])
+@pytest.mark.parametrize('make_module', [
+    lambda: UniDeepFsmn(64, 64, 20, 64),
+    lambda: UniDeepFsmn_dual(64, 64, 20, 64),
+    lambda: Gated_FSMN_Block(64),
+])
+def test_fsmn_stream_matches_forward(make_module, chunk_frames):
+    torch.manual_seed(0)
+    module = make_module().eval()
+    inputs = torch.randn(2, 300, 64)
+    with torch.no_grad():
+        expected = module(inputs)
+    torch.testing.assert_close(stream(module, inputs, chunk_frames), expected, rtol=0, atol=1e-5)
+
+@pytest.mark.parametrize('chunk_frames', [1, 37, 300])
+@pytest.mark.parametrize('block_class', [MossformerBlock, MossformerBlock_GFSMN])
+def test_causal_block_stream_matches_forward(block_class, chunk_frames):
+    torch.manual_seed(0)
+    # Groups of 32 frames, so that the sequence spans complete and incomplete groups
+    block = block_class(dim=64, depth=2, group_size=32, query_key_dim=32, causal=True).eval()
+    inputs = torch.randn(2, 300, 64)
+    with torch.no_grad():
+        expected = block(inputs)
+    torch.testing.assert_close(stream(block, inputs, chunk_frames), expected, rtol=0, atol=1e-5)
+
+def test_non_causal_block_needs_opt_in():
+    block = MossformerBlock_GFSMN(dim=64, depth=1, group_size=32, query_key_dim=32).eval()
+    with pytest.raises(ValueError):
+        StreamingSession(block)
+    StreamingSession(block, approximate=True)
@@ -0,0 +1,51 @@
+from argparse import Namespace
+import numpy as np
+import pytest
+import torch
+from models.frcrn_se.frcrn import FRCRN_SE_16K
+from networks import SpeechModel
+from result_cache import ResultCache, set_result_cache
+
+@pytest.fixture
+def speech_model():
+    args = Namespace(task='speech_enhancement', network='FRCRN_SE_16K', sampling_rate=16000,
+                     one_time_decode_length=120, decode_window=1, win_type='hanning', win_len=640,
+                     win_inc=320, fft_len=640)
+    model = SpeechModel(args)
+    torch.manual_seed(0)
+    model.model = FRCRN_SE_16K(args).model.eval()
+    model.name = args.network
+    set_result_cache(False)
+    yield model
+    set_result_cache(None)
+
+def no_numpy(self):
+    raise AssertionError('the audio was copied to a numpy array')
+
+def test_process_tensor_stays_on_device(speech_model, monkeypatch):
+    audio = 0.1 * torch.randn(2, 8000)
+    prepared, scalars = speech_model.prepare_tensor(audio, 16000)
+    speech_model.data = {'audio': prepared, 'audio_len': 8000}
+    expected = speech_model.decode() * np.array([float(scalar) for scalar in scalars])[:, None]
+    monkeypatch.setattr(torch.Tensor, 'numpy', no_numpy)
+    output = speech_model.process_tensor(audio, 16000)
+    monkeypatch.undo()
+    assert isinstance(output, torch.Tensor) and output.device == speech_model.device
+    np.testing.assert_allclose(output.numpy(), expected, rtol=0, atol=1e-5)
+
+def test_process_tensors_stays_on_device(speech_model, monkeypatch):
+    audios = [0.1 * torch.randn(1, 8000), 0.1 * torch.randn(2, 6000)]
+    expected = [speech_model.process_tensor(audio, 16000) for audio in audios]
+    monkeypatch.setattr(torch.Tensor, 'numpy', no_numpy)
+    outputs = speech_model.process_tensors(audios, 16000)
+    for output, reference in zip(outputs, expected):
+        assert isinstance(output, torch.Tensor) and output.shape == reference.shape
+        torch.testing.assert_close(output, reference, rtol=0, atol=1e-4)
+
+def test_cached_output_is_a_tensor(speech_model):
+    set_result_cache(ResultCache())
+    audio = 0.1 * torch.randn(1, 8000)
+    first = speech_model.process_tensor(audio, 16000)
+    second = speech_model.process_tensor(audio, 16000)
+    assert isinstance(second, torch.Tensor)
+    torch.testing.assert_close(first, second)
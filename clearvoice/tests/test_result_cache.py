@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+import torch
+import result_cache
+from result_cache import ResultCache
+
+# Random samples do not compress, so every entry takes about 4 kB
+SAMPLES = 1000
+# Room for two entries
+MAX_SIZE_MB = 10000 / (1024 * 1024)
+
+def make_output(seed):
+    return np.random.default_rng(seed).standard_normal(SAMPLES).astype(np.float32)
+
+@pytest.fixture(params=['memory', 'disk'])
+def cache_dir(request, tmp_path):
+    return str(tmp_path) if request.param == 'disk' else None
+
+def test_round_trip(cache_dir):
+    cache = ResultCache(cache_dir, max_size_mb=0)
+    speakers = [make_output(1), torch.from_numpy(make_output(2))]
+    cache.put('single', make_output(0))
+    cache.put('speakers', speakers)
+    np.testing.assert_array_equal(cache.get('single'), make_output(0))
+    stored = cache.get('speakers')
+    assert isinstance(stored, list) and len(stored) == 2
+    for array, expected in zip(stored, speakers):
+        np.testing.assert_array_equal(array, np.asarray(expected))
+    assert cache.get('missing') is None
+    assert (cache.hits, cache.misses) == (2, 1)
+
+def test_least_recently_used_are_evicted(cache_dir):
+    cache = ResultCache(cache_dir, max_size_mb=MAX_SIZE_MB)
+    cache.put('a', make_output(0))
+    cache.put('b', make_output(1))
+    cache.get('a')
+    cache.put('c', make_output(2))
+    assert 'b' not in cache
+    np.testing.assert_array_equal(cache.get('a'), make_output(0))
+    np.testing.assert_array_equal(cache.get('c'), make_output(2))
+    if cache_dir is not None:
+        # The stored entries are indexed again, from the least to the most recently used
+        reopened = ResultCache(cache_dir, max_size_mb=MAX_SIZE_MB)
+        assert len(reopened) == 2
+        reopened.put('d', make_output(3))
+        assert 'a' not in reopened and 'c' in reopened
+
+def test_directory_has_a_default_budget(monkeypatch, tmp_path):
+    monkeypatch.setenv('CLEARVOICE_RESULT_CACHE_DIR', str(tmp_path))
+    monkeypatch.delenv('CLEARVOICE_RESULT_CACHE_MB', raising=False)
+    assert ResultCache().max_size_mb == result_cache.DEFAULT_SIZE_MB
+    monkeypatch.setenv('CLEARVOICE_RESULT_CACHE_MB', '0')
+    assert ResultCache().max_size_mb == 0
@@ -0,0 +1,45 @@
+import time
+import pytest
+import startup
+
+STAGES = [{'task': 'speech_enhancement', 'model_name': 'MossFormer2_SE_48K'}]
+
+class FakeRegistry:
+    def __init__(self):
+        self.loaded = set()
+        self.calls = []
+
+    def preload(self, stages, warmup=True, convert_checkpoints=False):
+        self.calls.append({'warmup': warmup, 'convert_checkpoints': convert_checkpoints})
+        self.loaded.update((stage['task'], stage['model_name']) for stage in stages)
+        return [dict(stage, load_seconds=2.0, warmup_seconds=0.5) for stage in stages]
+
+    def is_loaded(self, task, model_name, dtype='float32', backend='torch'):
+        return (task, model_name) in self.loaded
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = FakeRegistry()
+    monkeypatch.setattr(startup, 'get_model_registry', lambda: registry)
+    monkeypatch.setattr(startup, 'STARTUP_TIMINGS', {})
+    for name in ('CLEARVOICE_PRELOAD', 'CLEARVOICE_PRELOAD_PIPELINE', 'CLEARVOICE_WARMUP'):
+        monkeypatch.delenv(name, raising=False)
+    return registry
+
+@pytest.mark.parametrize('convert', ['0', '1'])
+def test_preload_reports_cold_start(registry, monkeypatch, convert):
+    monkeypatch.setenv('CLEARVOICE_CONVERT_CHECKPOINTS', convert)
+    assert not startup.is_warm_start(STAGES)
+    timings = startup.preload_models(STAGES, time.perf_counter(), 1.0)
+    assert registry.calls == [{'warmup': True, 'convert_checkpoints': convert == '1'}]
+    assert timings['import_seconds'] == 1.0
+    assert (timings['load_seconds'], timings['warmup_seconds']) == (2.0, 0.5)
+    assert startup.is_warm_start(STAGES)
+    job = startup.job_timings(startup.is_warm_start(STAGES), time.perf_counter())
+    assert job['warm_start'] and job['cold_start'] is timings
+
+def test_preload_can_be_disabled(registry, monkeypatch):
+    monkeypatch.setenv('CLEARVOICE_PRELOAD', '0')
+    timings = startup.preload_models(STAGES, time.perf_counter(), 1.0)
+    assert not registry.calls and 'load_seconds' not in timings
+    assert not startup.is_warm_start(STAGES)
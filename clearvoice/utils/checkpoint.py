@@ -0,0 +1,93 @@
+#!/usr/bin/env python -u
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import os
+import torch
+
+try:
+    from safetensors import safe_open
+    from safetensors.torch import save_file
+except ImportError:
+    # Fast checkpoints are optional, the pickled checkpoints are loaded without them
+    safe_open = None
+    save_file = None
+
+# Suffix of the fast-loading copy of a checkpoint
+FAST_CHECKPOINT_SUFFIX = '.safetensors'
+
+def fast_checkpoint_path(checkpoint_path, model_key=None):
+    """Returns the path of the fast-loading copy of a checkpoint, next to the checkpoint.
+    The key of the weights in the checkpoint is part of the name, because one checkpoint
+    may hold the weights of several modules."""
+    if model_key:
+        return f'{checkpoint_path}.{model_key}{FAST_CHECKPOINT_SUFFIX}'
+    return checkpoint_path + FAST_CHECKPOINT_SUFFIX
+
+def _source_stamp(checkpoint_path):
+    """Returns the size and modification time of a checkpoint, stored with its fast copy
+    so that a replaced checkpoint is not shadowed by an outdated copy."""
+    stat = os.stat(checkpoint_path)
+    return {'source_size': str(stat.st_size), 'source_mtime_ns': str(stat.st_mtime_ns)}
+
+def save_fast_checkpoint(module, checkpoint_path, model_key=None):
+    """Writes the weights of a loaded module as a fast-loading copy of its checkpoint.
+
+    The weights are stored under the keys of module.state_dict(), i.e. after the key
+    remapping of SpeechModel._load_model, so loading them is a plain copy per tensor.
+
+    Args:
+        module (nn.Module): The module holding the weights loaded from the checkpoint.
+        checkpoint_path (str): The checkpoint the weights were loaded from.
+        model_key (str, optional): The key of the weights in the checkpoint.
+
+    Returns:
+        str: The path of the fast-loading copy.
+    """
+    if save_file is None:
+        raise ImportError('Converting checkpoints requires the safetensors package (pip install safetensors)')
+    # Copies to the CPU without shared storage, which safetensors does not store
+    state = {key: value.detach().cpu().clone().contiguous() for key, value in module.state_dict().items()}
+    path = fast_checkpoint_path(checkpoint_path, model_key)
+    temp_path = path + '.tmp'
+    save_file(state, temp_path, metadata=_source_stamp(checkpoint_path))
+    os.replace(temp_path, path)
+    return path
+
+def load_fast_checkpoint(module, checkpoint_path, model_key=None):
+    """Loads the weights of a module from the fast-loading copy of its checkpoint, if there
+    is an up-to-date copy that matches the module.
+
+    The copy is memory-mapped and every tensor is copied straight into the parameter or
+    buffer of the module, one at a time, so the checkpoint is never unpickled and never
+    held in memory as a whole.
+
+    Args:
+        module (nn.Module): The module to load the weights into.
+        checkpoint_path (str): The checkpoint the copy was made from.
+        model_key (str, optional): The key of the weights in the checkpoint.
+
+    Returns:
+        bool: True if the weights were loaded, False if the slow path has to be used.
+    """
+    path = fast_checkpoint_path(checkpoint_path, model_key)
+    if safe_open is None or not os.path.isfile(path):
+        return False
+    state = module.state_dict()  # References to the parameters and buffers, no copies
+    with safe_open(path, framework='pt') as f:
+        metadata = f.metadata() or {}
+        if os.path.isfile(checkpoint_path) and any(metadata.get(k) != v for k, v in _source_stamp(checkpoint_path).items()):
+            return False  # The checkpoint changed since the conversion
+        keys = set(f.keys())
+        if keys != set(state.keys()):
+            return False
+        # Check all shapes before copying, so that a mismatch never leaves a half-loaded module
+        for key in keys:
+            if tuple(f.get_slice(key).get_shape()) != tuple(state[key].shape):
+                return False
+        with torch.no_grad():
+            for key in keys:
+                state[key].copy_(f.get_tensor(key))
+    return True
@@ -0,0 +1,88 @@
+#!/usr/bin/env python -u
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import os
+import threading
+import torch
+
+# Classes whose forward passes are compiled: the MossFormer2 block stacks of the SE, SS and
+# SR models, 24 layers of FLASH_ShareA_FFConvM and Gated_FSMN_Block_Dilated that otherwise
+# run as many small eager ops (rearranges, einsums, ReLU² attention, sigmoid gates, pads)
+COMPILE_CLASSES = ('MossformerBlock_GFSMN',)
+# Default directory of the compilation caches
+DEFAULT_COMPILE_CACHE_DIR = os.path.join('checkpoints', 'compile_cache')
+# File holding the portable compilation artifacts in the cache directory
+COMPILE_ARTIFACTS = 'artifacts.bin'
+
+_cache_lock = threading.Lock()
+_cache_loaded = False
+
+def compile_cache_dir():
+    """Returns the directory of the compilation caches, the value of the
+    CLEARVOICE_COMPILE_CACHE_DIR environment variable or DEFAULT_COMPILE_CACHE_DIR."""
+    return os.environ.get('CLEARVOICE_COMPILE_CACHE_DIR') or DEFAULT_COMPILE_CACHE_DIR
+
+def load_compile_cache():
+    """Points the Inductor caches at the cache directory and loads the compilation artifacts
+    saved by an earlier process, so that a worker does not recompile at cold start. Only the
+    first call in a process has an effect."""
+    global _cache_loaded
+    with _cache_lock:
+        if _cache_loaded:
+            return
+        _cache_loaded = True
+        cache_dir = compile_cache_dir()
+        os.makedirs(cache_dir, exist_ok=True)
+        # Inductor's FX graph and autotuning caches, read when the environment is first used
+        os.environ.setdefault('TORCHINDUCTOR_CACHE_DIR', os.path.abspath(cache_dir))
+        path = os.path.join(cache_dir, COMPILE_ARTIFACTS)
+        # Portable artifacts of all compiled graphs (torch >= 2.6), independent of the Inductor cache layout
+        if hasattr(torch.compiler, 'load_cache_artifacts') and os.path.isfile(path):
+            with open(path, 'rb') as f:
+                torch.compiler.load_cache_artifacts(f.read())
+
+def save_compile_cache():
+    """Saves the compilation artifacts of this process to the cache directory, e.g. after
+    the warmup compiled the models."""
+    if not hasattr(torch.compiler, 'save_cache_artifacts'):
+        return  # Older torch versions only use the Inductor cache directory
+    artifacts = torch.compiler.save_cache_artifacts()
+    if artifacts is None:
+        return
+    path = os.path.join(compile_cache_dir(), COMPILE_ARTIFACTS)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(artifacts[0])
+    os.replace(temp_path, path)
+
+def compile_blocks(model, mode=None):
+    """Compiles the forward passes of the COMPILE_CLASSES modules in a model with
+    torch.compile. The modules are compiled on their first call, so the warmup or first
+    request pays for the compilation, or loads it from the cache (see load_compile_cache).
+
+    The time axis is compiled as dynamic, so one graph serves the decode_window segments,
+    the one-pass inputs of any length and the batches of the GPU executor without
+    recompiling per length.
+
+    Args:
+        model (nn.Module): The model, or an nn.ModuleList of models.
+        mode (str, optional): The torch.compile mode. If None, the value of the
+                              CLEARVOICE_COMPILE_MODE environment variable is used
+                              ('default' if unset).
+
+    Returns:
+        int: The number of compiled modules.
+    """
+    if mode is None:
+        mode = os.environ.get('CLEARVOICE_COMPILE_MODE', 'default')
+    load_compile_cache()
+    count = 0
+    for module in model.modules():
+        if type(module).__name__ in COMPILE_CLASSES:
+            # On the instance, the weights and the state dict keys of the module are unchanged
+            module.forward = torch.compile(module.forward, mode=mode, dynamic=True)
+            count += 1
+    return count
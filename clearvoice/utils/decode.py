@@ -7,19 +7,24 @@ from __future__ import division
 from __future__ import print_function
 import torch 
 import torch.nn as nn
+import torch.nn.functional as F
 import numpy as np
 import os 
 import sys
 import librosa
 import torchaudio
-from utils.misc import power_compress, power_uncompress, stft, istft, compute_fbank
+from utils.misc import power_compress, power_uncompress, stft, istft
+from utils.frontend import fbank_config, fbank_with_deltas
 from utils.bandwidth_sub import bandwidth_sub
+from utils.segmenter import to_tensor, get_decode_batch_size, get_stitch_mode, segmented_decode
 from dataloader.meldataset import mel_spectrogram
 
 # Constant for normalizing audio values
 MAX_WAV_VALUE = 32768.0
+# Networks that support long-form decoding, see window_decoder
+LONG_FORM_NETWORKS = ('FRCRN_SE_16K', 'MossFormerGAN_SE_16K', 'MossFormer2_SE_48K', 'MossFormer2_SS_16K')
 
-def decode_one_audio(model, device, inputs, args):
+def decode_one_audio(model, device, inputs, args, as_tensor=False):
     """Decodes audio using the specified model based on the provided network type.
 
     This function selects the appropriate decoding function based on the specified
@@ -28,227 +33,293 @@ def decode_one_audio(model, device, inputs, args):
     Args:
         model (nn.Module): The trained model used for decoding.
         device (torch.device): The device (CPU or GPU) to perform computations on.
-        inputs (torch.Tensor): Input audio tensor.
+        inputs (numpy.ndarray or torch.Tensor): Input audio of shape (C, T). All C channels
+                              are decoded together as one batch.
         args (Namespace): Contains arguments for network configuration.
+        as_tensor (bool): If True, the outputs are returned as float32 tensors on the device
+                          instead of numpy arrays, see to_output.
 
     Returns:
-        list: A list of decoded audio outputs for each speaker.
+        numpy.ndarray: The decoded audio of shape (C, T'), or for speech separation a list
+                       with one such array per speaker.
     """
     # Select decoding function based on the network type specified in args
     if args.network == 'FRCRN_SE_16K':
-        return decode_one_audio_frcrn_se_16k(model, device, inputs, args)
+        return decode_one_audio_frcrn_se_16k(model, device, inputs, args, as_tensor)
     elif args.network == 'MossFormer2_SE_48K':
-        return decode_one_audio_mossformer2_se_48k(model, device, inputs, args)
+        return decode_one_audio_mossformer2_se_48k(model, device, inputs, args, as_tensor)
     elif args.network == 'MossFormerGAN_SE_16K':
-        return decode_one_audio_mossformergan_se_16k(model, device, inputs, args)
+        return decode_one_audio_mossformergan_se_16k(model, device, inputs, args, as_tensor)
     elif args.network == 'MossFormer2_SS_16K':
-        return decode_one_audio_mossformer2_ss_16k(model, device, inputs, args)
+        return decode_one_audio_mossformer2_ss_16k(model, device, inputs, args, as_tensor)
     elif args.network == 'MossFormer2_SR_48K':
-        return decode_one_audio_mossformer2_sr_48k(model, device, inputs, args)
+        return decode_one_audio_mossformer2_sr_48k(model, device, inputs, args, as_tensor)
     else:
         print("No network found!")  # Print error message if no valid network is specified
         return 
 
-def decode_one_audio_mossformer2_ss_16k(model, device, inputs, args):
+def to_output(outputs, as_tensor, device=None):
+    """Converts the decoded audio to the output type of the decoders: a numpy array on the
+    host, or if as_tensor a float32 tensor on the device, so that the next model of a
+    pipeline can take it without copying it to the host and back. Host arrays (e.g. from
+    the bandwidth substitution) are moved to the device in that case.
+    """
+    if isinstance(outputs, np.ndarray):
+        return torch.from_numpy(np.asarray(outputs, dtype=np.float32)).to(device) if as_tensor else outputs
+    outputs = outputs.detach()
+    return outputs.float() if as_tensor else outputs.cpu().numpy()
+
+def separate(model, inputs, args):
+    """Runs the MossFormer2 speech separation model on a batch of windows. If
+    args.layer_schedule is set, only the MossFormer2 layers it lists are evaluated
+    (see layer_schedule.py).
+
+    Returns:
+        list: The separated audio of each speaker, each of shape (B, T).
+    """
+    layers = getattr(args, 'layer_schedule', None)
+    if layers is None:
+        return model(inputs)
+    return model(inputs, layers=layers)
+
+def window_decoder(model, device, args, mean_square):
+    """Returns the function that decodes a batch of windows in segmented decoding, for
+    long-form decoding where the whole input is never held in memory. Input-dependent
+    normalizations use the statistics of the whole input computed beforehand.
+
+    Args:
+        model (nn.Module): The trained model used for decoding.
+        device (torch.device): The device (CPU or GPU) to perform computations on.
+        args (Namespace): Contains arguments for network configuration.
+        mean_square (float): The mean power of the whole input.
+
+    Returns:
+        callable: Maps a [B, window] tensor to a [B, window] tensor, or to a
+                  [B, num_spks, window] tensor for speech separation.
+    """
+    if args.network == 'FRCRN_SE_16K':
+        return lambda x: model.inference(x, keep_batch=True)
+    elif args.network == 'MossFormerGAN_SE_16K':
+        # Same as sqrt(T / sum(x ** 2)) over the whole input
+        norm_factor = torch.tensor([1.0 / (mean_square ** 0.5)], dtype=torch.float32, device=device)
+        return lambda x: _decode_one_audio_mossformergan_se_16k(model, device, x, norm_factor, args)
+    elif args.network == 'MossFormer2_SE_48K':
+        return lambda x: _decode_one_audio_mossformer2_se_48k(model, x * MAX_WAV_VALUE, args) / MAX_WAV_VALUE
+    elif args.network == 'MossFormer2_SS_16K':
+        return lambda x: torch.stack(separate(model, x, args)[:args.num_spks], dim=1)
+    raise ValueError(f'Long-form decoding is not supported for {args.network}')
+
+def batch_length(length, args):
+    """Returns the length that an audio of the given length is decoded with in one pass by
+    decode_one_audio. FRCRN and MossFormer2 SS pad shorter audios to one decoding window,
+    the other networks decode audios at their own length.
+
+    The layers of the models see the padding (e.g. FRCRN's squeeze-and-excitation pooling,
+    the FLASH attention and the FSMN memory), so only audios with the same batch length
+    can be decoded together without changing their outputs.
+    """
+    if args.network in ('FRCRN_SE_16K', 'MossFormer2_SS_16K'):
+        return max(length, int(args.sampling_rate * args.decode_window))
+    return length
+
+def decode_batch_audio(model, device, inputs, lengths, args, as_tensor=False):
+    """Decodes a batch of short audios with a single forward pass.
+
+    All audios must have the same batch_length, so that each output is the same as
+    when the audio is decoded on its own. Input-dependent normalizations (MossFormerGAN's
+    norm factor, MossFormer2 SS's RMS matching and MossFormer2 SR's bandwidth substitution)
+    are computed per audio over its own length. Inputs are expected to be short enough
+    for one-pass decoding.
+
+    Args:
+        model (nn.Module): The trained model used for decoding.
+        device (torch.device): The device (CPU or GPU) to perform computations on.
+        inputs (numpy.ndarray or torch.Tensor): Input audio of shape (B, T), zero-padded to the longest length.
+        lengths (list of int): The unpadded length of each audio in the batch.
+        args (Namespace): Contains arguments for network configuration.
+        as_tensor (bool): If True, the outputs are float32 tensors on the device, see to_output.
+
+    Returns:
+        list: One output per audio, a numpy.ndarray of its length or, for speech
+              separation, a list of such arrays for each speaker.
+    """
+    if len({batch_length(length, args) for length in lengths}) > 1:
+        raise ValueError('Audios of different batch lengths cannot be decoded together')
+    inputs = to_tensor(inputs, device)  # Convert inputs to a PyTorch tensor on the specified device
+    b, t = inputs.shape
+    window = int(args.sampling_rate * args.decode_window)  # Decoding window length
+
+    if args.network == 'FRCRN_SE_16K':
+        if t < window:
+            inputs = F.pad(inputs, (0, window - t))
+        outputs = model.inference(inputs, keep_batch=True)
+    elif args.network == 'MossFormerGAN_SE_16K':
+        # Compute the normalization factor of each audio over its own length
+        lengths_t = torch.tensor(lengths, dtype=torch.float32, device=device)
+        norm_factor = torch.sqrt(lengths_t / torch.sum((inputs ** 2.0), dim=-1))
+        outputs = _decode_one_audio_mossformergan_se_16k(model, device, inputs, norm_factor, args)
+    elif args.network == 'MossFormer2_SE_48K':
+        outputs = _decode_one_audio_mossformer2_se_48k(model, inputs * MAX_WAV_VALUE, args) / MAX_WAV_VALUE
+    elif args.network == 'MossFormer2_SR_48K':
+        outputs = _decode_one_audio_mossformer2_sr_48k(model, inputs, args)
+    elif args.network == 'MossFormer2_SS_16K':
+        if t < window:
+            inputs = F.pad(inputs, (0, window - t))
+        outputs = torch.stack(separate(model, inputs, args)[:args.num_spks], dim=1)  # [B, num_spks, T]
+    else:
+        raise ValueError(f'Batched decoding is not supported for {args.network}')
+
+    outputs = outputs.detach()
+    if not as_tensor or args.network == 'MossFormer2_SR_48K':
+        # Single device synchronization for the batch; the bandwidth substitution runs on the host
+        outputs = outputs.cpu().numpy()
+        inputs = inputs.cpu().numpy()
+    results = []
+    for i, length in enumerate(lengths):
+        output = outputs[i, ..., :length]
+        if args.network == 'MossFormer2_SR_48K':
+            output = bandwidth_sub(inputs[i, :length], output)
+        elif args.network == 'MossFormer2_SS_16K':
+            # Normalize the outputs back to the input magnitude for each speaker
+            rms_input = (inputs[i, :length] ** 2).mean() ** 0.5
+            output = [to_output(output[spk] / (output[spk] ** 2).mean() ** 0.5 * rms_input, as_tensor, device)
+                      for spk in range(args.num_spks)]
+        if not isinstance(output, list):
+            output = to_output(output, as_tensor, device)
+        results.append(output)
+    return results
+
+def decode_one_audio_mossformer2_ss_16k(model, device, inputs, args, as_tensor=False):
     """Decodes audio using the MossFormer2 model for speech separation at 16kHz.
 
     This function handles the audio decoding process by processing the input tensor
     in segments, if necessary, and applies the model to obtain separated audio outputs.
+    Segments are decoded in micro-batches of args.decode_batch_size windows.
 
     Args:
         model (nn.Module): The trained MossFormer2 model for decoding.
         device (torch.device): The device (CPU or GPU) to perform computations on.
-        inputs (torch.Tensor): Input audio tensor of shape (B, T), where B is the batch size
-                              and T is the number of time steps.
+        inputs (numpy.ndarray or torch.Tensor): Input audio of shape (C, T), where C is the number
+                              of channels and T is the number of time steps.
         args (Namespace): Contains arguments for decoding configuration.
+        as_tensor (bool): If True, returns float32 tensors on the device, see to_output.
 
     Returns:
-        list: A list of decoded audio outputs for each speaker.
+        list: A list of decoded audio outputs of shape (C, T) for each speaker.
     """
-    out = []  # Initialize the list to store outputs
     decode_do_segment = False  # Flag to determine if segmentation is needed
     window = int(args.sampling_rate * args.decode_window)  # Decoding window length
     stride = int(window * 0.75)  # Decoding stride if segmentation is used
-    b, t = inputs.shape  # Get batch size and input length
+    inputs = to_tensor(inputs, device)  # Convert inputs to torch tensor and move to device
+    c, t = inputs.shape  # Get number of channels and input length
 
-    rms_input = (inputs ** 2).mean() ** 0.5
+    rms_input = (inputs ** 2).mean(dim=-1) ** 0.5  # [C]
 
     # Check if input length exceeds one-time decode length to decide on segmentation
     if t > args.sampling_rate * args.one_time_decode_length:
         decode_do_segment = True  # Enable segment decoding for long sequences
 
-    # Pad the inputs to ensure they meet the decoding window length requirements
-    if t < window:
-        inputs = np.concatenate([inputs, np.zeros((inputs.shape[0], window - t))], axis=1)
-    elif t < window + stride:
-        padding = window + stride - t
-        inputs = np.concatenate([inputs, np.zeros((inputs.shape[0], padding))], axis=1)
-    else:
-        if (t - window) % stride != 0:
-            padding = t - (t - window) // stride * stride
-            inputs = np.concatenate([inputs, np.zeros((inputs.shape[0], padding))], axis=1)
-
-    inputs = torch.from_numpy(np.float32(inputs)).to(device)  # Convert inputs to torch tensor and move to device
-    b, t = inputs.shape  # Update batch size and input length after conversion
-
     # Process the inputs in segments if necessary
     if decode_do_segment:
-        outputs = np.zeros((args.num_spks, t))  # Initialize output array for each speaker
-        give_up_length = (window - stride) // 2  # Calculate length to give up at each segment
-        current_idx = 0  # Initialize current index for segmentation
-        while current_idx + window <= t:
-            tmp_input = inputs[:, current_idx:current_idx + window]  # Get segment input
-            tmp_out_list = model(tmp_input)  # Forward pass through the model
-            for spk in range(args.num_spks):
-                # Convert output for the current speaker to numpy
-                tmp_out_list[spk] = tmp_out_list[spk][0, :].detach().cpu().numpy()
-                if current_idx == 0:
-                    # For the first segment, use the whole segment minus the give-up length
-                    outputs[spk, current_idx:current_idx + window - give_up_length] = tmp_out_list[spk][:-give_up_length]
-                else:
-                    # For subsequent segments, account for the give-up length at both ends
-                    outputs[spk, current_idx + give_up_length:current_idx + window - give_up_length] = tmp_out_list[spk][give_up_length:-give_up_length]
-            current_idx += stride  # Move to the next segment
-        for spk in range(args.num_spks):
-            out.append(outputs[spk, :])  # Append outputs for each speaker
+        # Stack the speaker outputs of each window into [B, num_spks, window]
+        decode_fn = lambda x: torch.stack(separate(model, x, args)[:args.num_spks], dim=1)
+        outputs = segmented_decode(decode_fn, inputs, window, stride, get_decode_batch_size(args), get_stitch_mode(args))
     else:
-        # If no segmentation is required, process the entire input
-        out_list = model(inputs)
-        for spk in range(args.num_spks):
-            out.append(out_list[spk][0, :].detach().cpu().numpy())  # Append output for each speaker
-
-    # Normalize the outputs back to the input magnitude for each speaker
-    for spk in range(args.num_spks):
-        rms_out = (out[spk] ** 2).mean() ** 0.5
-        out[spk] = out[spk] / rms_out * rms_input
-    return out  # Return the list of normalized outputs
-
-def decode_one_audio_frcrn_se_16k(model, device, inputs, args):
+        # If no segmentation is required, process the entire input (padded to at least one window)
+        if t < window:
+            inputs = F.pad(inputs, (0, window - t))
+        out_list = separate(model, inputs, args)
+        outputs = torch.stack([out_list[spk][:, :t] for spk in range(args.num_spks)], dim=1)  # [C, num_spks, T]
+
+    # Normalize the outputs back to the input magnitude for each channel and speaker
+    rms_out = (outputs ** 2).mean(dim=-1, keepdim=True) ** 0.5
+    outputs = to_output(outputs / rms_out * rms_input[:, None, None], as_tensor)
+    return [outputs[:, spk, :] for spk in range(args.num_spks)]  # Views of the [C, num_spks, T] output
+
+def decode_one_audio_frcrn_se_16k(model, device, inputs, args, as_tensor=False):
     """Decodes audio using the FRCRN model for speech enhancement at 16kHz.
 
     This function processes the input audio tensor either in segments or as a whole, 
     depending on the length of the input. The model's inference method is applied 
-    to obtain the enhanced audio output.
+    to obtain the enhanced audio output. Segments are decoded in micro-batches of
+    args.decode_batch_size windows.
 
     Args:
         model (nn.Module): The trained FRCRN model used for decoding.
         device (torch.device): The device (CPU or GPU) to perform computations on.
-        inputs (torch.Tensor): Input audio tensor of shape (B, T), where B is the batch size
-                              and T is the number of time steps.
+        inputs (numpy.ndarray or torch.Tensor): Input audio of shape (C, T), where C is the number
+                              of channels and T is the number of time steps.
         args (Namespace): Contains arguments for decoding configuration.
+        as_tensor (bool): If True, returns a float32 tensor on the device, see to_output.
 
     Returns:
-        numpy.ndarray: The decoded audio output, which has been enhanced by the model.
+        numpy.ndarray: The decoded audio output of shape (C, T), which has been enhanced by the model.
     """
     decode_do_segment = False  # Flag to determine if segmentation is needed
 
     window = int(args.sampling_rate * args.decode_window)  # Decoding window length
     stride = int(window * 0.75)  # Decoding stride for segmenting the input
-    b, t = inputs.shape  # Get batch size (b) and input length (t)
+    inputs = to_tensor(inputs, device)  # Convert inputs to a PyTorch tensor on the specified device
+    c, t = inputs.shape  # Get number of channels (c) and input length (t)
 
     # Check if input length exceeds one-time decode length to decide on segmentation
     if t > args.sampling_rate * args.one_time_decode_length:
         decode_do_segment = True  # Enable segment decoding for long sequences
 
-    # Pad the inputs to meet the decoding window length requirements
-    if t < window:
-        # Pad with zeros if the input length is less than the window size
-        inputs = np.concatenate([inputs, np.zeros((inputs.shape[0], window - t))], axis=1)
-    elif t < window + stride:
-        # Pad the input if its length is less than the window plus stride
-        padding = window + stride - t
-        inputs = np.concatenate([inputs, np.zeros((inputs.shape[0], padding))], axis=1)
-    else:
-        # Ensure the input length is a multiple of the stride
-        if (t - window) % stride != 0:
-            padding = t - (t - window) // stride * stride
-            inputs = np.concatenate([inputs, np.zeros((inputs.shape[0], padding))], axis=1)
-
-    # Convert inputs to a PyTorch tensor and move to the specified device
-    inputs = torch.from_numpy(np.float32(inputs)).to(device)
-    b, t = inputs.shape  # Update batch size and input length after conversion
-
     # Process the inputs in segments if necessary
     if decode_do_segment:
-        outputs = np.zeros(t)  # Initialize the output array
-        give_up_length = (window - stride) // 2  # Calculate length to give up at each segment
-        current_idx = 0  # Initialize current index for segmentation
-
-        while current_idx + window <= t:
-            tmp_input = inputs[:, current_idx:current_idx + window]  # Get segment input
-            tmp_output = model.inference(tmp_input).detach().cpu().numpy()  # Inference on segment
-
-            # For the first segment, use the whole segment minus the give-up length
-            if current_idx == 0:
-                outputs[current_idx:current_idx + window - give_up_length] = tmp_output[:-give_up_length]
-            else:
-                # For subsequent segments, account for the give-up length
-                outputs[current_idx + give_up_length:current_idx + window - give_up_length] = tmp_output[give_up_length:-give_up_length]
-
-            current_idx += stride  # Move to the next segment
+        decode_fn = lambda x: model.inference(x, keep_batch=True)
+        outputs = segmented_decode(decode_fn, inputs, window, stride, get_decode_batch_size(args), get_stitch_mode(args))
     else:
-        # If no segmentation is required, process the entire input
-        outputs = model.inference(inputs).detach().cpu().numpy()  # Inference on full input
+        # If no segmentation is required, process the entire input (padded to at least one window)
+        if t < window:
+            inputs = F.pad(inputs, (0, window - t))
+        outputs = model.inference(inputs, keep_batch=True)  # Inference on full input, all channels at once
 
-    return outputs  # Return the decoded audio output
+    return to_output(outputs, as_tensor)  # Return the decoded audio output
 
-def decode_one_audio_mossformergan_se_16k(model, device, inputs, args):
+def decode_one_audio_mossformergan_se_16k(model, device, inputs, args, as_tensor=False):
     """Decodes audio using the MossFormerGAN model for speech enhancement at 16kHz.
 
     This function processes the input audio tensor either in segments or as a whole, 
     depending on the length of the input. The `_decode_one_audio_mossformergan_se_16k` 
     function is called to perform the model inference and return the enhanced audio output.
+    Segments are decoded in micro-batches of args.decode_batch_size windows.
 
     Args:
         model (nn.Module): The trained MossFormerGAN model used for decoding.
         device (torch.device): The device (CPU or GPU) for computation.
-        inputs (torch.Tensor): Input audio tensor of shape (B, T), where B is the batch size 
-                              and T is the number of time steps.
+        inputs (numpy.ndarray or torch.Tensor): Input audio of shape (C, T), where C is the number
+                              of channels and T is the number of time steps.
         args (Namespace): Contains arguments for decoding configuration.
+        as_tensor (bool): If True, returns a float32 tensor on the device, see to_output.
 
     Returns:
-        numpy.ndarray: The decoded audio output, which has been enhanced by the model.
+        numpy.ndarray: The decoded audio output of shape (C, T), which has been enhanced by the model.
     """
     decode_do_segment = False  # Flag to determine if segmentation is needed
     window = int(args.sampling_rate * args.decode_window)  # Decoding window length
     stride = int(window * 0.75)  # Decoding stride for segmenting the input
-    b, t = inputs.shape  # Get batch size (b) and input length (t)
+    inputs = to_tensor(inputs, device)  # Convert inputs to a PyTorch tensor on the specified device
+    c, t = inputs.shape  # Get number of channels (c) and input length (t)
 
     # Check if input length exceeds one-time decode length to decide on segmentation
     if t > args.sampling_rate * args.one_time_decode_length:
         decode_do_segment = True  # Enable segment decoding for long sequences
 
-    # Convert inputs to a PyTorch tensor and move to the specified device
-    inputs = torch.from_numpy(np.float32(inputs)).to(device)
-
-    # Compute normalization factor based on the input
-    norm_factor = torch.sqrt(inputs.size(-1) / torch.sum((inputs ** 2.0), dim=-1))
-
-    b, t = inputs.shape  # Update batch size and input length after conversion
+    # Compute normalization factor of each channel based on the input
+    norm_factor = torch.sqrt(inputs.size(-1) / torch.sum((inputs ** 2.0), dim=-1))  # [C]
 
     # Process the inputs in segments if necessary
     if decode_do_segment:
-        outputs = np.zeros(t)  # Initialize the output array
-        give_up_length = (window - stride) // 2  # Calculate length to give up at each segment
-        current_idx = 0  # Initialize current index for segmentation
-
-        while current_idx + window <= t:
-            tmp_input = inputs[:, current_idx:current_idx + window]  # Get segment input
-            tmp_output = _decode_one_audio_mossformergan_se_16k(model, device, tmp_input, norm_factor, args)  # Inference on segment
-
-            # For the first segment, use the whole segment minus the give-up length
-            if current_idx == 0:
-                outputs[current_idx:current_idx + window - give_up_length] = tmp_output[:-give_up_length]
-            else:
-                # For subsequent segments, account for the give-up length
-                outputs[current_idx + give_up_length:current_idx + window - give_up_length] = tmp_output[give_up_length:-give_up_length]
-
-            current_idx += stride  # Move to the next segment
-
-        return outputs  # Return the accumulated outputs from segments
+        # The windows of each forward pass are ordered channel by channel
+        decode_fn = lambda x: _decode_one_audio_mossformergan_se_16k(model, device, x, norm_factor.repeat_interleave(x.shape[0] // c), args)
+        outputs = segmented_decode(decode_fn, inputs, window, stride, get_decode_batch_size(args), get_stitch_mode(args))
     else:
         # If no segmentation is required, process the entire input
-        return _decode_one_audio_mossformergan_se_16k(model, device, inputs, norm_factor, args)  # Inference on full input
+        outputs = _decode_one_audio_mossformergan_se_16k(model, device, inputs, norm_factor, args)
+
+    return to_output(outputs, as_tensor)  # Return the enhanced audio
 
 @torch.no_grad()
 def _decode_one_audio_mossformergan_se_16k(model, device, inputs, norm_factor, args):
@@ -270,7 +341,7 @@ def _decode_one_audio_mossformergan_se_16k(model, device, inputs, norm_factor, a
         args (Namespace): Contains arguments for STFT parameters and normalization.
 
     Returns:
-        numpy.ndarray: The decoded audio output, which has been enhanced by the model.
+        torch.Tensor: The decoded audio output of shape (B, T), which has been enhanced by the model.
     """
     input_len = inputs.size(-1)  # Get the length of the input audio
     nframe = int(np.ceil(input_len / args.win_inc))  # Calculate the number of frames based on window increment
@@ -301,18 +372,47 @@ def _decode_one_audio_mossformergan_se_16k(model, device, inputs, norm_factor, a
     # Perform Inverse STFT (iSTFT) to convert back to time domain audio
     outputs = istft(pred_spec_uncompress, args, center=True, periodic=True, onesided=True)
 
-    # Normalize the output audio by dividing by the normalization factor
-    outputs = outputs.squeeze(0) / norm_factor
+    # Normalize the output audio by dividing by the (per-row) normalization factor
+    outputs = outputs / norm_factor.unsqueeze(-1)
 
-    return outputs[:input_len].detach().cpu().numpy()  # Return the output as a numpy array
+    return outputs[..., :input_len]  # Return the output cropped to the input length
 
-def decode_one_audio_mossformer2_se_48k(model, device, inputs, args):
+def _decode_one_audio_mossformer2_se_48k(model, inputs, args):
+    """Runs a batch of equally long audio windows through the MossFormer2 model for
+    speech enhancement at 48kHz.
+
+    Args:
+        model (nn.Module): The trained MossFormer2 model used for decoding.
+        inputs (torch.Tensor): Input audio tensor of shape (B, T), scaled to the maximum WAV value.
+        args (Namespace): Contains arguments for the FFT and filter bank parameters.
+
+    Returns:
+        torch.Tensor: The enhanced audio of shape (B, T), scaled to the maximum WAV value.
+    """
+    # Compute filter banks and their first- and second-order deltas for all windows at once
+    fbanks = fbank_with_deltas(inputs, fbank_config(args))  # [B, frames, 3 * num_mels]
+
+    # Pass filter banks through the model
+    Out_List = model(fbanks)
+    pred_mask = Out_List[-1]  # Get the predicted mask, [B, frames, F]
+
+    # Apply the mask to the spectrum of the audio
+    spectrum = stft(inputs, args)  # [B, F, frames, 2]
+    pred_mask = pred_mask.permute(0, 2, 1).unsqueeze(-1)  # [B, F, frames, 1]
+    masked_spec = spectrum * pred_mask
+    masked_spec_complex = torch.complex(masked_spec[..., 0], masked_spec[..., 1])  # Convert to complex form
+
+    # Reconstruct audio from the masked spectrogram
+    return istft(masked_spec_complex, args, inputs.shape[-1])
+
+def decode_one_audio_mossformer2_se_48k(model, device, inputs, args, as_tensor=False):
     """Processes audio inputs through the MossFormer2 model for speech enhancement at 48kHz.
 
     This function decodes audio input using the following steps:
     1. Normalizes the audio input to a maximum WAV value.
     2. Checks the length of the input to decide between online decoding and batch processing.
-    3. For longer inputs, processes the audio in segments using a sliding window.
+    3. For longer inputs, processes the audio in segments using a sliding window,
+       args.decode_batch_size windows per forward pass.
     4. Computes filter banks and their deltas for the audio segment.
     5. Passes the filter banks through the model to get a predicted mask.
     6. Applies the mask to the spectrogram of the audio segment and reconstructs the audio.
@@ -321,116 +421,28 @@ def decode_one_audio_mossformer2_se_48k(model, device, inputs, args):
     Args:
         model (nn.Module): The trained MossFormer2 model used for decoding.
         device (torch.device): The device (CPU or GPU) for computation.
-        inputs (torch.Tensor): Input audio tensor of shape (B, T), where B is the batch size and T is the number of time steps.
+        inputs (numpy.ndarray or torch.Tensor): Input audio of shape (C, T), where C is the number of channels and T is the number of time steps.
         args (Namespace): Contains arguments for sampling rate, window size, and other parameters.
+        as_tensor (bool): If True, returns a float32 tensor on the device, see to_output.
 
     Returns:
-        numpy.ndarray: The decoded audio output, normalized to the range [-1, 1].
+        numpy.ndarray: The decoded audio output of shape (C, T), normalized to the range [-1, 1].
     """
-    inputs = inputs[0, :]  # Extract the first element from the input tensor
-    input_len = inputs.shape[0]  # Get the length of the input audio
+    inputs = to_tensor(inputs, device)  # All channels are decoded together
+    input_len = inputs.shape[-1]  # Get the length of the input audio
     inputs = inputs * MAX_WAV_VALUE  # Normalize the input to the maximum WAV value
 
     # Check if input length exceeds the defined threshold for online decoding
     if input_len > args.sampling_rate * args.one_time_decode_length:  # 20 seconds
-        online_decoding = True
-        if online_decoding:
-            window = int(args.sampling_rate * args.decode_window)  # Define window length (e.g., 4s for 48kHz)
-            stride = int(window * 0.75)  # Define stride length (e.g., 3s for 48kHz)
-            t = inputs.shape[0]  # Update length after potential padding
-
-            # Pad input if necessary to match window size
-            if t < window:
-                inputs = np.concatenate([inputs, np.zeros(window - t)], 0)
-            elif t < window + stride:
-                padding = window + stride - t
-                inputs = np.concatenate([inputs, np.zeros(padding)], 0)
-            else:
-                if (t - window) % stride != 0:
-                    padding = t - (t - window) // stride * stride
-                    inputs = np.concatenate([inputs, np.zeros(padding)], 0)
-
-            audio = torch.from_numpy(inputs).type(torch.FloatTensor)  # Convert to Torch tensor
-            t = audio.shape[0]  # Update length after conversion
-            outputs = torch.from_numpy(np.zeros(t))  # Initialize output tensor
-            give_up_length = (window - stride) // 2  # Determine length to ignore at the edges
-            dfsmn_memory_length = 0  # Placeholder for potential memory length
-            current_idx = 0  # Initialize current index for sliding window
-
-            # Process audio in sliding window segments
-            while current_idx + window <= t:
-                # Select appropriate segment of audio for processing
-                if current_idx < dfsmn_memory_length:
-                    audio_segment = audio[0:current_idx + window]
-                else:
-                    audio_segment = audio[current_idx - dfsmn_memory_length:current_idx + window]
-
-                # Compute filter banks for the audio segment
-                fbanks = compute_fbank(audio_segment.unsqueeze(0), args)
-                
-                # Compute deltas for filter banks
-                fbank_tr = torch.transpose(fbanks, 0, 1)  # Transpose for delta computation
-                fbank_delta = torchaudio.functional.compute_deltas(fbank_tr)  # First-order delta
-                fbank_delta_delta = torchaudio.functional.compute_deltas(fbank_delta)  # Second-order delta
-                
-                # Transpose back to original shape
-                fbank_delta = torch.transpose(fbank_delta, 0, 1)
-                fbank_delta_delta = torch.transpose(fbank_delta_delta, 0, 1)
-
-                # Concatenate the original filter banks with their deltas
-                fbanks = torch.cat([fbanks, fbank_delta, fbank_delta_delta], dim=1)
-                fbanks = fbanks.unsqueeze(0).to(device)  # Add batch dimension and move to device
-
-                # Pass filter banks through the model
-                Out_List = model(fbanks)
-                pred_mask = Out_List[-1]  # Get the predicted mask from the output
-
-                # Apply STFT to the audio segment
-                spectrum = stft(audio_segment, args)
-                pred_mask = pred_mask.permute(2, 1, 0)  # Permute dimensions for masking
-                masked_spec = spectrum.cpu() * pred_mask.detach().cpu()  # Apply mask to the spectrum
-                masked_spec_complex = masked_spec[:, :, 0] + 1j * masked_spec[:, :, 1]  # Convert to complex form
-
-                # Reconstruct audio from the masked spectrogram
-                output_segment = istft(masked_spec_complex, args, len(audio_segment))
-
-                # Store the output segment in the output tensor
-                if current_idx == 0:
-                    outputs[current_idx:current_idx + window - give_up_length] = output_segment[:-give_up_length]
-                else:
-                    output_segment = output_segment[-window:]  # Get the latest window of output
-                    outputs[current_idx + give_up_length:current_idx + window - give_up_length] = output_segment[give_up_length:-give_up_length]
-                
-                current_idx += stride  # Move to the next segment
-
+        window = int(args.sampling_rate * args.decode_window)  # Define window length (e.g., 4s for 48kHz)
+        stride = int(window * 0.75)  # Define stride length (e.g., 3s for 48kHz)
+        decode_fn = lambda x: _decode_one_audio_mossformer2_se_48k(model, x, args)
+        outputs = segmented_decode(decode_fn, inputs, window, stride, get_decode_batch_size(args), get_stitch_mode(args))
     else:
         # Process the entire audio at once if it is shorter than the threshold
-        audio = torch.from_numpy(inputs).type(torch.FloatTensor)
-        fbanks = compute_fbank(audio.unsqueeze(0), args)
-
-        # Compute deltas for filter banks
-        fbank_tr = torch.transpose(fbanks, 0, 1)
-        fbank_delta = torchaudio.functional.compute_deltas(fbank_tr)
-        fbank_delta_delta = torchaudio.functional.compute_deltas(fbank_delta)
-        fbank_delta = torch.transpose(fbank_delta, 0, 1)
-        fbank_delta_delta = torch.transpose(fbank_delta_delta, 0, 1)
-
-        # Concatenate the original filter banks with their deltas
-        fbanks = torch.cat([fbanks, fbank_delta, fbank_delta_delta], dim=1)
-        fbanks = fbanks.unsqueeze(0).to(device)  # Add batch dimension and move to device
-
-        # Pass filter banks through the model
-        Out_List = model(fbanks)
-        pred_mask = Out_List[-1]  # Get the predicted mask
-        spectrum = stft(audio, args)  # Apply STFT to the audio
-        pred_mask = pred_mask.permute(2, 1, 0)  # Permute dimensions for masking
-        masked_spec = spectrum * pred_mask.detach().cpu()  # Apply mask to the spectrum
-        masked_spec_complex = masked_spec[:, :, 0] + 1j * masked_spec[:, :, 1]  # Convert to complex form
-        
-        # Reconstruct audio from the masked spectrogram
-        outputs = istft(masked_spec_complex, args, len(audio))
-
-    return outputs.numpy() / MAX_WAV_VALUE  # Return the output normalized to [-1, 1]
+        outputs = _decode_one_audio_mossformer2_se_48k(model, inputs, args)
+
+    return to_output(outputs / MAX_WAV_VALUE, as_tensor)  # Return the output normalized to [-1, 1]
 
 def get_mel(x, args):
     """
@@ -438,12 +450,35 @@ def get_mel(x, args):
     """
     
     return mel_spectrogram(x, args.n_fft, args.num_mels, args.sampling_rate, args.hop_size, args.win_size, args.fmin, args.fmax)
-    
-def decode_one_audio_mossformer2_sr_48k(model, device, inputs, args):
+
+def _decode_one_audio_mossformer2_sr_48k(model, inputs, args):
+    """
+    Runs a batch of equally long audio windows through the two-stage speech super-resolution model.
+
+    Parameters:
+    -----------
+    model : list
+        The Mossformer model (model[0]) and the vocoder (model[1]).
+    inputs : torch.Tensor
+        Low-resolution audio of shape (B, T).
+    args : Namespace
+        Contains the Mel spectrogram parameters.
+
+    Returns:
+    --------
+    torch.Tensor
+        The high-resolution audio of shape (B, T'), where T' may be slightly shorter than T.
+    """
+    mel_input = get_mel(inputs, args)
+    mossformer_output = model[0](mel_input)
+    generator_output = model[1](mossformer_output)
+    return generator_output.squeeze(1)
+
+def decode_one_audio_mossformer2_sr_48k(model, device, inputs, args, as_tensor=False):
     """
     This function decodes a single audio input using a two-stage speech super-resolution model.
     Supports both offline decoding (for short audio) and online decoding (for long audio)
-    with a sliding window approach.
+    with a sliding window approach, args.decode_batch_size windows per forward pass.
 
     Parameters:
     -----------
@@ -453,85 +488,40 @@ def decode_one_audio_mossformer2_sr_48k(model, device, inputs, args):
         - model[1]: The vocoder for generating high-resolution waveforms.
     device : str or torch.device
         The computation device ('cpu' or 'cuda') where the models will run.
-    inputs : torch.Tensor
-        A tensor of shape (batch_size, num_samples) containing low-resolution audio signals.
-        Only the first audio (inputs[0, :]) is processed.
+    inputs : numpy.ndarray or torch.Tensor
+        Audio of shape (num_channels, num_samples) containing low-resolution audio signals.
+        All channels are processed together.
     args : Namespace
         An object containing the following attributes:
         - sampling_rate: Sampling rate of the input audio (e.g., 48,000 Hz).
         - one_time_decode_length: Maximum duration (in seconds) for offline decoding.
         - decode_window: Window size (in seconds) for sliding window processing.
         - Other optional attributes used for Mel spectrogram extraction.
+    as_tensor : bool
+        If True, returns a float32 tensor on the device, see to_output.
 
     Returns:
     --------
     numpy.ndarray
-        The high-resolution audio waveform as a NumPy array, refined and upsampled.
+        The high-resolution audio waveform of shape (num_channels, T') as a NumPy array, refined and upsampled.
     """
-    inputs = inputs[0, :]  # Extract the first element from the input tensor
-    input_len = inputs.shape[0]  # Get the length of the input audio
-    #inputs = inputs * MAX_WAV_VALUE  # Normalize the input to the maximum WAV value
+    inputs = to_tensor(inputs, device)  # All channels are decoded together
+    input_len = inputs.shape[-1]  # Get the length of the input audio
 
     # Check if input length exceeds the defined threshold for online decoding
     if input_len > args.sampling_rate * args.one_time_decode_length:  # 20 seconds
-        online_decoding = True
-        if online_decoding:
-            window = int(args.sampling_rate * args.decode_window)  # Define window length (e.g., 4s for 48kHz)
-            stride = int(window * 0.75)  # Define stride length (e.g., 3s for 48kHz)
-            t = inputs.shape[0]  # Update length after potential padding
-
-            # Pad input if necessary to match window size
-            if t < window:
-                inputs = np.concatenate([inputs, np.zeros(window - t)], 0)
-            elif t < window + stride:
-                padding = window + stride - t
-                inputs = np.concatenate([inputs, np.zeros(padding)], 0)
-            else:
-                if (t - window) % stride != 0:
-                    padding = t - (t - window) // stride * stride
-                    inputs = np.concatenate([inputs, np.zeros(padding)], 0)
-
-            audio = torch.from_numpy(inputs).type(torch.FloatTensor)  # Convert to Torch tensor
-            t = audio.shape[0]  # Update length after conversion
-            outputs = torch.from_numpy(np.zeros(t))  # Initialize output tensor
-            give_up_length = (window - stride) // 2  # Determine length to ignore at the edges
-            dfsmn_memory_length = 0  # Placeholder for potential memory length
-            current_idx = 0  # Initialize current index for sliding window
-
-            # Process audio in sliding window segments
-            while current_idx + window <= t:
-                # Select appropriate segment of audio for processing
-                if current_idx < dfsmn_memory_length:
-                    audio_segment = audio[0:current_idx + window]
-                else:
-                    audio_segment = audio[current_idx - dfsmn_memory_length:current_idx + window]
-
-                # Pass filter banks through the model
-                mel_segment = get_mel(audio_segment.unsqueeze(0), args)
-                mossformer_output_segment = model[0](mel_segment.to(device))
-                generator_output_segment = model[1](mossformer_output_segment)
-                generator_output_segment = generator_output_segment.squeeze()
-                offset = len(audio_segment) - len(generator_output_segment)
-                # Store the output segment in the output tensor
-                if current_idx == 0:
-                    outputs[current_idx:current_idx + window - give_up_length] = generator_output_segment[:-give_up_length+offset]
-                else:
-                    generator_output_segment = generator_output_segment[-window:]  # Get the latest window of output
-                    outputs[current_idx + give_up_length:current_idx + window - give_up_length] = generator_output_segment[give_up_length:-give_up_length+offset]
-                
-                current_idx += stride  # Move to the next segment
-
+        window = int(args.sampling_rate * args.decode_window)  # Define window length (e.g., 4s for 48kHz)
+        stride = int(window * 0.75)  # Define stride length (e.g., 3s for 48kHz)
+        decode_fn = lambda x: _decode_one_audio_mossformer2_sr_48k(model, x, args)
+        outputs = segmented_decode(decode_fn, inputs, window, stride, get_decode_batch_size(args), get_stitch_mode(args))
     else:
         # Process the entire audio at once if it is shorter than the threshold
-        audio = torch.from_numpy(inputs).type(torch.FloatTensor)
-        mel_input = get_mel(audio.unsqueeze(0), args)
-        mossformer_output = model[0](mel_input.to(device))
-        generator_output = model[1](mossformer_output)
-        outputs = generator_output.squeeze()
-
-    outputs = outputs.cpu().numpy()
-    outputs = bandwidth_sub(inputs, outputs)
-    return outputs
+        outputs = _decode_one_audio_mossformer2_sr_48k(model, inputs, args)
+
+    outputs = outputs.detach().cpu().numpy()
+    inputs = inputs.cpu().numpy()
+    # The bandwidth substitution filters each channel on its own, on the host
+    return to_output(np.stack([bandwidth_sub(inputs[i], outputs[i]) for i in range(len(outputs))]), as_tensor, device)
 
 def decode_one_audio_AV_MossFormer2_TSE_16K(model, inputs, args):
     """Processes video inputs through the AV mossformer2 model with Target speaker extraction (TSE) for decoding at 16kHz.
@@ -0,0 +1,169 @@
+#!/usr/bin/env python -u
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import threading
+import torch
+import torch.nn.functional as F
+import torchaudio
+import librosa
+
+# Memoized frontend tensors, keyed by (kind, params..., device, dtype)
+_cache = {}
+_cache_lock = threading.Lock()
+
+# Kaldi defaults used by torchaudio.compliance.kaldi.fbank
+KALDI_PREEMPHASIS = 0.97
+KALDI_LOW_FREQ = 20.0
+KALDI_WINDOWS = ('hamming', 'hanning', 'povey', 'rectangular')
+
+def _memoize(key, build):
+    """Returns the cached tensor for key, building it with build() on first use."""
+    value = _cache.get(key)
+    if value is None:
+        with _cache_lock:
+            value = _cache.get(key)
+            if value is None:
+                value = build()
+                _cache[key] = value
+    return value
+
+def clear_cache():
+    """Drops all memoized frontend tensors, e.g. to release GPU memory."""
+    with _cache_lock:
+        _cache.clear()
+
+def get_window(win_type, win_len, periodic=False, device='cpu', dtype=torch.float32):
+    """Returns an analysis window, built once per (type, length, periodic, device, dtype).
+
+    Args:
+        win_type (str): 'hamming' or 'hanning'.
+        win_len (int): Window length in samples.
+        periodic (bool): Whether to return a periodic window (see torch.hann_window).
+        device (torch.device or str): Device of the window.
+        dtype (torch.dtype): Data type of the window.
+
+    Returns:
+        torch.Tensor: The window of shape [win_len], or None for unsupported window types.
+    """
+    if win_type == 'hamming':
+        build = lambda: torch.hamming_window(win_len, periodic=periodic, dtype=dtype, device=device)
+    elif win_type == 'hanning':
+        build = lambda: torch.hann_window(win_len, periodic=periodic, dtype=dtype, device=device)
+    else:
+        return None
+    return _memoize(('window', win_type, win_len, periodic, str(device), dtype), build)
+
+def get_mel_basis(sampling_rate, n_fft, num_mels, fmin, fmax, device='cpu', dtype=torch.float32):
+    """Returns the librosa mel filterbank of shape [num_mels, n_fft // 2 + 1], built once per
+    (params, device, dtype)."""
+    def build():
+        mel = librosa.filters.mel(sr=sampling_rate, n_fft=n_fft, n_mels=num_mels, fmin=fmin, fmax=fmax)
+        return torch.from_numpy(mel).to(device=device, dtype=dtype)
+    return _memoize(('mel', sampling_rate, n_fft, num_mels, fmin, fmax, str(device), dtype), build)
+
+def _kaldi_window(win_type, window_size, device, dtype):
+    """Returns the Kaldi feature window (as in torchaudio.compliance.kaldi), or None if unsupported."""
+    def build():
+        if win_type == 'hanning':
+            return torch.hann_window(window_size, periodic=False, device=device, dtype=dtype)
+        if win_type == 'hamming':
+            return torch.hamming_window(window_size, periodic=False, alpha=0.54, beta=0.46, device=device, dtype=dtype)
+        if win_type == 'povey':
+            return torch.hann_window(window_size, periodic=False, device=device, dtype=dtype).pow(0.85)
+        return torch.ones(window_size, device=device, dtype=dtype)
+    if win_type not in KALDI_WINDOWS:
+        return None
+    return _memoize(('kaldi_window', win_type, window_size, str(device), dtype), build)
+
+def _kaldi_mel_banks(num_mels, padded_window_size, sampling_rate, device, dtype):
+    """Returns the Kaldi mel banks of shape [num_mels, padded_window_size // 2 + 1]."""
+    def build():
+        banks, _ = torchaudio.compliance.kaldi.get_mel_banks(num_mels, padded_window_size, float(sampling_rate),
+                                                             KALDI_LOW_FREQ, 0.0, 100.0, -500.0, 1.0)
+        # Kaldi pads the banks with a zero column for the Nyquist bin
+        return F.pad(banks, (0, 1)).to(device=device, dtype=dtype)
+    return _memoize(('kaldi_mel', num_mels, padded_window_size, sampling_rate, str(device), dtype), build)
+
+def fbank_config(args, round_ms=False):
+    """Builds the Kaldi fbank options for the given configuration.
+
+    Args:
+        args (Namespace): Contains win_len, win_inc, sampling_rate, num_mels and win_type.
+        round_ms (bool): Truncate frame length and shift to whole milliseconds (as used in training).
+
+    Returns:
+        dict: Keyword arguments for torchaudio.compliance.kaldi.fbank.
+    """
+    frame_length = args.win_len / args.sampling_rate * 1000  # Frame length in milliseconds
+    frame_shift = args.win_inc / args.sampling_rate * 1000  # Frame shift in milliseconds
+    if round_ms:
+        frame_length, frame_shift = int(frame_length), int(frame_shift)
+    return {
+        'dither': 1.0,
+        'frame_length': frame_length,
+        'frame_shift': frame_shift,
+        'num_mel_bins': args.num_mels,
+        'sample_frequency': args.sampling_rate,
+        'window_type': args.win_type,
+    }
+
+def kaldi_fbank(waveforms, dither=1.0, frame_length=25.0, frame_shift=10.0, num_mel_bins=23,
+                sample_frequency=16000.0, window_type='povey'):
+    """Computes Kaldi-compatible log mel filterbank features for a batch of signals at once.
+    This follows torchaudio.compliance.kaldi.fbank with its default options, but the window
+    and the mel banks are memoized and all signals are processed in one pass.
+
+    Args:
+        waveforms (torch.Tensor): Signals of shape [B, T] (or [T]).
+        dither, frame_length, frame_shift, num_mel_bins, sample_frequency, window_type:
+            The options of torchaudio.compliance.kaldi.fbank (frame length and shift in ms).
+
+    Returns:
+        torch.Tensor: Features of shape [B, frames, num_mel_bins] (or [frames, num_mel_bins]).
+    """
+    device, dtype = waveforms.device, waveforms.dtype
+    window_shift = int(sample_frequency * frame_shift * 0.001)
+    window_size = int(sample_frequency * frame_length * 0.001)
+    padded_window_size = 1 << (window_size - 1).bit_length()  # Round up to a power of two
+    window = _kaldi_window(window_type, window_size, device, dtype)
+    if window is None or waveforms.shape[-1] < window_size:
+        # Fall back to the reference implementation for unsupported options
+        rows = waveforms.reshape(-1, waveforms.shape[-1])
+        feats = torch.stack([torchaudio.compliance.kaldi.fbank(row.unsqueeze(0), dither=dither, frame_length=frame_length,
+                                                               frame_shift=frame_shift, num_mel_bins=num_mel_bins,
+                                                               sample_frequency=sample_frequency, window_type=window_type)
+                             for row in rows])
+        return feats.reshape(*waveforms.shape[:-1], *feats.shape[-2:])
+
+    # Frames with snip_edges=True
+    frames = waveforms.unfold(-1, window_size, window_shift)  # [..., frames, window_size]
+    if dither != 0.0:
+        frames = frames + torch.randn_like(frames) * dither
+    frames = frames - frames.mean(dim=-1, keepdim=True)  # Remove DC offset
+    # Pre-emphasis, the first sample of each frame is emphasized with itself
+    previous = torch.cat([frames[..., :1], frames[..., :-1]], dim=-1)
+    frames = (frames - KALDI_PREEMPHASIS * previous) * window
+    frames = F.pad(frames, (0, padded_window_size - window_size))
+
+    spectrum = torch.fft.rfft(frames).abs().pow(2)  # Power spectrum
+    mel_energies = torch.matmul(spectrum, _kaldi_mel_banks(num_mel_bins, padded_window_size, sample_frequency, device, dtype).t())
+    return torch.clamp(mel_energies, min=torch.finfo(dtype).eps).log()
+
+def fbank_with_deltas(waveforms, config):
+    """Computes Kaldi fbank features with their deltas and delta-deltas for a batch of signals.
+
+    Args:
+        waveforms (torch.Tensor): Signals of shape [B, T].
+        config (dict): Fbank options, see fbank_config.
+
+    Returns:
+        torch.Tensor: Features of shape [B, frames, 3 * num_mel_bins].
+    """
+    fbank = kaldi_fbank(waveforms, **config)
+    fbank_tr = fbank.transpose(-1, -2)  # Deltas are computed along time
+    fbank_delta = torchaudio.functional.compute_deltas(fbank_tr)
+    fbank_delta_delta = torchaudio.functional.compute_deltas(fbank_delta)
+    return torch.cat([fbank, fbank_delta.transpose(-1, -2), fbank_delta_delta.transpose(-1, -2)], dim=-1)
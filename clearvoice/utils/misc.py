@@ -16,6 +16,7 @@ import os
 import sys
 import librosa  # Library for audio processing
 import torchaudio  # Library for audio processing with PyTorch
+from utils.frontend import get_window, fbank_config, kaldi_fbank
 
 # Constants
 MAX_WAV_VALUE = 32768.0  # Maximum value for WAV files
@@ -304,12 +305,9 @@ def stft(x, args, center=False, periodic=False, onesided=None):
     win_inc = args.win_inc
     fft_len = args.fft_len
 
-    # Select window type and create window tensor
-    if win_type == 'hamming':
-        window = torch.hamming_window(win_len, periodic=periodic).to(x.device)
-    elif win_type == 'hanning':
-        window = torch.hann_window(win_len, periodic=periodic).to(x.device)
-    else:
+    # Look up the cached window tensor for this window type, length and device
+    window = get_window(win_type, win_len, periodic=periodic, device=x.device)
+    if window is None:
         print(f"In STFT, {win_type} is not supported!")
         return
 
@@ -336,12 +334,9 @@ def istft(x, args, slen=None, center=False, normalized=False, periodic=False, on
     win_inc = args.win_inc
     fft_len = args.fft_len
 
-    # Select window type and create window tensor
-    if win_type == 'hamming':
-        window = torch.hamming_window(win_len, periodic=periodic).to(x.device)
-    elif win_type == 'hanning':
-        window = torch.hann_window(win_len, periodic=periodic).to(x.device)
-    else:
+    # Look up the cached window tensor for this window type, length and device
+    window = get_window(win_type, win_len, periodic=periodic, device=x.device)
+    if window is None:
         print(f"In ISTFT, {win_type} is not supported!")
         return
 
@@ -368,13 +363,9 @@ def compute_fbank(audio_in, args):
     Returns:
         torch.Tensor: Computed filter bank features.
     """
-    frame_length = args.win_len / args.sampling_rate * 1000  # Frame length in milliseconds
-    frame_shift = args.win_inc / args.sampling_rate * 1000  # Frame shift in milliseconds
-
-    # Compute and return filter bank features using Kaldi's implementation
-    return torchaudio.compliance.kaldi.fbank(audio_in, dither=1.0, frame_length=frame_length,
-                                             frame_shift=frame_shift, num_mel_bins=args.num_mels,
-                                             sample_frequency=args.sampling_rate, window_type=args.win_type)
+    # Compute and return filter bank features with the Kaldi-compatible frontend,
+    # which reuses the window and mel banks across calls
+    return kaldi_fbank(audio_in, **fbank_config(args))
                                              
 
 
@@ -0,0 +1,82 @@
+#!/usr/bin/env python -u
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import functools
+import torch
+
+# Precisions run with autocast and the torch dtype of their autocast regions
+AUTOCAST_DTYPES = {'float16': torch.float16, 'bfloat16': torch.bfloat16}
+# Methods of the top-level models that the decoders call, run under autocast
+AUTOCAST_METHODS = ('forward', 'inference', 'enhance_spec')
+# Numerically sensitive methods that stay in float32 inside the autocast regions, by class name:
+# the normalizations, whose reductions (mean of squares, norms) overflow or lose precision in
+# float16, the STFT/iSTFT convolutions of FRCRN and the mask applications. The spectral
+# front and back ends of the decoders (STFT, iSTFT, power_compress/power_uncompress,
+# filter banks and the MossFormer2 SE mask) run outside the models and stay in float32.
+FP32_ISLANDS = {
+    'ScaleNorm': ('forward',),
+    'GlobalLayerNorm': ('forward',),
+    'CumulativeLayerNorm': ('forward',),
+    'ConvSTFT': ('forward',),
+    'ConviSTFT': ('forward',),
+    'DCCRN': ('mask_spec',),  # FRCRN
+    'MossFormer': ('apply_mask',),  # MossFormer2 SS
+}
+
+def _device_type(args):
+    """Returns the device type of the first tensor in args, 'cpu' if there is none."""
+    for arg in args:
+        if isinstance(arg, torch.Tensor):
+            return arg.device.type
+    return 'cpu'
+
+def _to_float32(value):
+    """Casts the floating point tensors in value, possibly nested in lists and tuples, to float32."""
+    if isinstance(value, torch.Tensor):
+        return value.float() if value.is_floating_point() else value
+    if isinstance(value, (list, tuple)):
+        return type(value)(_to_float32(item) for item in value)
+    return value
+
+def autocast_method(method, dtype):
+    """Wraps a method so that it runs under autocast in dtype and returns float32 outputs."""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with torch.autocast(_device_type(args), dtype=dtype):
+            outputs = method(*args, **kwargs)
+        return _to_float32(outputs)
+    return wrapper
+
+def fp32_method(method):
+    """Wraps a method so that it runs in float32, with autocast disabled and float32 inputs."""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with torch.autocast(_device_type(args), enabled=False):
+            return method(*_to_float32(args), **{key: _to_float32(value) for key, value in kwargs.items()})
+    return wrapper
+
+def enable_autocast(model, precision):
+    """Makes a model run in mixed precision: the methods of AUTOCAST_METHODS run under
+    autocast in the dtype of precision, except for the FP32_ISLANDS, and return float32.
+
+    The weights stay in float32 and autocast casts them per operation, so the model keeps
+    loading float32 checkpoints and the float32 islands use the trained weights as they are.
+    The methods are wrapped on the module instances, the model classes are unchanged.
+
+    Args:
+        model (nn.Module): The top-level model, or an nn.ModuleList of top-level models.
+        precision (str): One of AUTOCAST_DTYPES.
+    """
+    dtype = AUTOCAST_DTYPES[precision]
+    models = list(model) if isinstance(model, torch.nn.ModuleList) else [model]
+    for module in model.modules():
+        for name in FP32_ISLANDS.get(type(module).__name__, ()):
+            if hasattr(module, name):  # Other models have classes of the same name
+                setattr(module, name, fp32_method(getattr(module, name)))
+    for module in models:
+        for name in AUTOCAST_METHODS:
+            if hasattr(module, name):
+                setattr(module, name, autocast_method(getattr(module, name), dtype))
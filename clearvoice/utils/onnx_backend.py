@@ -0,0 +1,217 @@
+#!/usr/bin/env python -u
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import os
+import torch
+import torch.nn as nn
+from utils.misc import power_compress, stft
+from utils.frontend import fbank_config, fbank_with_deltas
+from utils.quality import si_snr
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    # The onnxruntime backend is optional, the torch backend runs without it
+    ort = None
+
+# ONNX opset of the exported models
+ONNX_OPSET = 17
+# Length in seconds of the dummy input the models are traced with
+EXPORT_SECONDS = 2.0
+# A different length, at which the exports are checked against torch to make sure the
+# time axes are really dynamic and not fixed to the traced length
+CHECK_SECONDS = 3.3
+# Minimum SI-SNR in dB of the exported outputs against the torch outputs
+CHECK_MIN_SI_SNR = 40.0
+
+class ExportPart(nn.Module):
+    """
+    The part of a model that the decoders call, with the call expressed as a forward pass
+    returning a tuple of tensors so that torch.onnx.export can trace it.
+    """
+
+    def __init__(self, module, call):
+        super().__init__()
+        self.module = module
+        self.call = call
+
+    def forward(self, x):
+        outputs = self.call(self.module, x)
+        return tuple(outputs) if isinstance(outputs, (list, tuple)) else (outputs,)
+
+def _example_audio(args, seconds):
+    generator = torch.Generator().manual_seed(0)
+    return 0.01 * torch.randn(1, int(args.sampling_rate * seconds), generator=generator)
+
+def _gan_spec(args, seconds):
+    # The compressed spectrogram that _decode_one_audio_mossformergan_se_16k passes to the model
+    spec = stft(_example_audio(args, seconds), args, center=True, periodic=True, onesided=True)
+    return power_compress(spec.to(torch.float32)).permute(0, 1, 3, 2)
+
+def _fbanks(args, seconds):
+    return fbank_with_deltas(_example_audio(args, seconds) * 32768.0, fbank_config(args))
+
+def _mel(args, seconds):
+    from utils.decode import get_mel
+    return get_mel(_example_audio(args, seconds), args)
+
+def export_parts(speech_model):
+    """
+    Returns the exportable parts of a SpeechModel as (name, ExportPart, example input
+    function, input dynamic axes, returns list), in the order of the modules in
+    speech_model.model. The example input function maps (args, seconds) to an input.
+    """
+    model = speech_model.model
+    network = speech_model.args.network
+    batch_time = {0: 'batch', 1: 'time'}
+    if network == 'FRCRN_SE_16K':
+        return [('model', ExportPart(model, lambda m, x: m.inference(x, keep_batch=True)), _example_audio, batch_time, False)]
+    if network == 'MossFormerGAN_SE_16K':
+        return [('model', ExportPart(model, lambda m, x: m(x)), _gan_spec, {0: 'batch', 2: 'frames'}, True)]
+    if network == 'MossFormer2_SE_48K':
+        # The decoder only uses the mask, the last output
+        return [('model', ExportPart(model, lambda m, x: m(x)[-1]), _fbanks, {0: 'batch', 1: 'frames'}, True)]
+    if network == 'MossFormer2_SS_16K':
+        return [('model', ExportPart(model, lambda m, x: m(x)), _example_audio, batch_time, True)]
+    if network == 'MossFormer2_SR_48K':
+        # The vocoder is traced with the output of the first stage, see export_onnx
+        return [('mossformer', ExportPart(model[0], lambda m, x: m(x)), _mel, {0: 'batch', 2: 'frames'}, False),
+                ('vocoder', ExportPart(model[1], lambda m, x: m(x)), None, {0: 'batch', 2: 'frames'}, False)]
+    raise ValueError(f'ONNX export is not supported for {network}')
+
+def onnx_path(args, part):
+    """Returns the path of an exported model part, next to the checkpoints of the model."""
+    return os.path.join(args.checkpoint_dir, f'{args.network}.{part}.onnx')
+
+def export_onnx(speech_model, check=True):
+    """
+    Exports the parts of a float32 torch SpeechModel that the decoders call to ONNX files
+    next to its checkpoints, with dynamic batch and time axes. The pre- and post-processing
+    of the decoders (STFT, filter banks, normalizations) is not part of the exports.
+
+    Args:
+        speech_model (SpeechModel): The model to export, on the torch backend in float32.
+        check (bool): Whether to run every export with ONNX Runtime at a length different
+                      from the traced one and compare it with torch (see CHECK_MIN_SI_SNR).
+
+    Returns:
+        list: The paths of the exported files.
+    """
+    if speech_model.backend != 'torch' or speech_model.precision != 'float32':
+        raise ValueError(f'Only float32 torch models can be exported, {speech_model.name} runs in '
+                         f'{speech_model.precision} on {speech_model.backend}')
+    args = speech_model.args
+    paths = []
+    previous, previous_example = None, None  # The part before the current one, for chained parts
+    for name, part, example, dynamic_axes, _ in export_parts(speech_model):
+        part = part.cpu().eval()
+        if example is None:
+            # Chained parts are traced and checked with the outputs of the previous part
+            example = lambda a, seconds, p=previous, e=previous_example: p(e(a, seconds))[0]
+        with torch.no_grad():
+            inputs = example(args, EXPORT_SECONDS)
+            outputs = part(inputs)
+            output_names = [f'output_{i}' for i in range(len(outputs))]
+            axes = {'input': dynamic_axes}
+            for output_name, output in zip(output_names, outputs):
+                axes[output_name] = {i: f'{output_name}_{i}' for i in range(output.dim())}
+            path = onnx_path(args, name)
+            temp_path = path + '.tmp'
+            torch.onnx.export(part, (inputs,), temp_path, opset_version=ONNX_OPSET, input_names=['input'],
+                              output_names=output_names, dynamic_axes=axes)
+            os.replace(temp_path, path)
+            if check:
+                check_onnx(part, path, example(args, CHECK_SECONDS))
+        paths.append(path)
+        previous, previous_example = part, example
+    speech_model.model.to(speech_model.device)
+    return paths
+
+def check_onnx(part, path, inputs):
+    """
+    Raises a ValueError if the outputs of an exported part differ from the torch outputs.
+    """
+    with torch.no_grad():
+        expected = [output.numpy() for output in part(inputs)]
+    outputs = create_session(path, 'cpu').run(None, {'input': inputs.numpy()})
+    for output, reference in zip(outputs, expected):
+        if output.shape != reference.shape:
+            raise ValueError(f'{path}: output shape {output.shape} differs from torch {reference.shape}')
+        quality = si_snr(output.reshape(output.shape[0], -1), reference.reshape(reference.shape[0], -1)).min()
+        if quality < CHECK_MIN_SI_SNR:
+            raise ValueError(f'{path}: outputs differ from torch ({quality:.1f} dB SI-SNR)')
+
+def create_session(path, device):
+    """
+    Creates an ONNX Runtime session for an exported part with all graph optimizations.
+    The number of threads of a session is taken from the CLEARVOICE_ORT_THREADS environment
+    variable (ONNX Runtime's default if unset).
+
+    Args:
+        path (str): The exported file.
+        device (str or torch.device): 'cuda' runs the session with the CUDA execution provider
+                                      if onnxruntime-gpu is installed, else on the CPU.
+
+    Returns:
+        onnxruntime.InferenceSession: The session.
+    """
+    if ort is None:
+        raise ImportError('The onnxruntime backend requires the onnxruntime package (pip install onnxruntime)')
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    threads = int(os.environ.get('CLEARVOICE_ORT_THREADS', 0))
+    if threads:
+        options.intra_op_num_threads = threads
+    providers = ['CPUExecutionProvider']
+    if torch.device(device).type == 'cuda' and 'CUDAExecutionProvider' in ort.get_available_providers():
+        providers.insert(0, 'CUDAExecutionProvider')
+    return ort.InferenceSession(path, sess_options=options, providers=providers)
+
+class OnnxModule(nn.Module):
+    """
+    Runs an exported model part with ONNX Runtime. It is called like the torch module it
+    replaces, on torch tensors, so the decoders in utils/decode.py run unchanged.
+
+    Attributes:
+    - session: The ONNX Runtime session.
+    - returns_list: Whether calls return a list of tensors, like the replaced module, or one tensor.
+    """
+
+    def __init__(self, path, device, returns_list=False):
+        super().__init__()
+        self.path = path
+        self.session = create_session(path, device)
+        self.returns_list = returns_list
+
+    def forward(self, x):
+        outputs = self.session.run(None, {'input': x.detach().cpu().numpy()})
+        outputs = [torch.from_numpy(output).to(x.device) for output in outputs]
+        return outputs if self.returns_list else outputs[0]
+
+    def inference(self, x, keep_batch=False):
+        """FRCRN's inference, see DCCRN.inference."""
+        outputs = self.forward(x)
+        return outputs if keep_batch else outputs[0]
+
+def load_onnx_model(speech_model):
+    """
+    Builds the onnxruntime replacement of speech_model.model from its exported parts.
+
+    Returns:
+        tuple: The replacement (an OnnxModule, or an nn.ModuleList of them for models with
+               several parts) and the paths of the exported files.
+    """
+    modules, paths = [], []
+    for name, _, _, _, returns_list in export_parts(speech_model):
+        path = onnx_path(speech_model.args, name)
+        if not os.path.isfile(path):
+            raise ValueError(f'{path} does not exist, export {speech_model.name} first: '
+                             f'python export_onnx.py {speech_model.args.task}:{speech_model.name}')
+        modules.append(OnnxModule(path, speech_model.device, returns_list))
+        paths.append(path)
+    if isinstance(speech_model.model, nn.ModuleList):
+        return nn.ModuleList(modules), paths
+    return modules[0], paths
@@ -0,0 +1,49 @@
+#!/usr/bin/env python -u
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import itertools
+import numpy as np
+
+EPS = np.finfo(np.float64).eps
+
+def si_snr(estimate, reference):
+    """Computes the scale-invariant signal-to-noise ratio (SI-SNR, also known as SI-SDR) of
+    an estimate against a reference, e.g. the output of an optimized model against the
+    output of the float32 model. Both signals are made zero-mean, and the estimate is
+    compared with its projection onto the reference.
+
+    Args:
+        estimate (numpy.ndarray): Estimated signal of shape [..., T].
+        reference (numpy.ndarray): Reference signal of shape [..., T].
+
+    Returns:
+        numpy.ndarray: SI-SNR in dB of shape [...], a float for one-dimensional signals.
+    """
+    length = min(estimate.shape[-1], reference.shape[-1])
+    estimate = np.asarray(estimate[..., :length], dtype=np.float64)
+    reference = np.asarray(reference[..., :length], dtype=np.float64)
+    estimate = estimate - estimate.mean(axis=-1, keepdims=True)
+    reference = reference - reference.mean(axis=-1, keepdims=True)
+    scale = (estimate * reference).sum(axis=-1, keepdims=True) / ((reference ** 2).sum(axis=-1, keepdims=True) + EPS)
+    target = scale * reference
+    noise = estimate - target
+    return 10 * np.log10(((target ** 2).sum(axis=-1) + EPS) / ((noise ** 2).sum(axis=-1) + EPS))
+
+def pit_si_snr(estimates, references):
+    """Computes the permutation-invariant SI-SNR of separated sources: the mean SI-SNR of
+    the estimates against the references under the best assignment of estimates to references.
+
+    Args:
+        estimates (numpy.ndarray): Estimated sources of shape [num_spks, T].
+        references (numpy.ndarray): Reference sources of shape [num_spks, T].
+
+    Returns:
+        float: The mean SI-SNR in dB of the best permutation.
+    """
+    pairs = si_snr(estimates[:, None, :], references[None, :, :])  # [estimate, reference]
+    num_spks = len(references)
+    return max(np.mean([pairs[perm[i], i] for i in range(num_spks)])
+               for perm in itertools.permutations(range(num_spks)))
@@ -0,0 +1,157 @@
+#!/usr/bin/env python -u
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import math
+import threading
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+# Windowed-sinc filter design (the defaults of torchaudio.functional.resample)
+LOWPASS_FILTER_WIDTH = 6
+ROLLOFF = 0.99
+# Context in seconds resampled on both sides of a block, longer than the resampling filter
+RESAMPLE_MARGIN = 0.1
+
+# Polyphase filters, keyed by (orig_sr, target_sr, device, dtype) after reducing the rates
+_kernels = {}
+_kernels_lock = threading.Lock()
+
+def _build_kernel(orig, new):
+    """
+    Designs the polyphase filter bank of a Hann-windowed sinc resampler for the reduced
+    rates orig -> new. Filter i computes output phase i from the input samples around it.
+
+    Returns:
+    tuple: (kernel, width), where kernel has shape [new, 1, 2 * width + orig] and width is the
+           number of input samples of context needed on each side.
+    """
+    base_freq = min(orig, new) * ROLLOFF
+    width = math.ceil(LOWPASS_FILTER_WIDTH * orig / base_freq)
+    idx = torch.arange(-width, width + orig, dtype=torch.float64)[None, None] / orig
+    t = torch.arange(0, -new, -1, dtype=torch.float64)[:, None, None] / new + idx
+    t = (t * base_freq).clamp(-LOWPASS_FILTER_WIDTH, LOWPASS_FILTER_WIDTH)
+    window = torch.cos(t * math.pi / LOWPASS_FILTER_WIDTH / 2) ** 2
+    t = t * math.pi
+    kernel = torch.where(t == 0, torch.ones_like(t), torch.sin(t) / t)
+    return kernel * window * (base_freq / orig), width
+
+def get_kernel(orig_sr, target_sr, device='cpu', dtype=torch.float32):
+    """
+    Returns the cached polyphase filter bank for orig_sr -> target_sr, see _build_kernel.
+    The filters are designed once per rate pair and copied once per device and dtype.
+    """
+    g = math.gcd(orig_sr, target_sr)
+    orig, new = orig_sr // g, target_sr // g
+    key = (orig, new, str(device), dtype)
+    value = _kernels.get(key)
+    if value is None:
+        with _kernels_lock:
+            value = _kernels.get(key)
+            if value is None:
+                kernel, width = _build_kernel(orig, new)
+                value = (kernel.to(device=device, dtype=dtype), width)
+                _kernels[key] = value
+    return value
+
+def resample(x, orig_sr, target_sr):
+    """
+    Resamples a signal along its last dimension with a cached polyphase windowed-sinc filter.
+    Tensors are resampled on their own device, with all leading dimensions (e.g., channels
+    or a batch) in one convolution. NumPy arrays are resampled on the CPU and returned as
+    NumPy arrays. The output has ceil(T * target_sr / orig_sr) samples.
+
+    Parameters:
+    x (torch.Tensor or numpy.ndarray): Signal of shape [..., T].
+    orig_sr (int): Sampling rate of the signal.
+    target_sr (int): Target sampling rate.
+
+    Returns:
+    torch.Tensor or numpy.ndarray: The resampled signal of shape [..., T'].
+    """
+    if orig_sr == target_sr:
+        return x
+    if isinstance(x, np.ndarray):
+        dtype = x.dtype if x.dtype in (np.float32, np.float64) else np.float32
+        return resample(torch.from_numpy(np.asarray(x, dtype=dtype)), orig_sr, target_sr).numpy()
+
+    g = math.gcd(orig_sr, target_sr)
+    orig, new = orig_sr // g, target_sr // g
+    kernel, width = get_kernel(orig_sr, target_sr, x.device, x.dtype)
+    shape, length = x.shape[:-1], x.shape[-1]
+    x = F.pad(x.reshape(-1, 1, length), (width, width + orig))
+    y = F.conv1d(x, kernel, stride=orig)  # [B, new, frames], one row per output phase
+    y = y.transpose(1, 2).reshape(y.shape[0], -1)  # Interleave the phases
+    return y[:, :math.ceil(new * length / orig)].reshape(*shape, -1)
+
+class StreamResampler(object):
+    """
+    Resamples a signal that arrives in chunks, with the same result as resampling the whole
+    signal at once.
+
+    Blocks are resampled together with RESAMPLE_MARGIN seconds of context on both sides,
+    which covers the filter, and only the output samples of the block itself are kept.
+    Block boundaries are placed on multiples of orig_sr / gcd(orig_sr, target_sr) input
+    samples, where input and output sample grids align exactly. Chunks can be NumPy arrays
+    or tensors.
+
+    Parameters:
+    orig_sr (int): Sampling rate of the input.
+    target_sr (int): Sampling rate of the output.
+    """
+
+    def __init__(self, orig_sr, target_sr):
+        self.orig_sr = orig_sr
+        self.target_sr = target_sr
+        g = math.gcd(orig_sr, target_sr)
+        self.unit_in = orig_sr // g
+        self.unit_out = target_sr // g
+        self.margin = math.ceil(RESAMPLE_MARGIN * orig_sr / self.unit_in) * self.unit_in
+        self.buffer = None  # Input samples from buffer_start on, shape [..., n]
+        self.buffer_start = 0
+        self.total = 0  # Number of input samples pushed so far
+        self.done = 0  # Number of input samples whose outputs are emitted
+
+    def process(self, x, final=False):
+        """
+        Pushes a chunk of the input and returns the output samples that are final.
+
+        Parameters:
+        x (numpy.ndarray or torch.Tensor): Input chunk of shape [..., n].
+        final (bool): Whether this is the last chunk of the signal.
+
+        Returns:
+        numpy.ndarray or torch.Tensor: Output samples of shape [..., m], possibly empty.
+        """
+        if self.orig_sr == self.target_sr:
+            return x
+        if self.buffer is None:
+            self.buffer = x
+        elif isinstance(x, torch.Tensor):
+            self.buffer = torch.cat([self.buffer, x], -1)
+        else:
+            self.buffer = np.concatenate([self.buffer, x], axis=-1)
+        self.total += x.shape[-1]
+
+        # Emit up to the last aligned position that has the full right context
+        end = self.total if final else (self.total - self.margin) // self.unit_in * self.unit_in
+        if end <= self.done:
+            return self.buffer[..., :0]
+        lo = max(0, self.done - self.margin)
+        hi = min(self.total, end + self.margin)
+        y = resample(self.buffer[..., lo - self.buffer_start:hi - self.buffer_start], self.orig_sr, self.target_sr)
+
+        # Output positions of the emitted range, relative to the resampled block
+        offset = (self.done - lo) // self.unit_in * self.unit_out
+        length = math.ceil(end * self.target_sr / self.orig_sr) - self.done // self.unit_in * self.unit_out
+        y = y[..., offset:offset + length]
+
+        # Keep the left context of the next block only
+        self.done = end
+        keep = max(0, self.done - self.margin)
+        self.buffer = self.buffer[..., keep - self.buffer_start:]
+        self.buffer_start = keep
+        return y
@@ -0,0 +1,260 @@
+#!/usr/bin/env python -u
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import math
+import torch
+import torch.nn.functional as F
+import numpy as np
+
+# Default number of decoding windows per forward pass
+DEFAULT_DECODE_BATCH_SIZE = 4
+# Policies for stitching overlapping decoding windows, see stitch_weights
+STITCH_MODES = ('hard_cut', 'ola')
+DEFAULT_STITCH_MODE = 'hard_cut'
+
+def to_tensor(inputs, device):
+    """Converts a NumPy array or a tensor to a float32 tensor on the given device.
+
+    Args:
+        inputs (numpy.ndarray or torch.Tensor): Input audio.
+        device (torch.device): The device (CPU or GPU) to place the tensor on.
+
+    Returns:
+        torch.Tensor: The input as a float32 tensor on the device.
+    """
+    if isinstance(inputs, torch.Tensor):
+        return inputs.to(device, torch.float32)
+    # Shares the memory of float32 arrays instead of copying them
+    return torch.from_numpy(np.asarray(inputs, dtype=np.float32)).to(device)
+
+def get_decode_batch_size(args):
+    """Returns the number of decoding windows that are run through the model at once."""
+    batch_size = getattr(args, 'decode_batch_size', None)
+    if not batch_size:
+        batch_size = DEFAULT_DECODE_BATCH_SIZE
+    return max(1, int(batch_size))
+
+def get_stitch_mode(args):
+    """Returns the policy used to stitch overlapping decoding windows ('hard_cut' or 'ola')."""
+    mode = getattr(args, 'stitch_mode', None) or DEFAULT_STITCH_MODE
+    if mode not in STITCH_MODES:
+        raise ValueError(f'Unknown stitch mode {mode}, please select from: {", ".join(STITCH_MODES)}')
+    return mode
+
+def num_segments(length, window, stride):
+    """Returns the number of windows starting at 0, stride, 2 * stride, ... needed to cover length samples."""
+    return 1 + max(0, math.ceil((length - window) / stride))
+
+def pad_for_segments(inputs, window, stride):
+    """Pads the last dimension of the inputs with zeros so that windows starting at
+    0, stride, 2 * stride, ... cover the whole input.
+
+    Args:
+        inputs (torch.Tensor): Input audio tensor of shape [..., T].
+        window (int): Decoding window length in samples.
+        stride (int): Decoding stride in samples.
+
+    Returns:
+        torch.Tensor: Zero-padded tensor of shape [..., window + (N - 1) * stride].
+    """
+    t = inputs.shape[-1]
+    padded_len = window + (num_segments(t, window, stride) - 1) * stride
+    return F.pad(inputs, (0, padded_len - t))
+
+def fit_length(outputs, length):
+    """Crops or zero-pads the last dimension of the outputs to the given length."""
+    if outputs.shape[-1] > length:
+        return outputs[..., :length]
+    if outputs.shape[-1] < length:
+        return F.pad(outputs, (0, length - outputs.shape[-1]))
+    return outputs
+
+def stitch_weights(window, stride, mode, device):
+    """Builds the weights applied to a decoding window before overlap-add. The weights of
+    overlapping windows sum to one, so no normalization is needed after stitching.
+
+    - 'hard_cut': every window keeps its central `stride` samples and gives up
+      (window - stride) // 2 samples at the leading edge and the rest at the trailing edge.
+    - 'ola': every window is kept entirely, and the (window - stride) samples that overlap
+      with a neighbouring window are crossfaded with complementary Hann (sin^2) ramps.
+
+    Args:
+        window (int): Decoding window length in samples.
+        stride (int): Decoding stride in samples.
+        mode (str): The stitch mode.
+        device (torch.device): The device of the weights.
+
+    Returns:
+        tuple: (weights, head, tail), where weights has shape [window], and head and tail
+               are the slices of the leading and trailing edges that are set to one for the
+               first and last window of a signal.
+    """
+    overlap = window - stride
+    weights = torch.ones(window, device=device)
+    if mode == 'hard_cut':
+        give_up_length = overlap // 2
+        weights[:give_up_length] = 0.
+        weights[give_up_length + stride:] = 0.
+        return weights, slice(0, give_up_length), slice(give_up_length + stride, window)
+
+    if overlap > stride:
+        raise ValueError('Overlap-add stitching requires a stride of at least half the window')
+    if overlap > 0:
+        ramp = torch.sin(0.5 * math.pi * (torch.arange(overlap, device=device) + 0.5) / overlap) ** 2
+        weights[:overlap] = ramp
+        weights[stride:] = 1. - ramp
+    return weights, slice(0, overlap), slice(stride, window)
+
+def overlap_add(outputs, frames, start, stride):
+    """Adds a batch of consecutive windows into the output at once.
+
+    Args:
+        outputs (torch.Tensor): Output buffer of shape [..., L].
+        frames (torch.Tensor): Weighted window outputs of shape [n, ..., window], where
+            window k starts at sample start + k * stride of the output.
+        start (int): Position of the first window in the output.
+        stride (int): Decoding stride in samples.
+    """
+    n, window = frames.shape[0], frames.shape[-1]
+    span = window + (n - 1) * stride
+    columns = frames.reshape(n, -1, window).permute(1, 2, 0)  # [C, window, n]
+    folded = F.fold(columns, output_size=(1, span), kernel_size=(1, window), stride=(1, stride))
+    outputs[..., start:start + span] += folded.reshape(*outputs.shape[:-1], span)
+
+def segmented_decode(decode_fn, inputs, window, stride, batch_size, mode=DEFAULT_STITCH_MODE):
+    """Decodes a long input with overlapping windows in micro-batches and stitches the
+    outputs on the device. All windows are taken as views of the input, and each micro-batch
+    is weighted and overlap-added into an output buffer that is allocated once, so there is
+    no host synchronization per window. The first and last windows keep their outer edges,
+    so every sample of the input is covered.
+
+    Multi-channel inputs are decoded together: every forward pass holds the same windows of
+    all C channels, ordered channel by channel, so decode_fn receives [C * n, window] tensors.
+
+    Args:
+        decode_fn (callable): Maps a [B, window] tensor to a [B, L] tensor, or to a
+            [B, S, L] tensor for models with S outputs (e.g., speakers).
+        inputs (torch.Tensor): Input audio tensor of shape [T] or [C, T].
+        window (int): Decoding window length in samples.
+        stride (int): Decoding stride in samples.
+        batch_size (int): Number of windows per forward pass (at least one per channel).
+        mode (str): The stitch mode, 'hard_cut' or 'ola' (see stitch_weights).
+
+    Returns:
+        torch.Tensor: Decoded signal of shape [T], [S, T], [C, T] or [C, S, T].
+    """
+    t = inputs.shape[-1]
+    channels = inputs.reshape(-1, t)  # [C, T]
+    num_channels = channels.shape[0]
+    channels = pad_for_segments(channels, window, stride)
+    segments = channels.unfold(-1, window, stride)  # [C, N, window] view, no copy
+    count = segments.shape[1]
+    per_forward = max(1, batch_size // num_channels)
+    weights, head, tail = stitch_weights(window, stride, mode, inputs.device)
+
+    outputs = None
+    for idx in range(0, count, per_forward):
+        batch = segments[:, idx:idx + per_forward]
+        n = batch.shape[1]
+        batch_out = fit_length(decode_fn(batch.reshape(num_channels * n, window)), window)
+        batch_out = batch_out.reshape(num_channels, n, *batch_out.shape[1:]).transpose(0, 1)  # [n, C, ..., window]
+        if outputs is None:
+            outputs = batch_out.new_zeros(*batch_out.shape[1:-1], channels.shape[-1])
+
+        batch_weights = weights.expand(n, window).clone()
+        if idx == 0:
+            batch_weights[0, head] = 1.
+        if idx + n == count:
+            batch_weights[-1, tail] = 1.
+        batch_weights = batch_weights.reshape(n, *([1] * (batch_out.dim() - 2)), window)
+        overlap_add(outputs, batch_out * batch_weights, idx * stride, stride)
+    outputs = outputs[..., :t]
+    return outputs if inputs.dim() > 1 else outputs[0]
+
+class SegmentStream(object):
+    """Incremental version of segmented_decode for inputs that arrive in chunks, e.g. long
+    recordings read block by block. Windows are decoded on the same grid and stitched with
+    the same weights as in segmented_decode, so the concatenated outputs equal the output of
+    segmented_decode on the whole input. Only the input of the next windows and the output
+    samples that later windows still add to are kept in memory.
+
+    Args:
+        decode_fn (callable): Maps a [B, window] tensor to a [B, L] or [B, S, L] tensor.
+        window (int): Decoding window length in samples.
+        stride (int): Decoding stride in samples.
+        batch_size (int): Number of windows per forward pass.
+        mode (str): The stitch mode, 'hard_cut' or 'ola' (see stitch_weights).
+    """
+
+    def __init__(self, decode_fn, window, stride, batch_size, mode=DEFAULT_STITCH_MODE):
+        self.decode_fn = decode_fn
+        self.window = window
+        self.stride = stride
+        self.batch_size = batch_size
+        self.mode = mode
+        self.weights = None
+        self.inputs = None  # Input samples from the start of the next window on
+        self.outputs = None  # Output samples from the start of the next window on
+        self.next_index = 0  # Index of the next window to decode
+        self.total = 0  # Number of input samples pushed so far
+
+    def push(self, chunk):
+        """Adds an input chunk of shape [T] and returns the output samples that are final,
+        of shape [T'] or [S, T'], or None if no window was decoded."""
+        self.inputs = chunk if self.inputs is None else torch.cat([self.inputs, chunk], -1)
+        self.total += chunk.shape[-1]
+        # A window is only decoded once samples after it are available, so that the
+        # last window of the input is known when it is decoded
+        ready = (self.inputs.shape[-1] - self.window - 1) // self.stride + 1
+        outputs = []
+        while ready >= self.batch_size:
+            outputs.append(self._decode(self.batch_size))
+            ready -= self.batch_size
+        return torch.cat(outputs, -1) if outputs else None
+
+    def flush(self):
+        """Decodes the remaining windows and returns the rest of the output, or None if
+        no input was pushed."""
+        if self.inputs is None:
+            return None
+        count = num_segments(self.total, self.window, self.stride)
+        remaining = self.total - self.next_index * self.stride
+        self.inputs = pad_for_segments(self.inputs, self.window, self.stride)
+        outputs = []
+        while self.next_index < count:
+            outputs.append(self._decode(min(self.batch_size, count - self.next_index), count))
+        outputs.append(self.outputs)
+        return torch.cat(outputs, -1)[..., :remaining]
+
+    def _decode(self, n, count=None):
+        """Decodes the next n windows, overlap-adds them into the output buffer and returns
+        the output samples before the next window, which no later window adds to."""
+        window, stride = self.window, self.stride
+        if self.weights is None:
+            self.weights, self.head, self.tail = stitch_weights(window, stride, self.mode, self.inputs.device)
+        span = window + (n - 1) * stride
+        segments = self.inputs[..., :span].unfold(-1, window, stride)  # [n, window] view
+        batch_out = fit_length(self.decode_fn(segments.contiguous()), window)
+
+        # The output buffer starts at the first of the decoded windows
+        if self.outputs is None:
+            self.outputs = batch_out.new_zeros(*batch_out.shape[1:-1], 0)
+        if self.outputs.shape[-1] < span:
+            self.outputs = F.pad(self.outputs, (0, span - self.outputs.shape[-1]))
+
+        batch_weights = self.weights.expand(n, window).clone()
+        if self.next_index == 0:
+            batch_weights[0, self.head] = 1.
+        if count is not None and self.next_index + n == count:
+            batch_weights[-1, self.tail] = 1.
+        batch_weights = batch_weights.reshape(n, *([1] * (batch_out.dim() - 2)), window)
+        overlap_add(self.outputs, batch_out * batch_weights, 0, stride)
+
+        self.next_index += n
+        self.inputs = self.inputs[..., n * stride:]
+        final = self.outputs[..., :n * stride]
+        self.outputs = self.outputs[..., n * stride:]
+        return final
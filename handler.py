@@ -1,13 +1,157 @@
 # handler.py
+import time
+# Start of the cold start, before the heavy imports (torch, librosa and the model modules)
+PROCESS_START = time.perf_counter()
 import os
 import shutil
-import time
 import json
+import logging
+import uuid
 import base64
+import asyncio
+import tempfile
 import requests
 from clearvoice import ClearVoice
 import subprocess
+import soundfile as sf
 import runpod
+from startup import preload_models, is_warm_start, job_timings
+IMPORT_SECONDS = time.perf_counter() - PROCESS_START
+
+# Bytes downloaded or copied at once, so that large files never have to fit in memory
+CHUNK_SIZE = 1 << 20
+# Base64 is encoded in multiples of 3 bytes and decoded in multiples of 4 characters,
+# so that the chunks concatenate to the encoding of the whole file
+BASE64_ENCODE_CHUNK = 3 * (1 << 18)
+BASE64_DECODE_CHUNK = 4 * (1 << 18)
+# Frames converted at once between raw PCM and WAV
+PCM_BLOCK_FRAMES = 1 << 18
+# Timeout in seconds for connecting to and reading from input URLs
+DOWNLOAD_TIMEOUT = 60
+# Number of jobs a worker runs at once. Jobs use separate directories, and their model
+# stages share one GPU executor, so this can be raised above 1.
+MAX_CONCURRENCY = int(os.environ.get('CLEARVOICE_MAX_CONCURRENCY', 1))
+# Directory that the file references of jobs ('input_path', 'output_path') must lie in, e.g. the
+# mount point of the network volume. Without it, jobs cannot read or write files by reference.
+FILE_ROOT = os.environ.get('CLEARVOICE_FILE_ROOT')
+# Pipeline used by jobs that do not specify one
+DEFAULT_PIPELINE = [
+    {'task': 'speech_enhancement', 'model_name': 'MossFormer2_SE_48K'},
+    {'task': 'speech_super_resolution', 'model_name': 'MossFormer2_SR_48K'},
+    {'task': 'speech_enhancement', 'model_name': 'MossFormer2_SE_48K'}
+]
+
+def resolve_file_reference(path):
+    """
+    Resolves a file reference of a job against FILE_ROOT. Relative references are relative to
+    FILE_ROOT, and symbolic links and '..' are resolved before the check, so that a job cannot
+    read or overwrite files outside of it.
+
+    Args:
+        path (str): The file reference given by the job
+
+    Returns:
+        str: The resolved path
+
+    Raises:
+        ValueError: If FILE_ROOT is not configured or the path lies outside of it
+    """
+    if not FILE_ROOT:
+        raise ValueError("File references are disabled, set CLEARVOICE_FILE_ROOT to the directory they may use")
+    root = os.path.realpath(FILE_ROOT)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"File reference outside of CLEARVOICE_FILE_ROOT: {path}")
+    return resolved
+
+def download_file(url, path):
+    """
+    Downloads a file in chunks straight to disk.
+
+    Args:
+        url (str): URL of the file
+        path (str): Path where the file is saved
+    """
+    with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        response.raise_for_status()
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+
+def decode_base64_file(data, path):
+    """
+    Decodes a base64 string to a file chunk by chunk, without a decoded copy of the whole payload.
+
+    Args:
+        data (str): Base64 encoded file content
+        path (str): Path where the decoded file is saved
+    """
+    carry = ''
+    with open(path, 'wb') as f:
+        for start in range(0, len(data), BASE64_DECODE_CHUNK):
+            # Whitespace and line breaks may appear anywhere, so they are stripped per chunk and
+            # the characters beyond a multiple of 4 are carried over to the next chunk
+            chunk = carry + ''.join(data[start:start + BASE64_DECODE_CHUNK].split())
+            aligned = len(chunk) - len(chunk) % 4
+            f.write(base64.b64decode(chunk[:aligned]))
+            carry = chunk[aligned:]
+        if carry:
+            f.write(base64.b64decode(carry))
+
+def encode_base64_file(path):
+    """
+    Encodes a file to a base64 string chunk by chunk. Only the encoded output is held in
+    memory, not the file content.
+
+    Args:
+        path (str): Path of the file
+
+    Returns:
+        str: The base64 encoded file content
+    """
+    size = os.path.getsize(path)
+    encoded = bytearray(4 * ((size + 2) // 3))
+    pos = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(BASE64_ENCODE_CHUNK)
+            if not chunk:
+                break
+            piece = base64.b64encode(chunk)
+            encoded[pos:pos + len(piece)] = piece
+            pos += len(piece)
+    return encoded[:pos].decode('ascii')
+
+def pcm_to_wav(pcm_path, wav_path, sample_rate, channels, subtype='PCM_16'):
+    """
+    Wraps a raw (headerless, interleaved) PCM file into a WAV file, block by block.
+
+    Args:
+        pcm_path (str): Path of the raw PCM file
+        wav_path (str): Path where the WAV file is saved
+        sample_rate (int): Sampling rate of the PCM data
+        channels (int): Number of interleaved channels
+        subtype (str): libsndfile sample format of the PCM data, e.g. 'PCM_16' or 'FLOAT'
+    """
+    with sf.SoundFile(pcm_path, 'r', format='RAW', samplerate=sample_rate, channels=channels,
+                      subtype=subtype, endian='LITTLE') as src:
+        with sf.SoundFile(wav_path, 'w', samplerate=sample_rate, channels=channels, subtype=subtype, format='WAV') as dst:
+            for block in src.blocks(blocksize=PCM_BLOCK_FRAMES, dtype='int32' if subtype.startswith('PCM') else 'float32'):
+                dst.write(block)
+
+def wav_to_pcm(wav_path, pcm_path):
+    """
+    Strips the header of a WAV file, leaving its interleaved little-endian PCM samples.
+
+    Args:
+        wav_path (str): Path of the WAV file
+        pcm_path (str): Path where the raw PCM file is saved
+    """
+    with sf.SoundFile(wav_path) as src:
+        with sf.SoundFile(pcm_path, 'w', samplerate=src.samplerate, channels=src.channels,
+                          subtype=src.subtype, format='RAW', endian='LITTLE') as dst:
+            for block in src.blocks(blocksize=PCM_BLOCK_FRAMES, dtype='int32'):
+                dst.write(block)
 
 def ensure_wav_format(input_path, temp_dir='temp'):
     """
@@ -52,7 +196,11 @@ def enhance_audio(input_path, output_path, model_pipeline, temp_dir='temp'):
         input_path (str): Path to the input audio file
         output_path (str): Path where the final enhanced audio will be saved
         model_pipeline (list of dict): List of dictionaries containing 'task' and 'model_name' for each step
-        temp_dir (str): Directory to store intermediate files
+        temp_dir (str): Directory for temporary files (intermediate results are kept in memory)
+
+    With CLEARVOICE_RESULT_CACHE_MB (and optionally CLEARVOICE_RESULT_CACHE_DIR) set, the
+    output of every step is cached by the hash of its input, so a retried job, or a job whose
+    pipeline starts with the same steps as an earlier one, skips the cached steps.
     """
     # Create temp directory if it doesn't exist
     os.makedirs(temp_dir, exist_ok=True)
@@ -60,31 +208,42 @@ def enhance_audio(input_path, output_path, model_pipeline, temp_dir='temp'):
     # Ensure input is in WAV format
     input_wav_path = ensure_wav_format(input_path, temp_dir)
     
-    # Track the current file being processed
-    current_file = input_wav_path
-    
-    # Iterate through the model pipeline
     for i, model_info in enumerate(model_pipeline):
-        task = model_info['task']
-        model_name = model_info['model_name']
-        
-        print(f"Step {i+1}: {task} using {model_name}")
-        
-        # Generate a unique intermediate file name
-        intermediate_path = os.path.join(temp_dir, f'intermediate_{i}_{model_name}.wav')
-        
-        # Process the audio with the current model
-        process_audio(task, model_name, current_file, intermediate_path)
-        
-        # Update the current file to the intermediate file
-        current_file = intermediate_path
+        print(f"Step {i+1}: {model_info['task']} using {model_info['model_name']}")
     
-    # Move the final result to the output path
-    shutil.copy(current_file, output_path)
+    # Run all steps in memory and encode the result once
+    pipeline = ClearVoice.pipeline(model_pipeline)
+    pipeline(input_wav_path, output_path=output_path)
     
     print(f"Final enhanced audio saved to {output_path}")
     return output_path
 
+async def enhance_audio_async(input_path, output_path, model_pipeline, temp_dir='temp'):
+    """
+    Asynchronous version of enhance_audio for concurrent jobs. File conversion, decoding and
+    encoding run in worker threads, and the model stages run on the shared GPU executor,
+    which decodes compatible stages of concurrent jobs together.
+
+    Args:
+        input_path (str): Path to the input audio file
+        output_path (str): Path where the final enhanced audio will be saved
+        model_pipeline (list of dict): List of dictionaries containing 'task' and 'model_name' for each step
+        temp_dir (str): Directory for temporary files of this job
+    """
+    loop = asyncio.get_running_loop()
+    os.makedirs(temp_dir, exist_ok=True)
+    input_wav_path = await loop.run_in_executor(None, ensure_wav_format, input_path, temp_dir)
+
+    for i, model_info in enumerate(model_pipeline):
+        print(f"Step {i+1}: {model_info['task']} using {model_info['model_name']}")
+
+    # Loading the models may read checkpoints, which must not block the event loop
+    pipeline = await loop.run_in_executor(None, ClearVoice.pipeline, model_pipeline)
+    await pipeline.run_async(input_wav_path, output_path=output_path)
+
+    print(f"Final enhanced audio saved to {output_path}")
+    return output_path
+
 def process_audio(task, model_name, input_path, output_path):
     """
     Process audio using a specific ClearVoice model.
@@ -95,87 +254,138 @@ def process_audio(task, model_name, input_path, output_path):
         input_path (str): Path to the input audio file
         output_path (str): Path where the processed audio will be saved
     """
+    # ClearVoice fetches the model from the process-wide registry, so only the
+    # first request for a model pays for building it and loading the checkpoint
     cv = ClearVoice(task=task, model_names=[model_name])
     processed_wav = cv(input_path=input_path, online_write=False)
     cv.write(processed_wav, output_path=output_path)
     return output_path
 
-def handler(event):
+async def handler(event):
     """
-    RunPod serverless handler function with direct file input/output
+    RunPod serverless handler function with direct file input/output. Every job works in its
+    own temporary directory, and all blocking work runs outside the event loop, so that
+    several jobs can run at once (see MAX_CONCURRENCY).
+
+    The input audio is given by one of:
+    - 'audio_file': an upload, {'local_path': ...}
+    - 'input_path': a file reference, e.g. a file on a network volume
+    - 'input_url': a URL, downloaded in chunks straight to disk
+    - 'input_data': base64 encoded file content, decoded in chunks to disk
+
+    With 'input_format': 'pcm' the input is raw little-endian PCM described by 'sample_rate',
+    'channels' and 'sample_format' ('PCM_16' by default). The output format is taken from
+    'output_format' ('wav' by default, 'pcm' for the raw
+    little-endian PCM samples of the WAV output) and the output can be written
+    to a file reference given as 'output_path'. The output is returned inline as base64 unless
+    'return_base64' is False. File references must lie in CLEARVOICE_FILE_ROOT (see
+    resolve_file_reference) and are refused if it is not set.
+
+    The output reports under 'timings' whether the job was a warm start (all its models were
+    loaded before it started), its processing time and the cold start timings of the worker
+    (see startup.preload_models).
     """
     job_input = event.get("input", {})
+    loop = asyncio.get_running_loop()
+    job_start = time.perf_counter()
+    output_format = job_input.get("output_format", "wav").lower().lstrip(".")
+    try:
+        # File references are checked before any work is done
+        output_path = resolve_file_reference(job_input["output_path"]) if job_input.get("output_path") else None
+        reference_path = resolve_file_reference(job_input["input_path"]) if "input_path" in job_input else None
+    except ValueError as e:
+        return {"error": str(e)}
     
-    # Make directories for inputs, outputs, and temp files
-    os.makedirs("inputs", exist_ok=True)
+    # Make directories for outputs and temp files, inputs and intermediates go to a directory of this job
     os.makedirs("outputs", exist_ok=True)
     os.makedirs("temp", exist_ok=True)
+    job_dir = tempfile.mkdtemp(prefix="job_", dir="temp")
     
-    # Get timestamp for unique filename
-    timestamp = str(time.time()).replace(".", "")
-    input_path = f"inputs/input_{timestamp}"
-    output_path = f"outputs/output_{timestamp}.wav"
-    
-    # Handle the input audio file
-    if "audio_file" in job_input and isinstance(job_input["audio_file"], dict) and "local_path" in job_input["audio_file"]:
-        # This is how RunPod provides uploaded files
-        input_path = job_input["audio_file"]["local_path"]
-        print(f"Using uploaded file at: {input_path}")
-    elif "input_url" in job_input:
-        # Download from URL
-        file_extension = os.path.splitext(job_input["input_url"])[1]
-        if not file_extension:
-            file_extension = ".wav"  # Default extension if none provided
-        input_path = f"inputs/input_{timestamp}{file_extension}"
-        
-        response = requests.get(job_input["input_url"])
-        with open(input_path, "wb") as f:
-            f.write(response.content)
-        print(f"Downloaded audio from URL to: {input_path}")
-    elif "input_data" in job_input:
-        # Decode base64 data
-        input_path = f"inputs/input_{timestamp}.wav"
-        audio_data = base64.b64decode(job_input["input_data"])
-        with open(input_path, "wb") as f:
-            f.write(audio_data)
-        print(f"Decoded base64 audio to: {input_path}")
-    else:
-        return {"error": "No input audio provided. Please provide 'audio_file' upload, 'input_url', or 'input_data'"}
-    
-    # Get model pipeline from input or use default
-    model_pipeline = job_input.get("model_pipeline", [
-        {'task': 'speech_enhancement', 'model_name': 'MossFormer2_SE_48K'},
-        {'task': 'speech_super_resolution', 'model_name': 'MossFormer2_SR_48K'},
-        {'task': 'speech_enhancement', 'model_name': 'MossFormer2_SE_48K'}
-    ])
+    # Unique name for the files of this job, timestamps can collide between concurrent jobs
+    job_token = uuid.uuid4().hex
+    input_path = os.path.join(job_dir, "input")
+    output_path = output_path or f"outputs/output_{job_token}.{output_format}"
     
     try:
-        # Process the audio
-        enhance_audio(input_path, output_path, model_pipeline, temp_dir='temp')
-        
-        # Read the output file into base64 for the response
-        with open(output_path, "rb") as f:
-            output_data = base64.b64encode(f.read()).decode("utf-8")
-        
+        # Handle the input audio file
+        if "audio_file" in job_input and isinstance(job_input["audio_file"], dict) and "local_path" in job_input["audio_file"]:
+            # This is how RunPod provides uploaded files
+            input_path = job_input["audio_file"]["local_path"]
+            print(f"Using uploaded file at: {input_path}")
+        elif "input_path" in job_input:
+            # A file reference, e.g. on a network volume, is used in place
+            input_path = reference_path
+            if not os.path.isfile(input_path):
+                return {"error": f"Input file not found: {input_path}"}
+            print(f"Using input file at: {input_path}")
+        elif "input_url" in job_input:
+            # Download from URL
+            file_extension = os.path.splitext(job_input["input_url"].split("?")[0])[1]
+            if not file_extension:
+                file_extension = ".wav"  # Default extension if none provided
+            input_path = os.path.join(job_dir, f"input{file_extension}")
+            await loop.run_in_executor(None, download_file, job_input["input_url"], input_path)
+            print(f"Downloaded audio from URL to: {input_path}")
+        elif "input_data" in job_input:
+            # Decode base64 data
+            input_path = os.path.join(job_dir, "input.wav")
+            await loop.run_in_executor(None, decode_base64_file, job_input["input_data"], input_path)
+            print(f"Decoded base64 audio to: {input_path}")
+        else:
+            return {"error": "No input audio provided. Please provide 'audio_file' upload, 'input_path', 'input_url', or 'input_data'"}
+
         # Determine the original file format
-        input_format = os.path.splitext(input_path)[1].lower()
+        input_format = job_input.get("input_format") or os.path.splitext(input_path)[1].lower()
+        if input_format.lower().lstrip(".") == "pcm":
+            # Raw PCM has no header, so it is wrapped into a WAV file first
+            wav_path = os.path.join(job_dir, "input_pcm.wav")
+            await loop.run_in_executor(None, pcm_to_wav, input_path, wav_path, int(job_input["sample_rate"]),
+                                       int(job_input.get("channels", 1)), job_input.get("sample_format", "PCM_16"))
+            input_path = wav_path
+
+        # Get model pipeline from input or use default
+        model_pipeline = job_input.get("model_pipeline", DEFAULT_PIPELINE)
+        warm_start = is_warm_start(model_pipeline)
+    
+        # Process the audio
+        if output_format == "pcm":
+            # Encode to WAV and strip the header
+            wav_path = os.path.join(job_dir, "output.wav")
+            await enhance_audio_async(input_path, wav_path, model_pipeline, temp_dir=job_dir)
+            await loop.run_in_executor(None, wav_to_pcm, wav_path, output_path)
+        else:
+            await enhance_audio_async(input_path, output_path, model_pipeline, temp_dir=job_dir)
         
-        # Return both the file path and base64 data
-        return {
-            "output": {
-                "file_path": output_path,  # Path to the output file on the server
-                "audio_data": output_data,  # Base64 encoded audio for direct download
-                "models_used": [model["model_name"] for model in model_pipeline],
-                "original_format": input_format
-            }
+        output = {
+            "file_path": output_path,  # Path to the output file on the server
+            "output_format": output_format,
+            "models_used": [model["model_name"] for model in model_pipeline],
+            "original_format": input_format,
+            # Whether all models were loaded before the job, and the cold start timings of the worker
+            "timings": job_timings(warm_start, job_start)
         }
+        # Base64 encoded audio for direct download, encoded in chunks
+        if job_input.get("return_base64", True):
+            output["audio_data"] = await loop.run_in_executor(None, encode_base64_file, output_path)
+        return {"output": output}
     
     except Exception as e:
         # If any error occurs, return it
         import traceback
         traceback_str = traceback.format_exc()
         return {"error": str(e), "traceback": traceback_str}
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+def concurrency_modifier(current_concurrency):
+    """
+    Returns the number of jobs RunPod may run on this worker at once.
+    """
+    return MAX_CONCURRENCY
 
 # Start the RunPod serverless handler
 if __name__ == "__main__":
-    runpod.serverless.start({"handler": handler})
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # Load and warm up the default pipeline before the first job (see startup.preload_models)
+    preload_models(DEFAULT_PIPELINE, PROCESS_START, IMPORT_SECONDS)
+    runpod.serverless.start({"handler": handler, "concurrency_modifier": concurrency_modifier})
\ No newline at end of file
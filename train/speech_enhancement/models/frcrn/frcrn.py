@@ -7,6 +7,7 @@ sys.path.append(os.path.dirname(__file__))
 from .conv_stft import ConvSTFT, ConviSTFT
 import numpy as np
 from models.frcrn.unet import UNet
+from utils.misc import get_window
 
 class FRCRN_Wrapper_StandAlone(nn.Module):
     def __init__(self, args):
@@ -235,14 +236,10 @@ def stft(x, win_type, win_len, win_inc, fft_len, device):
     #win_len = args.win_len
     #win_inc = args.win_inc
     #fft_len = args.fft_len
-    if win_type == 'hamming':
-        window = torch.hamming_window(win_len, periodic=False)
-    elif win_type == 'hanning':
-        window = torch.hann_window(win_len, periodic=False)
-    else:
+    window = get_window(win_type, win_len, device)
+    if window is None:
         print(f"{win_type} is not supported!")
         return
-    window = window.to(device)
     return torch.stft(x, fft_len, win_inc, win_len, center=False, window=window)
 
 def remove_dc(data):
@@ -16,6 +16,22 @@ import librosa
 import torchaudio
 MAX_WAV_VALUE = 32768.0
 EPS = 1e-6
+# Analysis windows of stft/istft, built once per (type, length, device) instead of per call
+_windows = {}
+
+def get_window(win_type, win_len, device):
+    """Returns the non-periodic hamming or hann window of stft/istft on a device, built on
+    the first call, or None for unsupported window types."""
+    key = (win_type, win_len, str(device))
+    if key not in _windows:
+        if win_type == 'hamming':
+            window = torch.hamming_window(win_len, periodic=False)
+        elif win_type == 'hanning':
+            window = torch.hann_window(win_len, periodic=False)
+        else:
+            return None
+        _windows[key] = window.to(device)
+    return _windows[key]
 
 def read_and_config_file(input_path, decode=0):
     processed_list = []
@@ -172,13 +188,8 @@ def stft(x, args, center=False):
     win_len = args.win_len
     win_inc = args.win_inc
     fft_len = args.fft_len
-    if win_type == 'hamming':
-        window = torch.hamming_window(win_len, periodic=False)
-        window = window.to(x.device)
-    elif win_type == 'hanning':
-        window = torch.hann_window(win_len, periodic=False)
-        window = window.to(x.device)
-    else:
+    window = get_window(win_type, win_len, x.device)
+    if window is None:
         print(f"in stft, {win_type} is not supported!")
         return
     return torch.stft(x, fft_len, win_inc, win_len, center=center, window=window, return_complex=False)
@@ -188,13 +199,8 @@ def istft(x, args, slen=None, center=False, normalized=False, onsided=None, retu
     win_len = args.win_len
     win_inc = args.win_inc
     fft_len = args.fft_len
-    if win_type == 'hamming':
-        window = torch.hamming_window(win_len, periodic=False)
-        window = window.to(x.device)
-    elif win_type == 'hanning':
-        window = torch.hann_window(win_len, periodic=False)
-        window = window.to(x.device)
-    else:
+    window = get_window(win_type, win_len, x.device)
+    if window is None:
         print(f"in istft, {win_type} is not supported!")
         return
     if torch.__version__<='1.7.1':
@@ -266,7 +272,7 @@ def stft(x, args):
     win_inc = args.win_inc
     fft_len = args.fft_len
     if win_type == 'hamming':
-        window = torch.hamming_window(win_len, periodic=False)
+        window = get_window(win_type, win_len, x.device)
     else:
         print(f"{win_type} is not supported!")
         return
@@ -278,7 +284,7 @@ def istft(x, slen, args):
     win_inc = args.win_inc
     fft_len = args.fft_len
     if win_type == 'hamming':
-        window = torch.hamming_window(win_len, periodic=False)
+        window = get_window(win_type, win_len, x.device)
     else:
         print(f"{win_type} is not supported!")
         return
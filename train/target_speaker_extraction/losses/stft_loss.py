@@ -28,7 +28,8 @@ def stft(x, fft_size, hop_size, win_length, window):
         Tensor: Magnitude spectrogram (B, #frames, fft_size // 2 + 1).
 
     """
-    window = window.cuda()
+    # The window is a buffer of the loss module, this only copies it if it is on another device
+    window = window.to(x.device)
     if is_pytorch_17plus:
         x_stft = torch.stft(x, fft_size, hop_size, win_length, window, return_complex=False)
     else: